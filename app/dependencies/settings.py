@@ -1,11 +1,109 @@
 import os
 from functools import lru_cache
 from pydantic import BaseSettings
-from typing import List
+from typing import List, Optional
 
 class Config(BaseSettings):
     app_name: str = "FAIR Combine API"
     allowed_origins: List[str] = []
+
+    # Number of additional attempts (and delay in seconds before the first one, doubled after each attempt)
+    # made when connecting to the redis server on startup. Requests make a single attempt
+    redis_connect_retries: int = 5
+    redis_connect_backoff: float = 0.5
+
+    # Delay (in seconds) after which a redis command (or connection attempt) fails if redis did not answer.
+    # After `redis_breaker_failure_threshold` consecutive failures, commands sent to the node fail immediately,
+    # until the node answers again to a ping sent every `redis_probe_interval` seconds
+    redis_command_timeout: float = 1.0
+    redis_breaker_failure_threshold: int = 5
+    redis_probe_interval: float = 2.0
+
+    # Number of recently read sessions kept in memory, to be returned when redis is unavailable
+    degraded_cache_size: int = 500
+
+    # Addresses (`host:port`) of the redis nodes sessions are spread over (e.g. `["redis1:6379", "redis2:6379"]`).
+    # Defaults to the single node set by the REDIS_URL and REDIS_PORT environment variables.
+    # When nodes are added, set `redis_previous_nodes` to the former list until `app.jobs.rebalance` is done:
+    # sessions that moved are then migrated to their new node on first access
+    redis_nodes: List[str] = []
+    redis_previous_nodes: List[str] = []
+
+    # Serve the OpenAPI schema and documentation pages generated at build time (`python -m app.routers.openapi_doc`)
+    # from `app/openapi_doc` instead of generating them in each process
+    prebuilt_openapi_doc: bool = False
+
+    # Responses larger than this size (in bytes) are gzip-compressed for clients accepting it
+    compression_minimum_size: int = 1000
+    compression_level: int = 6
+
+    # Token buckets limiting write requests (creating sessions, updating tasks, ...): rate in requests
+    # per second, and burst size, per client (IP address, and API key if it is one of `api_keys`) and per session
+    rate_limit_enabled: bool = True
+    rate_limit_client_rate: float = 2.0
+    rate_limit_client_burst: int = 30
+    rate_limit_session_rate: float = 10.0
+    rate_limit_session_burst: int = 30
+    # Token bucket limiting the sessions created by `POST /sessions/bulk`, per client: rate in sessions per second,
+    # and burst size (requests creating more sessions than this wait for a full bucket)
+    rate_limit_bulk_rate: float = 2.0
+    rate_limit_bulk_burst: int = 1000
+    # API keys issued to clients, sent in the X-API-Key header. Other keys are ignored
+    api_keys: List[str] = []
+
+    # Requests are refused (503) when more requests than this are waiting for a thread,
+    # or when redis took longer than this (in seconds) to answer in the last `admission_latency_window` seconds
+    admission_max_queue_depth: int = 100
+    admission_max_redis_latency: float = 0.5
+    admission_latency_window: float = 5.0
+    # Delay (in seconds) given to clients in the Retry-After header when requests are refused
+    admission_retry_after: int = 1
+
+    # Delay (in seconds) during which successive updates of a session are merged in memory
+    # before being written to redis at once. 0 disables write coalescing.
+    # Sessions are buffered in the memory of the process: requires the server to run a single worker
+    write_coalescing_window: float = 0
+
+    # Task status changes are recorded in a history per session, with a snapshot of the Task statuses
+    # every `history_snapshot_interval` changes. Changes older than the last `history_max_events` are
+    # dropped (a bit more are kept, to start from a snapshot)
+    history_snapshot_interval: int = 50
+    history_max_events: int = 1000
+
+    # Maximum number of sessions created by a single bulk request, and number of sessions
+    # written to redis at once (their ids are sent back after each write)
+    bulk_sessions_max_count: int = 1000
+    bulk_sessions_chunk_size: int = 100
+
+    # Maximum number of sessions compared by a single request
+    compare_sessions_max_count: int = 100
+
+    # Delay (in seconds) during which a session creation sent with an `Idempotency-Key` header
+    # returns the same session when sent again with that key. While the first request is processed, the key
+    # is only held for `idempotency_key_lease` seconds (about the request timeout): if the worker dies
+    # before the request completes, the request can be sent again once the lease is over
+    idempotency_key_ttl: int = 3600
+    idempotency_key_lease: int = 60
+
+    # Number of processes rendering session reports (0 renders them in a thread of each API worker),
+    # and delay (in seconds) during which rendered reports are kept in redis. Rendering processes are started
+    # by each API worker and import the whole application: with the gunicorn profile, each one adds
+    # `2 * cores + 1` processes, which stay alive once the first report is rendered
+    report_render_processes: int = 0
+    report_cache_ttl: int = 86400
+
+    # Delay (in seconds) after which fetching the resource of a session to re-assess fails,
+    # and maximum size (in bytes) of the resources fetched
+    reassessment_fetch_timeout: float = 10.0
+    reassessment_max_resource_size: int = 200 * 1024 * 1024
+    # Directory of the files of file sessions. Only the files of this directory (and its subdirectories) are
+    # read when re-assessing a file session, file sessions cannot be re-assessed when not set
+    reassessment_files_root: Optional[str] = None
+
+    # Key to send in the X-Admin-Key header to use the admin endpoints (memory diagnostics, ...).
+    # Admin endpoints are disabled when not set
+    admin_api_key: Optional[str] = None
+
     # List of indicators that applied to archive (if no archive, their statuses will be set to 'failed')
     archive_indicators: List[str] = [
         "CA-RDA-F1-01Archive",
@@ -0,0 +1,12 @@
+from .memory import BYTES_BUCKETS, TASKS_BUCKETS, distribution, deep_sizeof, get_process_memory
+from .allocations import TracingInProgressError, trace_allocations
+
+__all__ = [
+    BYTES_BUCKETS,
+    TASKS_BUCKETS,
+    distribution,
+    deep_sizeof,
+    get_process_memory,
+    TracingInProgressError,
+    trace_allocations,
+]
@@ -0,0 +1,85 @@
+import os
+import asyncio
+import tracemalloc
+
+from typing import Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+# Allocations made by tracemalloc itself and by the import machinery are not reported
+_IGNORED_TRACES = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+_tracing = False
+
+
+class TracingInProgressError(RuntimeError):
+    """Raised when allocations are already being traced by another request"""
+
+
+def _take_snapshot(include: Optional[str]) -> tracemalloc.Snapshot:
+    filters = _IGNORED_TRACES if include is None else _IGNORED_TRACES + (tracemalloc.Filter(True, include),)
+    return tracemalloc.take_snapshot().filter_traces(filters)
+
+
+async def trace_allocations(duration: float, limit: int, frames: int = 1, include: Optional[str] = None) -> dict:
+    """
+    Traces the memory allocations of the process during a window of live traffic, and returns
+    the lines of code that allocated the most memory not released at the end of the window
+    (see AllocationReport model). Tracing slows down the process (allocations are about twice
+    as slow): it is started for the window only, unless it was already started (e.g. with the
+    `PYTHONTRACEMALLOC` environment variable).
+
+    :param duration: Duration of the window, in seconds
+    :param limit: Maximum number of allocation sites returned
+    :param frames: Number of frames stored per allocation. With more than one frame, allocations
+        are grouped by traceback instead of by line
+    :param include: Only report allocations made in the files matching this pattern
+        (e.g. `*/app/models/*`)
+    :return: The allocation sites, largest difference first
+    """
+    global _tracing
+    if _tracing:
+        raise TracingInProgressError("Allocations are already being traced")
+    _tracing = True
+
+    started = not tracemalloc.is_tracing()
+    try:
+        if started:
+            tracemalloc.start(frames)
+        tracemalloc.reset_peak()
+        # Snapshots take some time with many traced blocks: they are taken out of the event loop
+        before = await run_in_threadpool(_take_snapshot, include)
+        await asyncio.sleep(duration)
+        after = await run_in_threadpool(_take_snapshot, include)
+        traced_memory, traced_memory_peak = tracemalloc.get_traced_memory()
+        frames = tracemalloc.get_traceback_limit()
+    finally:
+        if started:
+            tracemalloc.stop()
+        _tracing = False
+
+    stats = after.compare_to(before, "traceback" if frames > 1 else "lineno")
+    return {
+        "pid": os.getpid(),
+        "duration": duration,
+        "frames": frames,
+        "traced_memory": traced_memory,
+        "traced_memory_peak": traced_memory_peak,
+        "size_diff": sum(stat.size_diff for stat in stats),
+        "sites": [
+            {
+                "location": f"{stat.traceback[-1].filename}:{stat.traceback[-1].lineno}",
+                "traceback": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+                "size_diff": stat.size_diff,
+                "count_diff": stat.count_diff,
+                "size": stat.size,
+                "count": stat.count,
+            }
+            for stat in stats[:limit]
+        ],
+    }
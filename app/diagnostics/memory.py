@@ -0,0 +1,138 @@
+import gc
+import os
+import sys
+
+from types import BuiltinFunctionType, CodeType, FrameType, FunctionType, MethodType, ModuleType
+from typing import Optional
+
+from app.metrics import assessments_lifespan
+from app.models.session import Session, SessionHandler, get_dependency_graph
+from app.models.tasks import Task
+from app.models.records import TaskRecord
+from app.redis_controller.session_cache import get_recent_sessions
+from app.redis_controller.write_buffer import get_write_buffer
+from app.reports import render_pool
+
+# Objects shared by the whole process, not counted in the footprint of the objects referring to them
+_SHARED_TYPES = (type, ModuleType, FunctionType, BuiltinFunctionType, MethodType, CodeType, FrameType)
+
+# Upper bounds of the histogram buckets: powers of 2 from 1 KiB to 4 MiB for sizes in bytes,
+# steps of 25 Tasks for Task counts
+BYTES_BUCKETS = [2 ** exponent for exponent in range(10, 23)]
+TASKS_BUCKETS = list(range(25, 301, 25))
+
+
+def distribution(values: list[Optional[float]], buckets: list[int]) -> dict:
+    """
+    Returns the distribution of measures (see Distribution model)
+
+    :param values: The measures. None values (measures that failed) are ignored
+    :param buckets: The ascending upper bounds of the histogram buckets. A last bucket
+        counts the values above the last bound
+    :return: The number of values, their mean, percentiles, maximum and histogram
+    """
+    values = sorted(value for value in values if value is not None)
+    histogram = [{"le": bound, "count": 0} for bound in buckets] + [{"le": None, "count": 0}]
+    i = 0
+    for value in values:
+        while i < len(buckets) and value > buckets[i]:
+            i += 1
+        histogram[i]["count"] += 1
+
+    if not values:
+        return {"samples": 0, "mean": None, "p50": None, "p95": None, "max": None, "histogram": histogram}
+    return {
+        "samples": len(values),
+        "mean": sum(values) / len(values),
+        "p50": values[len(values) // 2],
+        "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+        "max": values[-1],
+        "histogram": histogram,
+    }
+
+
+def deep_sizeof(*objects) -> tuple[int, int]:
+    """
+    Returns the memory held by objects: the sizes of all the objects they refer to,
+    directly or not. Classes, modules and functions are shared by the whole process
+    and are not counted.
+
+    :param objects: The objects to measure
+    :return: A tuple with the number of objects reached, and the sum of their sizes in bytes
+    """
+    seen = set()
+    pending = list(objects)
+    count = size = 0
+    while pending:
+        obj = pending.pop()
+        if id(obj) in seen or isinstance(obj, _SHARED_TYPES):
+            continue
+        seen.add(id(obj))
+        count += 1
+        size += sys.getsizeof(obj)
+        pending.extend(gc.get_referents(obj))
+    return count, size
+
+
+def _footprint(items: int, *objects) -> dict:
+    count, size = deep_sizeof(*objects)
+    return {"items": items, "objects": count, "bytes": size}
+
+
+def _read_rss() -> tuple[Optional[int], Optional[int]]:
+    """Returns the current and peak resident set sizes of the process (in bytes), None outside of Linux"""
+    rss = peak_rss = None
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    rss = int(line.split()[1]) * 1024
+                elif line.startswith("VmHWM:"):
+                    peak_rss = int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return rss, peak_rss
+
+
+def get_process_memory() -> dict:
+    """
+    Returns the memory used by the process (see ProcessMemory model): its resident set size,
+    and the memory held by the FAIR indicators, the in-process caches, and the live session
+    handlers and models. Walks through all the objects tracked by the garbage collector:
+    this takes some time (about a second per million objects) and holds the interpreter.
+
+    :return: The memory used by the process
+    """
+    live_classes = {"session_handlers": SessionHandler, "task_records": TaskRecord, "session_models": Session,
+                    "task_models": Task}
+    instances = {cls: [] for cls in live_classes.values()}
+    gc_objects = 0
+    for obj in gc.get_objects():
+        gc_objects += 1
+        class_instances = instances.get(type(obj))
+        if class_instances is not None:
+            class_instances.append(obj)
+
+    recent_sessions = get_recent_sessions()
+    write_buffer = get_write_buffer()
+    # (indicators mapping id, JSON representation of the indicators, digest)
+    indicator_documents = render_pool._indicators_cache
+    components = {
+        "fair_indicators": _footprint(len(assessments_lifespan.fair_indicators), assessments_lifespan.fair_indicators),
+        "indicator_groups": _footprint(len(assessments_lifespan.indicator_groups), assessments_lifespan.indicator_groups),
+        "dependency_graph": _footprint(1, get_dependency_graph()),
+        "report_indicator_documents": _footprint(len(indicator_documents[1]), indicator_documents),
+        "recent_sessions": _footprint(len(recent_sessions), recent_sessions),
+        "write_buffer": _footprint(len(write_buffer), write_buffer) if write_buffer is not None else _footprint(0),
+    }
+    for name, cls in live_classes.items():
+        components[name] = _footprint(len(instances[cls]), *instances[cls])
+
+    rss, peak_rss = _read_rss()
+    return {
+        "pid": os.getpid(),
+        "rss": rss,
+        "peak_rss": peak_rss,
+        "gc_objects": gc_objects,
+        "components": components,
+    }
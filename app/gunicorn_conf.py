@@ -0,0 +1,80 @@
+"""
+Gunicorn configuration for running FAIR Combine in production:
+
+    gunicorn -c python:app.gunicorn_conf app.main:app
+
+Every worker is an uvicorn worker (using uvloop and httptools when installed).
+The application and the FAIR indicators are loaded once in the master process
+before workers are forked, so the indicators are shared copy-on-write.
+Workers hold no state that needs to be kept coherent: sessions live in redis,
+and each worker opens its own redis connection in the application lifespan.
+The session write buffer (`WRITE_COALESCING_WINDOW`) is the exception: it keeps
+unwritten sessions in the memory of a worker, so it requires a single worker.
+Report rendering processes (`REPORT_RENDER_PROCESSES`, none by default) are started
+by each worker and import the whole application: `workers * REPORT_RENDER_PROCESSES`
+more interpreters are kept in memory once reports are downloaded.
+
+Settings can be overridden with the following environment variables:
+
+- *WEB_CONCURRENCY*: Number of worker processes (defaults to `2 * cores + 1`)
+- *BIND*: Address to listen to (defaults to `0.0.0.0:80`)
+- *GRACEFUL_TIMEOUT*: Seconds given to workers to finish their requests on restart
+- *TIMEOUT*: Seconds after which a silent worker is killed and restarted
+- *KEEP_ALIVE*: Seconds to wait for requests on a keep-alive connection
+- *MAX_REQUESTS*: Number of requests after which a worker is recycled (0 to disable)
+"""
+import os
+import multiprocessing
+
+from app.dependencies.settings import get_settings
+from app.metrics.assessments_lifespan import get_fair_indicators, get_indicator_groups
+
+
+def default_workers_count(cores: int = None) -> int:
+    """
+    Returns the number of workers to start. Workers are mostly waiting on redis,
+    so the usual `2 * cores + 1` keeps every core busy.
+
+    :param cores: Number of available cores. Detected if not given
+    :return: The number of workers
+    """
+    if cores is None:
+        try:
+            cores = len(os.sched_getaffinity(0))
+        except AttributeError:
+            cores = multiprocessing.cpu_count()
+    return 2 * cores + 1
+
+
+bind = os.environ.get("BIND", "0.0.0.0:80")
+workers = int(os.environ.get("WEB_CONCURRENCY", default_workers_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Load the application in the master process, so that it is shared between workers
+preload_app = True
+
+graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT", 30))
+timeout = int(os.environ.get("TIMEOUT", 60))
+keepalive = int(os.environ.get("KEEP_ALIVE", 5))
+
+# Recycle workers regularly (with jitter so they do not restart all at once)
+max_requests = int(os.environ.get("MAX_REQUESTS", 10000))
+max_requests_jitter = max_requests // 10
+
+accesslog = "-"
+errorlog = "-"
+
+
+def on_starting(server):
+    """
+    Loads the FAIR indicators in the master process, before workers are forked.
+    Refuses to start several workers with write coalescing enabled: a worker would not read
+    the sessions buffered by another one, and their writes would overwrite each other.
+    """
+    if get_settings().write_coalescing_window > 0 and server.cfg.workers > 1:
+        raise RuntimeError(
+            f"Write coalescing (WRITE_COALESCING_WINDOW) requires a single worker, {server.cfg.workers} were "
+            f"requested: set WEB_CONCURRENCY=1, or disable write coalescing"
+        )
+    get_fair_indicators()
+    get_indicator_groups()
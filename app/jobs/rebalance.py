@@ -0,0 +1,106 @@
+"""
+Rebalancing of the sessions stored on several redis nodes.
+
+Sessions are spread over the nodes of the `redis_nodes` setting by consistent hashing of
+their id (see `app.redis_controller.sharding`). When nodes are added or removed, some
+sessions belong to another node than the one storing them. To change the nodes:
+
+1. Set `REDIS_NODES` to the new list of nodes, and `REDIS_PREVIOUS_NODES` to the former one
+2. Restart the application. Sessions requested by users are moved to their new node on
+   first access
+3. Move all the remaining sessions with this job:
+
+    python -m app.jobs.rebalance [--dry-run] [--batch-size 1000]
+
+4. Unset `REDIS_PREVIOUS_NODES` and restart the application
+
+Each session is moved with its history by MIGRATE, from the node storing it to its new
+node, which must be reachable from the former at the address given in `REDIS_NODES`.
+Nodes of `REDIS_PREVIOUS_NODES` removed from `REDIS_NODES` are emptied.
+"""
+import sys
+import time
+import argparse
+
+from dataclasses import dataclass
+from typing import Optional
+
+from redis import Redis
+
+from app.dependencies.settings import get_settings
+from app.jobs.rescore import iter_session_keys
+from app.redis_controller import get_redis_nodes
+from app.redis_controller.redis_handler import get_node_addresses, create_redis_app
+from app.redis_controller.session_index import SESSION_PREFIX
+from app.redis_controller.sharding import get_session_node, migrate_session
+
+
+@dataclass
+class RebalanceReport:
+    """
+    Summary of a rebalancing run
+
+    - *sessions*: Number of sessions read
+    - *moved*: Number of sessions moved (or to move, in a dry run) to another node
+    - *duration*: Duration of the run, in seconds
+    """
+    sessions: int = 0
+    moved: int = 0
+    duration: float = 0.0
+
+    def __str__(self) -> str:
+        rate = self.sessions / self.duration if self.duration else 0
+        return (f"{self.sessions} sessions read, {self.moved} moved, "
+                f"in {self.duration:.1f}s ({rate:.0f} sessions/s)")
+
+
+def rebalance_sessions(
+    redis_nodes: dict[str, Redis],
+    batch_size: int = 1000,
+    dry_run: bool = False,
+) -> RebalanceReport:
+    """
+    Moves every session to the node it belongs to
+
+    :param redis_nodes: Mapping of node addresses to their client, including the nodes
+        being removed. Sessions are assigned to the nodes of the `redis_nodes` setting
+    :param batch_size: Number of session keys read per SCAN round-trip
+    :param dry_run: If True, only counts the sessions that would be moved
+    :return: The report of the run
+    """
+    nodes = tuple(get_node_addresses(get_settings().redis_nodes))
+    report = RebalanceReport()
+    start = time.perf_counter()
+    for address, redis_app in redis_nodes.items():
+        for keys in iter_session_keys(redis_app, batch_size):
+            report.sessions += len(keys)
+            for key in keys:
+                session_id = key[len(SESSION_PREFIX):]
+                target = get_session_node(session_id, nodes)
+                if target == address:
+                    continue
+                if dry_run or migrate_session(redis_app, target, session_id):
+                    report.moved += 1
+    report.duration = time.perf_counter() - start
+    return report
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Moves the stored sessions to the redis node they belong to")
+    parser.add_argument("--dry-run", action="store_true", help="Count the sessions to move without moving them")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Number of session keys per redis round-trip")
+    args = parser.parse_args(argv)
+
+    config = get_settings()
+    redis_nodes = dict(get_redis_nodes(config.redis_connect_retries))
+    previous_nodes = config.redis_previous_nodes
+    for address in get_node_addresses(previous_nodes) if previous_nodes else []:
+        if address not in redis_nodes:
+            redis_nodes[address] = create_redis_app(address=address)
+
+    report = rebalance_sessions(redis_nodes, batch_size=args.batch_size, dry_run=args.dry_run)
+    print(report)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,493 @@
+"""
+Bulk rescoring of the sessions stored in redis.
+
+Session scores are only calculated when a session is updated, so they become stale when
+the scoring rules change (Task priorities in `metrics.csv`, `TASK_STATUS_SCORES`, ...).
+This job recalculates the scores of every stored session:
+
+    python -m app.jobs.rescore [--dry-run] [--batch-size 1000]
+
+Sessions are read from redis in pipelined batches, with only the name, status and
+priority of their Tasks. The statuses of a batch are packed in a (sessions x indicators)
+matrix, and the session scores are computed with vectorized reductions over it.
+Only sessions whose scores, status, Task priorities or Task scores changed are written back.
+
+Each session is written back by a script which first checks that the session was not
+updated (`updated_at`) since its batch was read. Sessions updated in the meantime are
+read and rescored again, up to `--retries` times, so that user updates are never overwritten.
+"""
+import sys
+import json
+import time
+import argparse
+
+from dataclasses import dataclass, field
+from typing import Iterator, Optional, NamedTuple
+
+import numpy as np
+
+from redis import Redis
+
+from app.dependencies.settings import get_settings
+from app.metrics.assessments_lifespan import get_fair_indicators, get_indicator_groups
+from app.models.session import SessionStatus, SCORE_FIELDS
+from app.models.tasks import TaskStatus, TaskPriority, TASK_STATUS_SCORES
+from app.redis_controller import get_redis_nodes
+
+STATUS_CODES = {status.value: code for code, status in enumerate(TaskStatus)}
+MISSING = -1
+
+# Writes the rescored parts of a session, if it was not updated since it was read.
+# KEYS[1] is the session key, ARGV[1] the `updated_at` value read (JSON encoded), and the
+# other ARGV are (JSONPath, JSON value) pairs to set. Returns 1 if written, 0 otherwise.
+WRITE_IF_UNCHANGED_SCRIPT = """
+local current = redis.call('JSON.GET', KEYS[1], '$.updated_at')
+if not current then
+    return 0
+end
+local updated_at = cjson.decode(current)[1] or cjson.null
+if updated_at ~= cjson.decode(ARGV[1]) then
+    return 0
+end
+for i = 2, #ARGV, 2 do
+    redis.call('JSON.SET', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+return 1
+"""
+
+
+@dataclass
+class IndicatorIndex:
+    """
+    Ordinal of each indicator in the score matrices, and the indicator attributes
+    needed for scoring, as arrays aligned with these ordinals.
+
+    - *ordinals*: Mapping of indicator names to their column in the matrices
+    - *priorities*: The current priority of each indicator
+    - *essential*: Whether each indicator is essential
+    - *top_level*: Whether each indicator has no parent (only those decide if a session is finished)
+    - *status_scores*: The score of each TaskStatus, indexed by status code
+    - *principles*, *subgroups*: The FAIR principles and subgroups
+    - *principle_members*, *subgroup_members*: (groups x indicators) matrices of whether
+        each indicator belongs to each principle or subgroup
+    """
+    ordinals: dict[str, int]
+    priorities: list[str]
+    essential: np.ndarray
+    top_level: np.ndarray
+    status_scores: np.ndarray
+    principles: list[str]
+    principle_members: np.ndarray
+    subgroups: list[str]
+    subgroup_members: np.ndarray
+
+    @classmethod
+    def from_indicators(cls) -> "IndicatorIndex":
+        """Builds the index from the FAIR indicators and the application settings"""
+        config = get_settings()
+        indicators = list(get_fair_indicators().values())
+        indicator_groups = get_indicator_groups()
+
+        def members(position):
+            groups = sorted({indicator_groups[indicator.name][position] for indicator in indicators})
+            return groups, np.array([
+                [indicator_groups[indicator.name][position] == group for indicator in indicators]
+                for group in groups
+            ])
+
+        principles, principle_members = members(0)
+        subgroups, subgroup_members = members(1)
+        return cls(
+            ordinals={indicator.name: i for i, indicator in enumerate(indicators)},
+            priorities=[indicator.priority for indicator in indicators],
+            essential=np.array([indicator.priority == TaskPriority.essential.value for indicator in indicators]),
+            top_level=np.array([indicator.name not in config.assessment_dependencies for indicator in indicators]),
+            status_scores=np.array([TASK_STATUS_SCORES.get(status, 0) for status in TaskStatus], dtype=float),
+            principles=principles,
+            principle_members=principle_members,
+            subgroups=subgroups,
+            subgroup_members=subgroup_members,
+        )
+
+
+class StoredSession(NamedTuple):
+    """The parts of a stored session needed to rescore it"""
+    names: list[str]
+    statuses: list[str]
+    priorities: list[str]
+    task_scores: list[float]
+    status: str
+    updated_at: Optional[float]
+    scores: list[Optional[float]]
+    principle_scores: Optional[dict]
+    subgroup_scores: Optional[dict]
+
+
+@dataclass
+class RescoreReport:
+    """
+    Summary of a rescoring run
+
+    - *sessions*: Number of sessions read
+    - *changed*: Number of sessions whose scores (including principle, subgroup and Task
+        scores), status or Task priorities changed
+    - *retried*: Number of times sessions were read again, because they were updated
+        between being read and written back
+    - *skipped*: Number of sessions left unchanged, because they were still being updated
+        after all retries
+    - *max_delta*: For each score, the largest absolute change
+    - *total_delta*: For each score, the sum of absolute changes (used for the mean)
+    - *duration*: Duration of the run, in seconds
+    """
+    sessions: int = 0
+    changed: int = 0
+    retried: int = 0
+    skipped: int = 0
+    max_delta: dict[str, float] = field(default_factory=lambda: dict.fromkeys(SCORE_FIELDS, 0.0))
+    total_delta: dict[str, float] = field(default_factory=lambda: dict.fromkeys(SCORE_FIELDS, 0.0))
+    duration: float = 0.0
+
+    def __str__(self) -> str:
+        rate = self.sessions / self.duration if self.duration else 0
+        lines = [
+            f"{self.sessions} sessions read, {self.changed} changed, "
+            f"in {self.duration:.1f}s ({rate:.0f} sessions/s)",
+            f"{self.retried} read again after concurrent updates, {self.skipped} skipped",
+            f"{'score':<32}{'max |delta|':>12}{'mean |delta|':>14}",
+        ]
+        for score in SCORE_FIELDS:
+            mean = self.total_delta[score] / self.sessions if self.sessions else 0
+            lines.append(f"{score:<32}{self.max_delta[score]:>12.4f}{mean:>14.4f}")
+        return "\n".join(lines)
+
+
+def iter_session_keys(redis_app: Redis, batch_size: int) -> Iterator[list[str]]:
+    """
+    Iterates over the session keys in batches, using SCAN so that redis is never blocked
+
+    :param redis_app: A redis client
+    :param batch_size: Number of keys per batch
+    :return: An iterator over lists of session keys
+    """
+    batch = []
+    for key in redis_app.scan_iter(match="session:*", count=batch_size, _type="ReJSON-RL"):
+        batch.append(key)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _first_match(matches):
+    """Returns the first value matched by a JSONPath (or the value itself for legacy paths)"""
+    if isinstance(matches, list):
+        return matches[0] if matches else None
+    return matches
+
+
+def fetch_batch(redis_app: Redis, keys: list[str]) -> list[Optional[StoredSession]]:
+    """
+    Reads the parts of the sessions needed for scoring, in a single round-trip
+
+    :param redis_app: A redis client
+    :param keys: The keys of the sessions to read
+    :return: For each key, the stored session, or None if the session was deleted in the meantime
+    """
+    pipe = redis_app.json().pipeline(transaction=False)
+    pipe.mget(keys, "$.tasks..name")
+    pipe.mget(keys, "$.tasks..status")
+    pipe.mget(keys, "$.tasks..priority")
+    pipe.mget(keys, "$.tasks..score")
+    pipe.mget(keys, "$.status")
+    pipe.mget(keys, "$.updated_at")
+    pipe.mget(keys, "$.principle_scores")
+    pipe.mget(keys, "$.subgroup_scores")
+    for score in SCORE_FIELDS:
+        pipe.mget(keys, f"$.{score}")
+    results = pipe.execute()
+
+    sessions = []
+    for i in range(len(keys)):
+        names = results[0][i]
+        if names is None:
+            sessions.append(None)
+            continue
+        sessions.append(StoredSession(
+            names=names,
+            statuses=results[1][i],
+            priorities=results[2][i],
+            task_scores=results[3][i],
+            status=_first_match(results[4][i]),
+            updated_at=_first_match(results[5][i]),
+            scores=[_first_match(results[8 + j][i]) for j in range(len(SCORE_FIELDS))],
+            principle_scores=_first_match(results[6][i]),
+            subgroup_scores=_first_match(results[7][i]),
+        ))
+    return sessions
+
+
+def pack_statuses(sessions: list[StoredSession], index: IndicatorIndex) -> np.ndarray:
+    """
+    Packs the Task statuses of a batch of sessions in a (sessions x indicators) matrix
+    of status codes. Indicators without Task in a session are coded as MISSING.
+
+    :param sessions: Sessions as returned by `fetch_batch` (without the deleted ones)
+    :param index: The indicator index
+    :return: The status codes matrix
+    """
+    lengths = np.fromiter((len(s.names) for s in sessions), dtype=np.int64, count=len(sessions))
+    names = [name for s in sessions for name in s.names]
+    statuses = [status for s in sessions for status in s.statuses]
+
+    rows = np.repeat(np.arange(len(sessions)), lengths)
+    columns = np.fromiter((index.ordinals.get(name, MISSING) for name in names), dtype=np.int64, count=len(names))
+    codes = np.fromiter((STATUS_CODES.get(status, MISSING) for status in statuses), dtype=np.int64, count=len(statuses))
+
+    # Ignore Tasks of indicators that no longer exist
+    known = columns != MISSING
+    matrix = np.full((len(sessions), len(index.ordinals)), MISSING, dtype=np.int64)
+    matrix[rows[known], columns[known]] = codes[known]
+    return matrix
+
+
+def compute_scores(matrix: np.ndarray, index: IndicatorIndex) -> tuple[dict[str, np.ndarray], np.ndarray]:
+    """
+    Computes the scores of a batch of sessions (see `SessionHandler.update_session_data`)
+
+    :param matrix: Status codes matrix (see `pack_statuses`)
+    :param index: The indicator index
+    :return: A mapping of score names to the scores of each session (NaN when undefined),
+        and whether each session is finished
+    """
+    present = matrix != MISSING
+    scores = np.where(present, index.status_scores[np.where(present, matrix, 0)], 0.0)
+    applicable = present & (matrix != STATUS_CODES[TaskStatus.not_applicable.value])
+    essential = present & index.essential
+    nonessential = present & ~index.essential
+
+    def ratio(numerator, mask):
+        count = mask.sum(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(count > 0, numerator / count, np.nan)
+
+    def passed(mask):
+        return (scores * mask).sum(axis=1)
+
+    results = {
+        "score_all_essential": ratio(passed(essential), essential),
+        "score_all_nonessential": ratio(passed(nonessential), nonessential),
+        "score_all": ratio(passed(present), present),
+        "score_applicable_essential": ratio(passed(essential & applicable), essential & applicable),
+        "score_applicable_nonessential": ratio(passed(nonessential & applicable), nonessential & applicable),
+        "score_applicable_all": ratio(passed(applicable), applicable),
+        "ratio_not_applicable": ratio((present & ~applicable).sum(axis=1), present),
+    }
+
+    running_codes = [STATUS_CODES[TaskStatus.queued.value], STATUS_CODES[TaskStatus.started.value]]
+    running = np.isin(matrix, running_codes) & index.top_level
+    finished = ~running.any(axis=1)
+    return results, finished
+
+
+def compute_group_scores(matrix: np.ndarray, index: IndicatorIndex) -> tuple[list[dict], list[dict]]:
+    """
+    Computes the scores of each FAIR principle and subgroup for a batch of sessions
+    (see `SessionHandler.compute_group_scores`)
+
+    :param matrix: Status codes matrix (see `pack_statuses`)
+    :param index: The indicator index
+    :return: The principle scores and the subgroup scores of each session, as stored in sessions
+    """
+    present = matrix != MISSING
+    scores = np.where(present, index.status_scores[np.where(present, matrix, 0)], 0.0)
+    applicable = present & (matrix != STATUS_CODES[TaskStatus.not_applicable.value])
+
+    def group_scores(groups, members):
+        # (sessions x groups) aggregates
+        tasks = present.astype(np.int64) @ members.T
+        applicables = applicable.astype(np.int64) @ members.T
+        passed = scores @ members.T
+        sessions = []
+        for row in range(matrix.shape[0]):
+            session_scores = {}
+            for column, group in enumerate(groups):
+                count, count_applicable = int(tasks[row, column]), int(applicables[row, column])
+                if not count:
+                    continue
+                group_passed = float(passed[row, column])
+                session_scores[group] = {
+                    "tasks": count,
+                    "applicable": count_applicable,
+                    "passed": group_passed,
+                    "score": group_passed / count,
+                    "score_applicable": group_passed / count_applicable if count_applicable else None,
+                }
+            sessions.append(session_scores)
+        return sessions
+
+    return (
+        group_scores(index.principles, index.principle_members),
+        group_scores(index.subgroups, index.subgroup_members),
+    )
+
+
+def _group_scores_differ(old: Optional[dict], new: dict) -> bool:
+    """Compares stored group scores with recalculated ones, ignoring rounding errors"""
+    if not old or old.keys() != new.keys():
+        return True
+    return any(
+        old[group]["tasks"] != new[group]["tasks"]
+        or old[group]["applicable"] != new[group]["applicable"]
+        or not np.isclose(old[group]["passed"], new[group]["passed"])
+        for group in new
+    )
+
+
+def rescore_batch(
+    redis_app: Redis,
+    keys: list[str],
+    index: IndicatorIndex,
+    report: RescoreReport,
+    dry_run: bool = False,
+) -> list[str]:
+    """
+    Rescores a batch of sessions and writes the changes back in a single pipeline.
+    Sessions updated since they were read are left unchanged, and not counted in the report.
+
+    :param redis_app: A redis client
+    :param keys: The keys of the sessions to rescore
+    :param index: The indicator index
+    :param report: The report updated with the results of this batch
+    :param dry_run: If True, nothing is written back
+    :return: The keys of the sessions updated since they were read, to rescore again
+    """
+    fetched = fetch_batch(redis_app, keys)
+    keys = [key for key, session in zip(keys, fetched) if session is not None]
+    sessions = [session for session in fetched if session is not None]
+    if not sessions:
+        return []
+
+    matrix = pack_statuses(sessions, index)
+    new_scores, finished = compute_scores(matrix, index)
+    principle_scores, subgroup_scores = compute_group_scores(matrix, index)
+    old_scores = np.array(
+        [[np.nan if value is None else value for value in session.scores] for session in sessions],
+        dtype=float,
+    )
+
+    changed = np.zeros(len(sessions), dtype=bool)
+    deltas = {}
+    for j, score in enumerate(SCORE_FIELDS):
+        deltas[score] = np.abs(np.nan_to_num(new_scores[score], nan=0.0) - np.nan_to_num(old_scores[:, j], nan=0.0))
+        changed |= ~np.isclose(new_scores[score], old_scores[:, j], equal_nan=True)
+
+    write_if_unchanged = redis_app.register_script(WRITE_IF_UNCHANGED_SCRIPT)
+    pipe = redis_app.pipeline(transaction=False)
+    rewritten = np.zeros(len(sessions), dtype=bool)
+    written = []
+    for i, key in enumerate(keys):
+        session = sessions[i]
+        outdated_priorities = {
+            name for name, priority in zip(session.names, session.priorities)
+            if name in index.ordinals and priority != index.priorities[index.ordinals[name]]
+        }
+        outdated_task_scores = {
+            status for status, task_score in zip(session.statuses, session.task_scores)
+            if status in STATUS_CODES and task_score != index.status_scores[STATUS_CODES[status]]
+        }
+        finishes = bool(finished[i]) and session.status != SessionStatus.finished.value
+        groups_changed = (
+            _group_scores_differ(session.principle_scores, principle_scores[i])
+            or _group_scores_differ(session.subgroup_scores, subgroup_scores[i])
+        )
+        if not (changed[i] or outdated_priorities or outdated_task_scores or finishes or groups_changed):
+            continue
+        rewritten[i] = True
+        if dry_run:
+            continue
+
+        values = {}
+        for score in SCORE_FIELDS:
+            value = new_scores[score][i]
+            values[f"$.{score}"] = None if np.isnan(value) else float(value)
+        values["$.principle_scores"] = principle_scores[i]
+        values["$.subgroup_scores"] = subgroup_scores[i]
+        if finishes:
+            values["$.status"] = SessionStatus.finished.value
+        for name in outdated_priorities:
+            values[f'$.tasks..[?(@.name=="{name}")].priority'] = index.priorities[index.ordinals[name]]
+        for status in outdated_task_scores:
+            values[f'$.tasks..[?(@.status=="{status}")].score'] = float(index.status_scores[STATUS_CODES[status]])
+
+        args = [json.dumps(session.updated_at)]
+        for path, value in values.items():
+            args.extend([path, json.dumps(value)])
+        write_if_unchanged(keys=[key], args=args, client=pipe)
+        written.append(i)
+
+    updated = np.zeros(len(sessions), dtype=bool)
+    if written:
+        for i, result in zip(written, pipe.execute()):
+            updated[i] = not int(result)
+
+    done = ~updated
+    report.sessions += int(done.sum())
+    report.changed += int((rewritten & done).sum())
+    for score in SCORE_FIELDS:
+        if done.any():
+            report.max_delta[score] = max(report.max_delta[score], float(deltas[score][done].max()))
+            report.total_delta[score] += float(deltas[score][done].sum())
+    return [key for key, session_updated in zip(keys, updated) if session_updated]
+
+
+def rescore_sessions(
+    redis_apps: list[Redis],
+    batch_size: int = 1000,
+    dry_run: bool = False,
+    retries: int = 3,
+) -> RescoreReport:
+    """
+    Rescores all the sessions stored in redis
+
+    :param redis_apps: The clients of the redis nodes storing sessions
+    :param batch_size: Number of sessions read and written per round-trip
+    :param dry_run: If True, only reports the changes that would be made
+    :param retries: Number of times sessions updated while being rescored are rescored again
+    :return: The report of the run
+    """
+    index = IndicatorIndex.from_indicators()
+    report = RescoreReport()
+    start = time.perf_counter()
+    for redis_app in redis_apps:
+        for keys in iter_session_keys(redis_app, batch_size):
+            updated = rescore_batch(redis_app, keys, index, report, dry_run)
+            for _ in range(retries):
+                if not updated:
+                    break
+                report.retried += len(updated)
+                updated = rescore_batch(redis_app, updated, index, report, dry_run)
+            report.skipped += len(updated)
+    report.duration = time.perf_counter() - start
+    return report
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Recalculates the scores of all stored sessions")
+    parser.add_argument("--dry-run", action="store_true", help="Report score changes without writing them")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Number of sessions per redis round-trip")
+    parser.add_argument("--retries", type=int, default=3,
+                        help="Number of times sessions updated while being rescored are rescored again")
+    args = parser.parse_args(argv)
+
+    report = rescore_sessions(
+        list(get_redis_nodes(get_settings().redis_connect_retries).values()),
+        batch_size=args.batch_size,
+        dry_run=args.dry_run,
+        retries=args.retries,
+    )
+    print(report)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
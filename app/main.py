@@ -1,10 +1,25 @@
-from fastapi import FastAPI
-from fastapi.responses import RedirectResponse
+import math
+import logging
+
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, RedirectResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from redis.exceptions import ConnectionError, ResponseError, TimeoutError
 
+from app.middleware import AdmissionControlMiddleware
 from app.routers.router import base_router
+from app.routers.openapi_doc import create_openapi_doc_router
 from app.metrics.assessments_lifespan import get_tasks_definitions
 from app.dependencies.settings import get_settings
+from app.redis_controller import get_redis_nodes, close_redis_app
+from app.redis_controller.session_index import create_session_index
+from app.redis_controller.write_buffer import close_write_buffer
+from app.reports import close_render_pool
+
+logger = logging.getLogger(__name__)
 
 
 tags_metadata = [
@@ -23,6 +38,11 @@ tags_metadata = [
         "description": "FAIR Combine assessment session. Endpoints to create a new session, to load a previously exported session, "
                        "or to display the details of an existing session."
     },
+    {
+        "name": "Admin",
+        "description": "Diagnostics of the application (memory used by sessions, ...). Endpoints need the admin key "
+                       "in the X-Admin-Key header, and are disabled when no admin key is set."
+    },
 
 ]
 
@@ -39,25 +59,78 @@ describing how FAIR their model is.
 """
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Application lifespan: loads the FAIR indicators and connects to redis.
+    On shutdown, the sessions still in the write buffer are written to redis, and the
+    report rendering workers are stopped.
+    A redis server that cannot be reached at startup (connection attempts are retried as
+    configured by `redis_connect_retries`) does not prevent the application from starting:
+    the connection is attempted again, once, by the requests needing it.
+
+    :param app: The FastAPI application
+    :return: None
+    """
+    async with get_tasks_definitions(app):
+        try:
+            redis_nodes = await run_in_threadpool(get_redis_nodes, get_settings().redis_connect_retries)
+            for redis_app in redis_nodes.values():
+                await run_in_threadpool(create_session_index, redis_app)
+        except ConnectionError as e:
+            logger.warning(f"Starting without redis connection: {str(e)}")
+        except ResponseError as e:
+            logger.warning(f"Session search index could not be created: {str(e)}")
+        yield
+        await run_in_threadpool(close_write_buffer)
+        await run_in_threadpool(close_render_pool)
+        close_redis_app()
+
+
+config = get_settings()
 app = FastAPI(
     title="FAIR Combine API",
     description=description,
     version="0.0.1",
     openapi_tags=tags_metadata,
-    lifespan=get_tasks_definitions,
+    lifespan=lifespan,
+    # The prebuilt schema and documentation pages are served instead of generating them
+    openapi_url=None if config.prebuilt_openapi_doc else "/openapi.json",
 )
 app.include_router(base_router)
+if config.prebuilt_openapi_doc:
+    app.include_router(create_openapi_doc_router(app))
 
-config = get_settings()
+# The last middleware added is the outermost one: responses of the admission control (429, 503)
+# are compressed and get the CORS headers, for browsers to read them
+app.add_middleware(AdmissionControlMiddleware)
+app.add_middleware(
+    GZipMiddleware,
+    minimum_size=config.compression_minimum_size,
+    compresslevel=config.compression_level,
+)
 origins = config.allowed_origins
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After"],
 )
 
 
+@app.exception_handler(ConnectionError)
+@app.exception_handler(TimeoutError)
+async def redis_unavailable(request: Request, exc: Exception) -> JSONResponse:
+    """Requests needing a redis node that is unavailable or did not answer in time get a 503 status"""
+    logger.warning(f"Redis unavailable for {request.method} {request.url.path}: {str(exc)}")
+    return JSONResponse(
+        {"detail": "The database is unavailable, please retry later"},
+        status_code=503,
+        headers={"Retry-After": str(math.ceil(config.redis_probe_interval))},
+    )
+
+
 @app.get("/", include_in_schema=False)
 async def index():
     return RedirectResponse("/redoc")
@@ -1,27 +1,40 @@
 import re
+import json
+import hashlib
 
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from csv import DictReader
+from pathlib import Path
+from threading import Lock
 
 import app.models as models
 
+METRICS_PATH = Path(__file__).parent / "metrics.csv"
+SNAPSHOT_PATH = Path(__file__).parent / "metrics.snapshot.json"
+
 fair_indicators = {}
+_fair_indicators_lock = Lock()
 
+indicator_groups = {}
 
-@asynccontextmanager
-async def get_tasks_definitions(app: FastAPI):
-    """
-    Method to parse `metrics.csv` and load its content in memory for use by `app`
-    NB: This method is loaded in app lifespan. See [lifespan events](https://fastapi.tiangolo.com/advanced/events/)
+_indicator_regex = re.compile("^CA\-RDA\-([FAIR][1-9](\.[0-9])?)\-")
 
-    :param app: The FastAPI application that will use the content of `metrics.csv`
-    :return: None
+
+def _metrics_checksum(metrics_path: Path = METRICS_PATH) -> str:
+    """Returns the sha256 digest of `metrics.csv`, used to detect stale snapshots"""
+    return hashlib.sha256(metrics_path.read_bytes()).hexdigest()
+
+
+def parse_indicators(metrics_path: Path = METRICS_PATH) -> dict[str, "models.Indicator"]:
     """
-    regex = re.compile("^CA\-RDA\-([FAIR][1-9](\.[0-9])?)\-")
+    Parses `metrics.csv` into a mapping of indicator names to Indicator objects
 
+    :param metrics_path: The path towards the csv file describing the indicators
+    :return: A mapping of indicator names to Indicator objects, in file order
+    """
     def parse_line(line):
-        sub_group = regex.search(line["TaskName"]).groups()[0]
+        sub_group = _indicator_regex.search(line["TaskName"]).groups()[0]
         task_group = sub_group[0]
         return {
             line["TaskName"]: models.Indicator(
@@ -35,9 +48,107 @@ async def get_tasks_definitions(app: FastAPI):
             )
         }
 
-    # Get the list of tasks and their definitions from internal file
-    with open("app/metrics/metrics.csv", "r") as file_handler:
+    indicators = {}
+    with open(metrics_path, "r") as file_handler:
         csv_reader = DictReader(file_handler, dialect="unix")
-        [fair_indicators.update(parse_line(line)) for line in csv_reader]
+        [indicators.update(parse_line(line)) for line in csv_reader]
+    return indicators
+
+
+def dump_indicators_snapshot(
+    snapshot_path: Path = SNAPSHOT_PATH,
+    metrics_path: Path = METRICS_PATH,
+) -> None:
+    """
+    Serializes the parsed indicators to a JSON snapshot, so that worker and CLI
+    processes can skip parsing `metrics.csv`. The snapshot records the checksum of
+    the csv file it was built from and is ignored once the csv changes.
+
+    :param snapshot_path: Where to write the snapshot
+    :param metrics_path: The csv file the snapshot is built from
+    :return: None
+    """
+    indicators = parse_indicators(metrics_path)
+    snapshot = {
+        "source_sha256": _metrics_checksum(metrics_path),
+        "indicators": [indicator.dict() for indicator in indicators.values()],
+    }
+    with open(snapshot_path, "w") as file_handler:
+        json.dump(snapshot, file_handler)
+
+
+def _load_indicators_snapshot(
+    snapshot_path: Path = SNAPSHOT_PATH,
+    metrics_path: Path = METRICS_PATH,
+) -> dict[str, "models.Indicator"]:
+    """
+    Loads the indicators from a snapshot written by `dump_indicators_snapshot`.
+    Snapshot content was validated when written, so validation is skipped here.
+
+    :return: A mapping of indicator names to Indicator objects, or an empty dict
+        if the snapshot is missing or stale
+    """
+    try:
+        with open(snapshot_path, "r") as file_handler:
+            snapshot = json.load(file_handler)
+    except (OSError, ValueError):
+        return {}
+
+    if snapshot.get("source_sha256") != _metrics_checksum(metrics_path):
+        return {}
 
+    return {
+        indicator["name"]: models.Indicator.construct(**indicator)
+        for indicator in snapshot["indicators"]
+    }
+
+
+def get_fair_indicators() -> dict[str, "models.Indicator"]:
+    """
+    Returns the FAIR indicators, loading them on first use.
+    Indicators are read from the snapshot when it is up-to-date with `metrics.csv`,
+    otherwise `metrics.csv` is parsed. The result is cached in `fair_indicators`.
+
+    :return: A mapping of indicator names to Indicator objects
+    """
+    if fair_indicators:
+        return fair_indicators
+
+    with _fair_indicators_lock:
+        if not fair_indicators:
+            fair_indicators.update(_load_indicators_snapshot() or parse_indicators())
+    return fair_indicators
+
+
+def get_indicator_groups() -> dict[str, tuple[str, str]]:
+    """
+    Returns the index of the FAIR principle and subgroup of each indicator
+    (e.g. `"CA-RDA-A1.1-01MA": ("A", "A1.1")`), built on first use.
+
+    :return: A mapping of indicator names to (group, sub_group) tuples
+    """
+    if not indicator_groups:
+        indicator_groups.update({
+            name: (indicator.group, indicator.sub_group)
+            for name, indicator in get_fair_indicators().items()
+        })
+    return indicator_groups
+
+
+@asynccontextmanager
+async def get_tasks_definitions(app: FastAPI):
+    """
+    Method to parse `metrics.csv` and load its content in memory for use by `app`
+    NB: This method is loaded in app lifespan. See [lifespan events](https://fastapi.tiangolo.com/advanced/events/)
+
+    :param app: The FastAPI application that will use the content of `metrics.csv`
+    :return: None
+    """
+    get_fair_indicators()
+    get_indicator_groups()
     yield
+
+
+if __name__ == "__main__":
+    # Build the indicators snapshot (e.g. `python -m app.metrics.assessments_lifespan`)
+    dump_indicators_snapshot()
@@ -0,0 +1,323 @@
+import os
+import re
+import socket
+import hashlib
+import zipfile
+import ipaddress
+
+from http.client import HTTPConnection, HTTPSConnection
+from tempfile import SpooledTemporaryFile
+from typing import BinaryIO, Iterable, Optional
+from urllib.error import HTTPError
+from urllib.parse import urlparse, unquote
+from urllib.request import (
+    HTTPDefaultErrorHandler,
+    HTTPErrorProcessor,
+    HTTPHandler,
+    HTTPRedirectHandler,
+    HTTPSHandler,
+    OpenerDirector,
+    Request,
+    UnknownHandler,
+)
+
+# Part of the assessed resource each indicator is about, given by the end of its name
+# (e.g. `CA-RDA-F1-01MA` is about the metadata of the archive)
+_indicator_part_regex = re.compile(r"\d(Archive|Model|MA|MM)\b")
+INDICATOR_PARTS = {
+    "Archive": "archive",
+    "Model": "model",
+    "MA": "archive_metadata",
+    "MM": "model_metadata",
+}
+
+# Extensions of the archive members holding models. The models annotations are part of the models metadata
+MODEL_EXTENSIONS = (".xml", ".sbml", ".cellml")
+
+
+class ResourceTooLargeError(ValueError):
+    """Raised when the assessed resource is larger than the maximum size to fetch"""
+
+
+class ForbiddenResourceError(ValueError):
+    """
+    Raised when the assessed resource may not be fetched by the server: a file outside of the
+    directory of assessed files, or a url of a host with a non-public address
+    """
+
+
+# Content is read by chunks of this size (in bytes). Fetched resources are kept in memory up to
+# `_SPOOL_SIZE` bytes, in a temporary file beyond, for their archive directory to be read
+_CHUNK_SIZE = 64 * 1024
+_SPOOL_SIZE = 1024 * 1024
+
+
+def _archive_members(file: BinaryIO) -> Optional[dict[str, str]]:
+    """
+    Returns the fingerprint of each member of an archive (OMEX archives are zip files),
+    read from the archive directory without decompressing the members
+
+    :param file: The resource content, seekable
+    :return: Mapping of member names to their CRC-32 and size, or None if the resource is not an archive
+    """
+    if not zipfile.is_zipfile(file):
+        return None
+    try:
+        with zipfile.ZipFile(file) as archive:
+            return {
+                member.filename: f"{member.CRC:08x}:{member.file_size}"
+                for member in archive.infolist() if not member.is_dir()
+            }
+    except zipfile.BadZipFile:
+        return None
+
+
+def _fingerprint_content(stream: BinaryIO, max_size: int, copy: Optional[BinaryIO] = None) -> dict:
+    """
+    Fingerprints a resource, read by chunks
+
+    :param stream: The resource content
+    :param max_size: Maximum size (in bytes) of the resource
+    :param copy: File the content is copied to, for its archive directory to be read if `stream`
+        is not seekable
+    :return: The digest and size of the content, and the fingerprint of its archive members
+    :raise ResourceTooLargeError: If the resource is larger than `max_size`
+    """
+    digest = hashlib.sha256()
+    size = 0
+    while chunk := stream.read(_CHUNK_SIZE):
+        size += len(chunk)
+        if size > max_size:
+            raise ResourceTooLargeError(f"The resource is larger than {max_size} bytes")
+        digest.update(chunk)
+        if copy is not None:
+            copy.write(chunk)
+
+    return {
+        "sha256": digest.hexdigest(),
+        "size": size,
+        "members": _archive_members(copy if copy is not None else stream),
+    }
+
+
+def _check_address(address: str) -> None:
+    """
+    Refuses non-public IP addresses (loopback, private, link-local, reserved, multicast, ...)
+
+    :param address: An IPv4 or IPv6 address
+    :return: None
+    :raise ForbiddenResourceError: If the address is not public
+    """
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    if not ip.is_global or ip.is_multicast:
+        raise ForbiddenResourceError("The resource host does not have a public address")
+
+
+def _create_public_connection(address: tuple[str, int], timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None):
+    """
+    Replaces `socket.create_connection` for connections to assessed resources: the host is
+    resolved once, and refused if any of its addresses is not public, before connecting to the
+    checked addresses (the host cannot resolve to another address in between)
+    """
+    host, port = address
+    addresses = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    for *_, sockaddr in addresses:
+        _check_address(sockaddr[0])
+
+    error = None
+    for *_, sockaddr in addresses:
+        try:
+            return socket.create_connection(sockaddr[:2], timeout, source_address)
+        except OSError as e:
+            error = e
+    raise error
+
+
+class _PublicHTTPConnection(HTTPConnection):
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._create_connection = _create_public_connection
+
+
+class _PublicHTTPSConnection(HTTPSConnection):
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._create_connection = _create_public_connection
+
+
+class _PublicHTTPHandler(HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(_PublicHTTPConnection, req)
+
+
+class _PublicHTTPSHandler(HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(_PublicHTTPSConnection, req, context=self._context)
+
+
+class _PublicRedirectHandler(HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        if urlparse(newurl).scheme not in ("http", "https"):
+            raise ForbiddenResourceError("The resource url redirects to a non-HTTP url")
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+# Opener of the assessed urls: only HTTP(S) urls of public hosts, including after redirects.
+# Proxies set in the environment are not used, as the proxy address would be checked instead of the host
+_opener = OpenerDirector()
+for _handler in (
+    _PublicHTTPHandler(),
+    _PublicHTTPSHandler(),
+    _PublicRedirectHandler(),
+    HTTPDefaultErrorHandler(),
+    HTTPErrorProcessor(),
+    UnknownHandler(),
+):
+    _opener.add_handler(_handler)
+
+
+def _fetch_url(url: str, previous: dict, timeout: float, max_size: int) -> tuple[dict, bool]:
+    headers = {}
+    if previous.get("etag"):
+        headers["If-None-Match"] = previous["etag"]
+    if previous.get("last_modified"):
+        headers["If-Modified-Since"] = previous["last_modified"]
+
+    try:
+        with _opener.open(Request(url, headers=headers), timeout=timeout) as response:
+            length = response.headers.get("Content-Length")
+            if length is not None and length.isdigit() and int(length) > max_size:
+                raise ResourceTooLargeError(f"The resource is larger than {max_size} bytes")
+            with SpooledTemporaryFile(_SPOOL_SIZE) as copy:
+                fingerprint = _fingerprint_content(response, max_size, copy)
+            validators = {"etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified")}
+    except HTTPError as e:
+        if e.code == 304 and headers:
+            return previous, False
+        raise
+
+    fingerprint.update(validators)
+    # Servers without validators send the whole resource again: it is unchanged if its digest is
+    return fingerprint, fingerprint["sha256"] != previous.get("sha256")
+
+
+def _resolve_file(path: str, files_root: Optional[str]) -> str:
+    """
+    Returns the real path of an assessed file (symbolic links resolved), if it is in the
+    directory of assessed files
+
+    :param path: The path of the file
+    :param files_root: The directory of assessed files, None if files may not be read
+    :return: The real path of the file
+    :raise ForbiddenResourceError: If the file is not in `files_root`
+    """
+    if files_root is None:
+        raise ForbiddenResourceError("Files cannot be assessed again on this server")
+    root = os.path.realpath(files_root)
+    real_path = os.path.realpath(path)
+    if os.path.commonpath((root, real_path)) != root:
+        raise ForbiddenResourceError("The file is not in the directory of assessed files")
+    return real_path
+
+
+def _read_file(path: str, previous: dict, max_size: int) -> tuple[dict, bool]:
+    with open(path, "rb") as file_handler:
+        stat = os.fstat(file_handler.fileno())
+        if previous.get("size") == stat.st_size and previous.get("mtime_ns") == stat.st_mtime_ns:
+            return previous, False
+        if stat.st_size > max_size:
+            raise ResourceTooLargeError(f"The resource is larger than {max_size} bytes")
+        fingerprint = {**_fingerprint_content(file_handler, max_size), "mtime_ns": stat.st_mtime_ns}
+    return fingerprint, fingerprint["sha256"] != previous.get("sha256")
+
+
+def fetch_resource_fingerprint(
+    path: str,
+    previous: Optional[dict],
+    timeout: float,
+    max_size: int,
+    files_root: Optional[str],
+) -> tuple[dict, bool]:
+    """
+    Fetches the fingerprint of an assessed resource: the digest of its content and of its
+    archive members. The resource is only downloaded (or read) if it may have changed since
+    `previous` was taken: urls are fetched with conditional requests (ETag and Last-Modified
+    validators), files are read if their size or modification time changed. Only the urls of
+    public hosts and the files of `files_root` are fetched.
+
+    :param path: The url (`http(s)://` or `file://`) or the path of the resource
+    :param previous: The fingerprint taken on the previous assessment, if any
+    :param timeout: Delay (in seconds) after which fetching a url fails
+    :param max_size: Maximum size (in bytes) of the resource
+    :param files_root: The directory files are read from, None if files may not be read
+    :return: A tuple with the fingerprint of the resource, and whether the resource changed
+        (always True without previous fingerprint)
+    :raise OSError: If the resource could not be fetched (including HTTP errors)
+    :raise ResourceTooLargeError: If the resource is larger than `max_size`
+    :raise ForbiddenResourceError: If the resource may not be fetched
+    """
+    previous = previous or {}
+    url = urlparse(path)
+    if url.scheme in ("http", "https"):
+        return _fetch_url(path, previous, timeout, max_size)
+    if url.scheme not in ("", "file"):
+        raise ForbiddenResourceError(f"Resources with {url.scheme} urls cannot be fetched")
+    file_path = _resolve_file(unquote(url.path) if url.scheme == "file" else path, files_root)
+    return _read_file(file_path, previous, max_size)
+
+
+def changed_parts(previous: Optional[dict], current: dict) -> Optional[set[str]]:
+    """
+    Compares the fingerprints of a resource, and returns the parts of the resource that changed
+    (see `INDICATOR_PARTS`): changed models change the models and their metadata, a changed
+    manifest changes the archive and its metadata, changed RDF files change the metadata of the
+    archive and of the models. Added and removed members change the archive.
+
+    :param previous: The fingerprint of the resource on the previous assessment
+    :param current: The current fingerprint of the resource
+    :return: The set of changed parts, or None if the changes are unknown (the resource is not an
+        archive, or was not fingerprinted before): the whole resource is then considered changed
+    """
+    if previous is None or previous.get("members") is None or current.get("members") is None:
+        return None if previous is None or previous.get("sha256") != current.get("sha256") else set()
+
+    before, after = previous["members"], current["members"]
+    parts = set()
+    if before.keys() != after.keys():
+        parts.add("archive")
+    modified = {name for name in before.keys() & after.keys() if before[name] != after[name]}
+    for name in (before.keys() ^ after.keys()) | modified:
+        lower_name = os.path.basename(name).lower()
+        if lower_name == "manifest.xml":
+            parts.update(("archive", "archive_metadata"))
+        elif lower_name.endswith(".rdf"):
+            parts.update(("archive_metadata", "model_metadata"))
+        elif lower_name.endswith(MODEL_EXTENSIONS):
+            parts.update(("model", "model_metadata"))
+        else:
+            parts.add("archive")
+    return parts
+
+
+def affected_indicators(indicators: Iterable[str], parts: Optional[set[str]]) -> set[str]:
+    """
+    Returns the indicators assessing the changed parts of a resource
+
+    :param indicators: Indicator names
+    :param parts: The changed parts of the resource (see `changed_parts`), None if unknown
+    :return: The indicators to assess again. All of them if the changes are unknown, and the
+        indicators not related to a part of the resource if anything changed
+    """
+    if parts is None:
+        return set(indicators)
+    if not parts:
+        return set()
+
+    affected = set()
+    for indicator in indicators:
+        match = _indicator_part_regex.search(indicator)
+        if match is None or INDICATOR_PARTS[match.group(1)] in parts:
+            affected.add(indicator)
+    return affected
@@ -0,0 +1 @@
+from .admission import AdmissionControlMiddleware, get_client_key, get_client_ip_key, take_tokens
@@ -0,0 +1,213 @@
+import re
+import hmac
+import math
+import time
+import hashlib
+import logging
+
+from typing import Optional
+
+from anyio.to_thread import current_default_thread_limiter
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from redis.exceptions import RedisError
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.dependencies.settings import get_settings
+from app.redis_controller import get_redis_app
+from app.redis_controller.circuit_breaker import is_degraded
+
+logger = logging.getLogger(__name__)
+
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+# Routes sent with a write method which do not modify anything (their parameters do not fit in a
+# query string): they are neither rate-limited nor refused while the API is read-only
+READ_ONLY_ROUTES = {("POST", "/sessions/compare")}
+
+_session_path_regex = re.compile("^/session/([^/]+)/")
+
+# Token buckets are stored as hashes (tokens left, time of last refill). All buckets given
+# as KEYS must have enough tokens left for the request to be admitted, in which case these
+# tokens are taken from each. ARGV holds the rate (tokens per second), burst size and cost
+# (tokens taken, at most the burst size) of each bucket.
+# Returns whether the request is admitted and, if not, the delay (in seconds) before it can be.
+TOKEN_BUCKET_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+local levels = {}
+local retry_after = 0
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[3 * i - 2])
+    local burst = tonumber(ARGV[3 * i - 1])
+    local cost = math.min(burst, tonumber(ARGV[3 * i]))
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or burst
+    local ts = tonumber(bucket[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+    levels[i] = tokens
+    if tokens < cost then
+        retry_after = math.max(retry_after, (cost - tokens) / rate)
+    end
+end
+local admitted = 0
+if retry_after == 0 then
+    admitted = 1
+end
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[3 * i - 2])
+    local burst = tonumber(ARGV[3 * i - 1])
+    local cost = math.min(burst, tonumber(ARGV[3 * i]))
+    redis.call('HSET', key, 'tokens', tostring(levels[i] - admitted * cost), 'ts', tostring(now))
+    redis.call('PEXPIRE', key, math.ceil(burst / rate * 1000))
+end
+return {admitted, tostring(retry_after)}
+"""
+
+_token_bucket = None
+
+
+def take_tokens(buckets: list[tuple[str, float, int, int]]) -> Optional[float]:
+    """
+    Takes tokens from each of the given buckets, if all of them have enough tokens left
+
+    :param buckets: List of (key, rate, burst, cost) tuples
+    :return: None if the request is admitted, the delay (in seconds) before a retry otherwise
+    """
+    global _token_bucket
+    redis_app = get_redis_app()
+    if _token_bucket is None:
+        _token_bucket = redis_app.register_script(TOKEN_BUCKET_SCRIPT)
+
+    args = []
+    for _, rate, burst, cost in buckets:
+        args.extend([rate, burst, cost])
+    admitted, retry_after = _token_bucket(keys=[key for key, _, _, _ in buckets], args=args, client=redis_app)
+    return None if int(admitted) else float(retry_after)
+
+
+def get_client_ip_key(request: Request) -> str:
+    """Identifies the client sending a request by IP address"""
+    return "ip:" + (request.client.host if request.client else "unknown")
+
+
+def get_client_key(request: Request) -> str:
+    """
+    Identifies the client sending a request, by API key if it is one of the issued keys
+    (`api_keys` setting), or by IP address. Other keys are ignored, so that clients cannot
+    pass for new ones by sending new keys
+    """
+    api_key = request.headers.get("X-API-Key")
+    if api_key and any(hmac.compare_digest(api_key.encode(), key.encode()) for key in get_settings().api_keys):
+        return "key:" + hashlib.sha256(api_key.encode()).hexdigest()[:16]
+    return get_client_ip_key(request)
+
+
+def is_write_request(request: Request) -> bool:
+    """Whether a request may modify data: sent with a write method, to a route not in READ_ONLY_ROUTES"""
+    return request.method in WRITE_METHODS and (request.method, request.url.path) not in READ_ONLY_ROUTES
+
+
+class AdmissionControlMiddleware(BaseHTTPMiddleware):
+    """
+    Protects the application against overload and misbehaving clients:
+
+    - Requests are shed with a 503 status when the threadpool serving the routes has
+      too many requests waiting, or when redis became too slow to answer.
+    - Write requests (e.g. `POST /session`, `PATCH /session/{id}/tasks/{task_id}`) are
+      rate-limited with redis token buckets, per client (IP address, and issued API key if
+      any) and per session. Limited requests get a 429 status. `POST /sessions/bulk` is also
+      charged for each session it creates, by the route itself (see `take_tokens`).
+    - While a redis node is unavailable (see `CircuitBreaker`), the API is read-only: write
+      requests are refused with a 503 status, and recently read sessions are served from memory.
+
+    These responses come with a `Retry-After` header.
+    """
+    def __init__(self, app) -> None:
+        super().__init__(app)
+        self.config = get_settings()
+        self.redis_latency = 0.0
+        self.redis_latency_measured_at = 0.0
+
+    def client_key(self, request: Request) -> str:
+        """Identifies the client sending a request (see `get_client_key`)"""
+        return get_client_key(request)
+
+    def overloaded(self) -> bool:
+        """
+        Checks whether the application is too busy to take more requests.
+        Redis latency is only trusted for `admission_latency_window` seconds after being
+        measured, so that requests are let through again to measure it once redis recovers.
+        """
+        waiting = current_default_thread_limiter().statistics().tasks_waiting
+        redis_slow = (
+            self.redis_latency > self.config.admission_max_redis_latency
+            and time.monotonic() - self.redis_latency_measured_at < self.config.admission_latency_window
+        )
+        return waiting > self.config.admission_max_queue_depth or redis_slow
+
+    def take_tokens(self, buckets: list[tuple[str, float, int, int]]) -> Optional[float]:
+        """
+        Takes tokens from the given buckets (see `take_tokens`). Also records how long
+        redis took to answer, to detect when redis is overloaded.
+
+        :param buckets: List of (key, rate, burst, cost) tuples
+        :return: None if the request is admitted, the delay (in seconds) before a retry otherwise
+        """
+        start = time.perf_counter()
+        retry_after = take_tokens(buckets)
+        latency = time.perf_counter() - start
+        # Exponentially weighted moving average, to smooth out isolated slow calls
+        self.redis_latency = 0.8 * self.redis_latency + 0.2 * latency
+        self.redis_latency_measured_at = time.monotonic()
+        return retry_after
+
+    async def dispatch(self, request: Request, call_next):
+        if self.overloaded():
+            return JSONResponse(
+                {"detail": "The server is overloaded, please retry later"},
+                status_code=503,
+                headers={"Retry-After": str(self.config.admission_retry_after)},
+            )
+
+        write_request = is_write_request(request)
+        if write_request and is_degraded():
+            return JSONResponse(
+                {"detail": "The database is unavailable, only read requests are served for now"},
+                status_code=503,
+                headers={"Retry-After": str(math.ceil(self.config.redis_probe_interval))},
+            )
+
+        if write_request and self.config.rate_limit_enabled:
+            # Clients sending an issued API key are limited by key, and by IP address as well
+            client_keys = dict.fromkeys((get_client_ip_key(request), self.client_key(request)))
+            buckets = [(
+                f"ratelimit:client:{client_key}",
+                self.config.rate_limit_client_rate,
+                self.config.rate_limit_client_burst,
+                1,
+            ) for client_key in client_keys]
+            session_match = _session_path_regex.match(request.url.path)
+            if session_match is not None:
+                buckets.append((
+                    f"ratelimit:session:{session_match.group(1)}",
+                    self.config.rate_limit_session_rate,
+                    self.config.rate_limit_session_burst,
+                    1,
+                ))
+
+            try:
+                retry_after = await run_in_threadpool(self.take_tokens, buckets)
+            except RedisError as e:
+                # Do not refuse requests because the rate limiter is unavailable
+                logger.warning(f"Rate limiter unavailable: {str(e)}")
+                retry_after = None
+
+            if retry_after is not None:
+                return JSONResponse(
+                    {"detail": "Too many requests, please slow down"},
+                    status_code=429,
+                    headers={"Retry-After": str(math.ceil(retry_after))},
+                )
+
+        return await call_next(request)
@@ -1,4 +1,21 @@
-from .session import Session, SessionStatus, SessionHandler, SessionSubjectIn, SubjectType
+from .session import (
+    Session,
+    SessionStatus,
+    SessionHandler,
+    SessionSubjectIn,
+    SubjectType,
+    TaskSelection,
+    ReportFormat,
+    SessionSortField,
+    SessionSummary,
+    SessionSearchResult,
+    SessionScores,
+    GroupScore,
+    TaskStatusChange,
+    SessionHistoryEvent,
+    SessionHistory,
+    SessionComparison,
+)
 from .tasks import Task, TaskStatus, Indicator, TaskPriority, IndicatorDependency
 
 __all__ = [
@@ -11,5 +28,16 @@ __all__ = [
     SessionHandler,
     SessionSubjectIn,
     SubjectType,
+    TaskSelection,
+    ReportFormat,
+    SessionSortField,
+    SessionSummary,
+    SessionSearchResult,
+    SessionScores,
+    GroupScore,
+    TaskStatusChange,
+    SessionHistoryEvent,
+    SessionHistory,
+    SessionComparison,
     IndicatorDependency,
 ]
\ No newline at end of file
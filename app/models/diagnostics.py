@@ -0,0 +1,136 @@
+from pydantic import BaseModel
+from typing import Optional
+
+
+class HistogramBucket(BaseModel):
+    """
+    A bucket of a histogram
+
+    - *le*: Upper bound (inclusive) of the values counted in this bucket. Null for the last bucket
+    - *count*: Number of values in this bucket
+    """
+    le: Optional[int]
+    count: int
+
+
+class Distribution(BaseModel):
+    """
+    Distribution of a measure over the sampled sessions. Statistics are null without samples
+
+    - *samples*: Number of sessions measured
+    - *mean*, *p50*, *p95*, *max*: Mean, median, 95th percentile and maximum of the measure
+    - *histogram*: Number of sessions per bucket of the measure
+    """
+    samples: int
+    mean: Optional[float]
+    p50: Optional[float]
+    p95: Optional[float]
+    max: Optional[float]
+    histogram: list[HistogramBucket]
+
+
+class RedisNodeMemory(BaseModel):
+    """
+    Memory used by a redis node, and by a sample of its sessions
+
+    - *address*: The `host:port` address of the node
+    - *keys*: Number of keys stored in the node
+    - *used_memory*, *used_memory_peak*: Bytes currently used by the node, and the most it used
+    - *document_bytes*: Bytes used by the JSON document of each sampled session (`MEMORY USAGE`).
+        Empty if the node refuses `MEMORY USAGE` commands
+    - *history_bytes*: Bytes used by the history of each sampled session
+    - *tasks*: Number of Tasks in the document of each sampled session (Tasks with several
+        parents are counted once per parent, as they are stored)
+    - *error*: Why the node could not be measured (e.g. unavailable). Other fields are then empty
+    """
+    address: str
+    keys: Optional[int]
+    used_memory: Optional[int]
+    used_memory_peak: Optional[int]
+    document_bytes: Distribution
+    history_bytes: Distribution
+    tasks: Distribution
+    error: Optional[str]
+
+
+class ObjectFootprint(BaseModel):
+    """
+    Memory held by Python objects of the API worker
+
+    - *items*: Number of entries of a cache, or of live instances of a class
+    - *objects*: Number of Python objects reachable from them (shared objects, such as classes, excluded)
+    - *bytes*: Sum of the sizes of these objects. Objects shared with other components are
+        counted in each of them
+    """
+    items: int
+    objects: int
+    bytes: int
+
+
+class ProcessMemory(BaseModel):
+    """
+    Memory used by the API worker answering the request
+
+    - *pid*: The process identifier of the worker
+    - *rss*, *peak_rss*: Bytes of the worker currently in physical memory, and the most it
+        had (null outside of Linux)
+    - *gc_objects*: Number of objects tracked by the garbage collector
+    - *components*: Memory held by the indicators, the caches, and the live sessions handlers and models
+    """
+    pid: int
+    rss: Optional[int]
+    peak_rss: Optional[int]
+    gc_objects: int
+    components: dict[str, ObjectFootprint]
+
+
+class MemoryReport(BaseModel):
+    """
+    Memory used by the sessions in redis, and by the API worker answering the request
+
+    - *redis_nodes*: Memory used by each redis node
+    - *process*: Memory used by the API worker
+    """
+    redis_nodes: list[RedisNodeMemory]
+    process: ProcessMemory
+
+
+class AllocationSite(BaseModel):
+    """
+    Memory allocated by a line of code and not yet released
+
+    - *location*: The `file:line` of the allocation
+    - *traceback*: The calls leading to the allocation, most recent call last
+        (only the allocation line if traced with a single frame)
+    - *size_diff*, *count_diff*: Bytes and memory blocks allocated during the tracing window,
+        minus the ones released
+    - *size*, *count*: Bytes and memory blocks allocated by this line and still in use at the
+        end of the window (only the allocations made since the tracing started are known)
+    """
+    location: str
+    traceback: list[str]
+    size_diff: int
+    count_diff: int
+    size: int
+    count: int
+
+
+class AllocationReport(BaseModel):
+    """
+    The lines of code that allocated the most memory during a tracing window
+
+    - *pid*: The process identifier of the traced worker
+    - *duration*: Duration of the window, in seconds
+    - *frames*: Number of frames stored per allocation
+    - *traced_memory*, *traced_memory_peak*: Bytes allocated since the tracing started and still
+        in use at the end of the window, and the most in use during the window
+    - *size_diff*: Bytes allocated during the window, minus the ones released
+    - *sites*: The allocation sites with the largest *size_diff* (positive or negative)
+    """
+    pid: int
+    duration: float
+    frames: int
+    traced_memory: int
+    traced_memory_peak: int
+    size_diff: int
+    sites: list[AllocationSite]
@@ -0,0 +1,117 @@
+from typing import Optional
+
+from .tasks import TaskStatus, TaskPriority, TASK_STATUS_SCORES, SETTLED_STATUSES
+
+
+class TaskRecord:
+    """
+    Compact representation of a Task (see Task model) used internally by SessionHandler.
+    Attributes are stored in slots instead of a per-instance dict, and are set without
+    validation. Tasks are converted from and to this representation at the API boundary
+    (see `SessionHandler.to_dict`).
+
+    - *children*: The Tasks depending on this Task. A Task with several parents is
+        a single TaskRecord, shared by the children of each of its parents
+    """
+    __slots__ = ("id", "name", "priority", "status", "disabled", "comment", "children")
+
+    def __init__(
+        self,
+        id: str,
+        name: str,
+        priority: TaskPriority,
+        status: TaskStatus = TaskStatus.queued,
+        disabled: bool = False,
+        comment: str = "",
+    ) -> None:
+        self.id = id
+        self.name = name
+        self.priority = priority
+        self.status = status
+        self.disabled = disabled
+        self.comment = comment
+        self.children: list["TaskRecord"] = []
+
+    @property
+    def score(self) -> float:
+        """The Task score, based on its status (see `Task.make_score`)"""
+        return TASK_STATUS_SCORES.get(self.status, 0)
+
+    def is_running_or_failed(self) -> bool:
+        """See `Task.is_running_or_failed`"""
+        return self.status not in SETTLED_STATUSES
+
+    def to_dict(self, session_id: str, with_children: bool = True) -> dict:
+        """
+        Returns the Task as a dict, in the format of the Task model
+
+        :param session_id: The identifier of the session the Task belongs to
+        :param with_children: Whether to include the Task children
+        :return: The dict representation of the Task
+        """
+        task = {
+            "id": self.id,
+            "name": self.name,
+            "session_id": session_id,
+            "children": {},
+            "priority": self.priority.value,
+            "status": self.status.value,
+            "comment": self.comment,
+            "disabled": self.disabled,
+            "score": self.score,
+        }
+        if with_children:
+            task["children"] = {child.id: child.to_dict(session_id) for child in self.children}
+        else:
+            del task["children"]
+        return task
+
+
+class GroupTally:
+    """
+    Compact representation of the score of a FAIR principle or subgroup (see GroupScore model)
+    used internally by SessionHandler.
+    """
+    __slots__ = ("tasks", "applicable", "passed", "score", "score_applicable")
+
+    def __init__(
+        self,
+        tasks: int = 0,
+        applicable: int = 0,
+        passed: float = 0,
+        score: Optional[float] = None,
+        score_applicable: Optional[float] = None,
+    ) -> None:
+        self.tasks = tasks
+        self.applicable = applicable
+        self.passed = passed
+        self.score = score
+        self.score_applicable = score_applicable
+
+    def add_task(self, status: TaskStatus, count: int = 1) -> None:
+        """
+        Adds (or removes, if count is -1) a Task with the given status to the group.
+        Scores must then be refreshed with `update_scores`.
+
+        :param status: The Task status
+        :param count: 1 to add the Task, -1 to remove it
+        :return: None
+        """
+        self.tasks += count
+        self.applicable += count * (status is not TaskStatus.not_applicable)
+        self.passed += count * TASK_STATUS_SCORES.get(status, 0)
+
+    def update_scores(self) -> None:
+        """Calculates the group scores from its counts"""
+        self.score = self.passed / self.tasks if self.tasks else None
+        self.score_applicable = self.passed / self.applicable if self.applicable else None
+
+    def to_dict(self) -> dict:
+        """Returns the group score as a dict, in the format of the GroupScore model"""
+        return {
+            "tasks": self.tasks,
+            "applicable": self.applicable,
+            "passed": self.passed,
+            "score": self.score,
+            "score_applicable": self.score_applicable,
+        }
@@ -1,6 +1,13 @@
+import json
+import time
+import hashlib
+import heapq
+
+from functools import lru_cache
 from uuid import uuid4
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel, HttpUrl, FileUrl, FilePath, validator
-from typing import Union, Optional
+from typing import Union, Optional, Iterable, Iterator, ClassVar
 from enum import Enum
 
 from .tasks import (
@@ -8,13 +15,36 @@ from .tasks import (
     TaskStatus,
     TaskPriority,
     Indicator,
-    IndicatorDependency,
-    DependencyType
+    DependencyGraph,
 )
-from app.metrics.assessments_lifespan import fair_indicators
+from .records import TaskRecord, GroupTally
+from app.metrics import assessments_lifespan
 from app.dependencies.settings import get_settings
 
 
+# Score attributes of a session (see Session model)
+SCORE_FIELDS = [
+    "score_all_essential",
+    "score_all_nonessential",
+    "score_all",
+    "score_applicable_essential",
+    "score_applicable_nonessential",
+    "score_applicable_all",
+    "ratio_not_applicable",
+]
+
+
+def subject_hash(session_subject: dict) -> str:
+    """
+    Returns a digest of a session subject. It is stored with the session (`subject_hash`),
+    so that a session sent again can be compared with the stored one without loading it
+
+    :param session_subject: The JSON representation of a SessionSubjectIn object
+    :return: A hexadecimal digest
+    """
+    return hashlib.sha256(json.dumps(session_subject, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
 class SessionStatus(str, Enum):
     """
     List of statuses for a user session:
@@ -46,6 +76,32 @@ class SubjectType(str, Enum):
     manual = "manual"
 
 
+class TaskSelection(str, Enum):
+    """
+    Tasks to include when returning a session:
+
+    - *all*: The whole Task tree
+    - *changed*: Only the Tasks modified by the request, without their children
+    - *none*: No Task
+    """
+    all = "all"
+    changed = "changed"
+    none = "none"
+
+
+class ReportFormat(str, Enum):
+    """
+    File formats of session reports:
+
+    - *csv*: Session scores, then one row per indicator
+    - *pdf*: Printable report
+    - *jsonld*: Linked data, indicator results being W3C Data Quality Vocabulary measurements
+    """
+    csv = "csv"
+    pdf = "pdf"
+    jsonld = "jsonld"
+
+
 class SessionSubjectIn(BaseModel):
     """
     Data input necessary to create a session object.
@@ -96,6 +152,24 @@ class SessionSubjectIn(BaseModel):
 
 
 
+class GroupScore(BaseModel):
+    """
+    Score of the Tasks of a session belonging to the same FAIR principle (e.g. `F`)
+    or subgroup (e.g. `A1.1`)
+
+    - *tasks*: Number of Tasks in the group
+    - *applicable*: Number of Tasks in the group that are not **not_applicable**
+    - *passed*: Sum of the scores of the Tasks in the group
+    - *score*: Score based on all Tasks of the group
+    - *score_applicable*: Identical to *score*, excluding non-applicable Tasks
+    """
+    tasks: int = 0
+    applicable: int = 0
+    passed: float = 0
+    score: Optional[float]
+    score_applicable: Optional[float]
+
+
 class Session(BaseModel):
     """
     A session object
@@ -112,6 +186,17 @@ class Session(BaseModel):
     - *score_applicable_nonessential*: Identical to *score_all_non_essential*, excluding non-applicable Tasks
     - *score_applicable_all*: Identical to *score_all*, excluding non-applicable Tasks
     - *ratio_not_applicable*: Percentage of assessments that do not apply to the evaluated resource
+    - *principle_scores*: Scores of the Tasks of each FAIR principle (see GroupScore model)
+    - *subgroup_scores*: Scores of the Tasks of each FAIR subgroup (see GroupScore model)
+    - *created_at*: When the session was created (UNIX timestamp)
+    - *updated_at*: When the session was last stored (UNIX timestamp)
+    - *history_length*: Number of Task status changes recorded in the session history
+    - *resource*: Fingerprint of the assessed resource (url and file subjects) when the session was
+        created by a re-assessment: its validators (`etag`, `last_modified`), digest (`sha256`) and
+        the digests of its archive members (`members`)
+    - *reassessed_from*: The identifier of the session this session is a re-assessment of
+    - *reassessed_indicators*: The indicators assessed again by this re-assessment. The results
+        of the other indicators were copied from the previous session
     """
     id: str
     session_subject: SessionSubjectIn
@@ -124,6 +209,49 @@ class Session(BaseModel):
     score_applicable_nonessential: Optional[float]
     score_applicable_all: Optional[float]
     ratio_not_applicable: Optional[float]
+    principle_scores: dict[str, GroupScore] = {}
+    subgroup_scores: dict[str, GroupScore] = {}
+    created_at: Optional[float]
+    updated_at: Optional[float]
+    history_length: int = 0
+    resource: Optional[dict]
+    reassessed_from: Optional[str]
+    reassessed_indicators: Optional[list[str]]
+
+    # Names that can be used in field selection to designate several fields at once
+    field_groups: ClassVar[dict[str, set[str]]] = {
+        "scores": {
+            "score_all_essential",
+            "score_all_nonessential",
+            "score_all",
+            "score_applicable_essential",
+            "score_applicable_nonessential",
+            "score_applicable_all",
+            "ratio_not_applicable",
+            "principle_scores",
+            "subgroup_scores",
+        },
+    }
+
+    @classmethod
+    def expand_fields(cls, fields: Iterable[str]) -> set[str]:
+        """
+        Converts a user selection of fields (e.g. `["scores", "status"]`) into the set
+        of Session attributes to return. The session `id` is always included.
+
+        :param fields: Names of Session attributes or of groups of attributes (see `field_groups`)
+        :return: The set of Session attribute names
+        """
+        selected = {"id"}
+        for field in fields:
+            field = field.strip()
+            if field in cls.field_groups:
+                selected.update(cls.field_groups[field])
+            elif field in cls.__fields__:
+                selected.add(field)
+            elif field:
+                raise ValueError(f"Unknown session field: {field}")
+        return selected
 
     def get_task(self, task_id: str) -> Task:
         if task_id in self.tasks:
@@ -134,30 +262,196 @@ class Session(BaseModel):
             if tmp is not None:
                 return tmp
 
+class SessionSortField(str, Enum):
+    """Session attributes that can be used to sort search results"""
+    created_at = "created_at"
+    updated_at = "updated_at"
+    score_all_essential = "score_all_essential"
+    score_all_nonessential = "score_all_nonessential"
+    score_all = "score_all"
+    score_applicable_essential = "score_applicable_essential"
+    score_applicable_nonessential = "score_applicable_nonessential"
+    score_applicable_all = "score_applicable_all"
+    ratio_not_applicable = "ratio_not_applicable"
+
+
+class SessionSummary(BaseModel):
+    """
+    The indexed attributes of a session, returned when searching sessions
+    (see Session model for the description of the attributes)
+    """
+    id: str
+    status: SessionStatus
+    subject_type: SubjectType
+    score_all_essential: Optional[float]
+    score_all_nonessential: Optional[float]
+    score_all: Optional[float]
+    score_applicable_essential: Optional[float]
+    score_applicable_nonessential: Optional[float]
+    score_applicable_all: Optional[float]
+    ratio_not_applicable: Optional[float]
+    created_at: Optional[float]
+    updated_at: Optional[float]
+
+
+class SessionSearchResult(BaseModel):
+    """
+    A page of session search results
+
+    - *total*: Number of sessions matching the search
+    - *sessions*: The sessions of this page
+    - *next_cursor*: Cursor to send to get the next page. Null on the last page
+    """
+    total: int
+    sessions: list[SessionSummary]
+    next_cursor: Optional[str]
+
+
+class SessionScores(BaseModel):
+    """
+    The scores of a session, without its Tasks
+    (see Session model for the description of the attributes)
+    """
+    id: str
+    status: SessionStatus
+    score_all_essential: Optional[float]
+    score_all_nonessential: Optional[float]
+    score_all: Optional[float]
+    score_applicable_essential: Optional[float]
+    score_applicable_nonessential: Optional[float]
+    score_applicable_all: Optional[float]
+    ratio_not_applicable: Optional[float]
+    principle_scores: dict[str, GroupScore] = {}
+    subgroup_scores: dict[str, GroupScore] = {}
+
+
+class TaskStatusChange(BaseModel):
+    """
+    The change of a Task status, either set by the user or following the update of a Task it depends on
+
+    - *task_id*: The Task identifier
+    - *previous_status*, *previous_disabled*: The Task status and disabled flag before the change
+    - *status*, *disabled*: The Task status and disabled flag after the change
+    """
+    task_id: str
+    previous_status: TaskStatus
+    previous_disabled: bool
+    status: TaskStatus
+    disabled: bool
+
+
+class SessionHistoryEvent(BaseModel):
+    """
+    An update of a Task status by the user, as recorded in the session history
+
+    - *id*: The event identifier. Events are ordered by identifier
+    - *timestamp*: When the event was recorded (UNIX timestamp)
+    - *task_id*: The identifier of the Task updated by the user
+    - *changes*: The resulting Task changes, including the Tasks depending on the updated one
+    """
+    id: str
+    timestamp: float
+    task_id: str
+    changes: list[TaskStatusChange]
+
+
+class SessionHistory(BaseModel):
+    """
+    A page of the history of a session, oldest events first
+
+    - *events*: The events of this page
+    - *next_cursor*: Cursor to send to get the next page. Null on the last page
+    """
+    events: list[SessionHistoryEvent]
+    next_cursor: Optional[str]
+
+
+class SessionComparison(BaseModel):
+    """
+    The scores and Task statuses of several sessions, side by side. The values of each
+    attribute are lists with one entry per session, in the order of *session_ids*.
+    The first session is the baseline the others are compared to.
+
+    - *session_ids*: The compared sessions
+    - *status*: The status of each session
+    - *scores*: The score attributes of each session (see Session model)
+    - *score_deltas*: The differences between the scores of each session and the baseline scores
+    - *principle_scores*: The score of each FAIR principle (see GroupScore model) in each session
+    - *principle_score_deltas*: The differences between the principle scores of each session and the baseline
+    - *indicators*: The status of the Task of each indicator in each session (null if a session
+        has no Task for the indicator)
+    - *changed_indicators*: The indicators whose status is not the same in all sessions
+    """
+    session_ids: list[str]
+    status: list[SessionStatus]
+    scores: dict[str, list[Optional[float]]]
+    score_deltas: dict[str, list[Optional[float]]]
+    principle_scores: dict[str, list[Optional[float]]]
+    principle_score_deltas: dict[str, list[Optional[float]]]
+    indicators: dict[str, list[Optional[TaskStatus]]]
+    changed_indicators: list[str]
+
+
+@lru_cache()
+def get_dependency_graph() -> DependencyGraph:
+    """Returns the graph of the indicators dependencies, built from the settings on first use"""
+    return DependencyGraph(get_settings().assessment_dependencies)
+
+
 # TODO: Document methods
 class SessionHandler:
     """
     The class to handle a session object. This class creates the task and their status
     based on user input, calculates the scores, ...
+
+    The session is held in a compact form (see TaskRecord and GroupTally models) rather
+    than as a Session model: Tasks are stored once, indexed by id, and are updated without
+    going through pydantic validation. The session is converted from and to its JSON
+    representation (see `to_dict`) when it is loaded or stored.
     """
-    def __init__(self, session: Session) -> None:
+    def __init__(self, session: Union[Session, dict]) -> None:
         """
         Creates the handler based on a session. This session can already exist
         (see `from_existing_session`) or can be created using a SessionSubjectIn
         object (see `from_user_input`).
 
-        :param session: The session object to handle
+        :param session: The session object to handle, or its JSON representation
+            (e.g. as stored in redis)
         """
-        self.id = session.id
-        self.user_input = session.session_subject
-        self.session_model = session
+        if isinstance(session, Session):
+            session = session.dict()
+
+        subject = session["session_subject"]
+        self.id = session["id"]
+        self.user_input = subject if isinstance(subject, SessionSubjectIn) else SessionSubjectIn.parse_obj(subject)
+        self.status = SessionStatus(session.get("status") or SessionStatus.queued)
+        self.scores = {field: session.get(field) for field in SCORE_FIELDS}
+        self.principle_scores = {
+            group: GroupTally(**score) for group, score in (session.get("principle_scores") or {}).items()
+        }
+        self.subgroup_scores = {
+            group: GroupTally(**score) for group, score in (session.get("subgroup_scores") or {}).items()
+        }
+        self.created_at = session.get("created_at")
+        self.updated_at = session.get("updated_at")
+        self.history_length = session.get("history_length") or 0
+        self.resource = session.get("resource")
+        self.reassessed_from = session.get("reassessed_from")
+        self.reassessed_indicators = session.get("reassessed_indicators")
+        # Task status changes not yet recorded in the session history, as (updated Task id,
+        # [(Task id, previous status, previous disabled, status, disabled), ...]) tuples
+        self.history_events: list[tuple[str, list[tuple[str, TaskStatus, bool, TaskStatus, bool]]]] = []
+
+        self.roots: list[TaskRecord] = []
+        self.tasks: dict[str, TaskRecord] = {}
         self.indicator_tasks = {}
 
-        if not session.tasks:
+        if not session.get("tasks"):
             self.create_tasks()
+            self.compute_group_scores()
 
         else:
-            self.build_tasks_dict(list(self.session_model.tasks.values()))
+            self.build_tasks_dict(session["tasks"], self.roots)
 
     @classmethod
     def from_user_input(cls, session_data: SessionSubjectIn) -> "SessionHandler":
@@ -168,36 +462,193 @@ class SessionHandler:
         :param session_data:
         :return: A SessionHandler object
         """
-        session = Session(id=str(uuid4()), session_subject=session_data)
-        return cls(session)
+        return cls({"id": str(uuid4()), "session_subject": session_data, "created_at": time.time()})
 
     @classmethod
-    def from_existing_session(cls, session: Session) -> "SessionHandler":
+    def from_existing_session(cls, session: Union[Session, dict]) -> "SessionHandler":
         """
         Creates a session handler for an existing session (for example loaded with the route
         `load_session`).
 
-        :param session: A pre-existing session
+        :param session: A pre-existing session, or its JSON representation
         :return: A SessionHandler object
         """
         return cls(session)
 
-    def build_tasks_dict(self, tasks: list[Task]):
+    @classmethod
+    def from_user_inputs(cls, subjects: Iterable[SessionSubjectIn]) -> Iterator["SessionHandler"]:
+        """
+        Creates sessions for many subjects at once (for example from the route `create_sessions`).
+        The Tasks of a session only depend on the subject profile (its attributes other than
+        `path`): they are created once per profile, then copied for the other subjects with
+        the same profile.
+
+        :param subjects: The user inputs, one per session
+        :return: The SessionHandler objects, in the order of `subjects`
         """
-        Creates the dictionary mapping all indicators names to their corresponding
-        Task id in the Session object.
+        templates = {}
+        for subject in subjects:
+            profile = tuple(sorted(subject.dict(exclude={"path"}).items()))
+            template = templates.get(profile)
+            if template is None:
+                handler = templates[profile] = cls.from_user_input(subject)
+            else:
+                handler = template.copy_for_subject(subject)
+            yield handler
 
-        :param tasks: List of Tasks in the session
-        :return: None. The dict is directly stored in self
+    def copy_for_subject(self, session_subject: SessionSubjectIn) -> "SessionHandler":
         """
-        for task in tasks:
-            # FIXME: Will fail when encountering task with multiple parent
-            if task.name in self.indicator_tasks:
-                raise ValueError(f"Multiple tasks with the same name ({task.name}) found")
+        Creates a new session with the same Tasks, statuses and scores as this one. The Tasks
+        default statuses are not determined again: `session_subject` must have the same profile
+        as the subject of this session (see `from_user_inputs`).
 
-            self.indicator_tasks.update({task.name: task.id})
-            if task.children:
-                self.build_tasks_dict(list(task.children.values()))
+        :param session_subject: The user input of the new session
+        :return: A SessionHandler object, with new session and Task ids
+        """
+        handler = object.__new__(type(self))
+        handler.id = str(uuid4())
+        handler.user_input = session_subject
+        handler.status = self.status
+        handler.scores = dict(self.scores)
+        handler.principle_scores = {group: GroupTally(**score.to_dict()) for group, score in self.principle_scores.items()}
+        handler.subgroup_scores = {group: GroupTally(**score.to_dict()) for group, score in self.subgroup_scores.items()}
+        handler.created_at = time.time()
+        handler.updated_at = None
+        handler.history_length = 0
+        handler.resource = None
+        handler.reassessed_from = None
+        handler.reassessed_indicators = None
+        handler.history_events = []
+
+        copies = {}
+
+        def copy_task(task: TaskRecord) -> TaskRecord:
+            # Tasks with several parents are copied once
+            copy = copies.get(task.id)
+            if copy is None:
+                copy = copies[task.id] = TaskRecord(
+                    id=str(uuid4()),
+                    name=task.name,
+                    priority=task.priority,
+                    status=task.status,
+                    disabled=task.disabled,
+                    comment=task.comment,
+                )
+                copy.children = [copy_task(child) for child in task.children]
+            return copy
+
+        handler.roots = [copy_task(task) for task in self.roots]
+        handler.tasks = {}
+        handler.indicator_tasks = {}
+        for task in copies.values():
+            handler.tasks[task.id] = task
+            handler.indicator_tasks[task.name] = task.id
+        return handler
+
+    def reassess(self, resource: dict, indicators: Optional[Iterable[str]]) -> "SessionHandler":
+        """
+        Creates a new session assessing the same subject again, after its resource changed
+        (e.g. a new release of a model). The results of the indicators whose inputs did not
+        change are copied from this session.
+
+        :param resource: The current fingerprint of the resource (see `fetch_resource_fingerprint`)
+        :param indicators: The indicators to assess again, None to assess all of them
+        :return: A SessionHandler object, with new session and Task ids
+        """
+        if indicators is None:
+            handler = type(self).from_user_input(self.user_input)
+            handler.reassessed_indicators = sorted(handler.indicator_tasks)
+        else:
+            handler = self.copy_for_subject(self.user_input)
+            handler.reassessed_indicators = handler.reset_tasks(indicators)
+        handler.resource = resource
+        handler.reassessed_from = self.id
+        return handler
+
+    def reset_tasks(self, indicators: Iterable[str]) -> list[str]:
+        """
+        Sets the Tasks of indicators back to their default status (see `_get_default_task_status`),
+        as when the session was created, then updates the Tasks depending on them and the scores.
+        Changes are not recorded in the session history.
+
+        :param indicators: The names of the indicators to assess again
+        :return: The names of the indicators of the session that were reset, in topological order
+        """
+        rank = get_dependency_graph().rank
+        names = sorted((name for name in indicators if name in self.indicator_tasks), key=lambda name: rank.get(name, -1))
+        for name in names:
+            task = self.get_task(self.get_task_from_indicator(name))
+            task.status, task.disabled = self._get_default_task_status(name)
+            self.update_task_children(task.id)
+
+        if any(self.get_task(self.get_task_from_indicator(name)).status is TaskStatus.queued for name in names):
+            self.status = SessionStatus.queued
+        self.compute_group_scores()
+        self.update_session_data()
+        return names
+
+    def build_tasks_dict(self, tasks: dict[str, dict], siblings: list[TaskRecord]) -> None:
+        """
+        Creates the Task records of a session, and the dictionary mapping all indicators
+        names to their corresponding Task id.
+        A Task with multiple parents appears in the children of each of them. Once
+        loaded, these appear as distinct copies, which are replaced by the first one
+        found so that the Task is a single record, as when it was created.
+
+        :param tasks: Mapping of Task ids to Tasks in the session (or in a Task children)
+        :param siblings: The list the records are added to (the session roots or the parent Task children)
+        :return: None. The records are directly stored in self
+        """
+        for task in tasks.values():
+            record = self.tasks.get(task["id"])
+            if record is None:
+                if task["name"] in self.indicator_tasks:
+                    raise ValueError(f"Multiple tasks with the same name ({task['name']}) found")
+
+                record = TaskRecord(
+                    id=task["id"],
+                    name=task["name"],
+                    priority=TaskPriority(task.get("priority") or TaskPriority.essential),
+                    status=TaskStatus(task.get("status") or TaskStatus.queued),
+                    disabled=task.get("disabled", False),
+                    comment=task.get("comment", ""),
+                )
+                self.tasks[record.id] = record
+                self.indicator_tasks[record.name] = record.id
+                if task.get("children"):
+                    self.build_tasks_dict(task["children"], record.children)
+
+            siblings.append(record)
+
+    def get_task(self, task_id: str) -> Optional[TaskRecord]:
+        """Returns the Task with the given id, or None if the session has no such Task"""
+        return self.tasks.get(task_id)
+
+    def to_dict(self) -> dict:
+        """
+        Returns the JSON representation of the session, in the format of the Session model
+        :return: The session as a dict of JSON-compatible values
+        """
+        return {
+            "id": self.id,
+            "session_subject": jsonable_encoder(self.user_input),
+            "tasks": {task.id: task.to_dict(self.id) for task in self.roots},
+            "status": self.status.value,
+            **self.scores,
+            "principle_scores": {group: score.to_dict() for group, score in self.principle_scores.items()},
+            "subgroup_scores": {group: score.to_dict() for group, score in self.subgroup_scores.items()},
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "history_length": self.history_length,
+            "resource": self.resource,
+            "reassessed_from": self.reassessed_from,
+            "reassessed_indicators": self.reassessed_indicators,
+        }
+
+    @property
+    def session_model(self) -> Session:
+        """The session as a Session model. Builds a new object on every access"""
+        return Session.parse_obj(self.to_dict())
 
     def retrieve_metadata(self, url: str) -> None:
         """
@@ -213,7 +664,7 @@ class SessionHandler:
         return any([
             task.status is TaskStatus.queued
             or task.status is TaskStatus.started
-            for task in self.session_model.tasks.values()
+            for task in self.roots
         ])
 
     def update_session_data(self):
@@ -222,9 +673,9 @@ class SessionHandler:
         :return: None.
         """
         if not self.is_running():
-            self.session_model.status = SessionStatus.finished
+            self.status = SessionStatus.finished
 
-        all_tasks = [self.session_model.get_task(task_key) for task_key in self.indicator_tasks.values()]
+        all_tasks = self.tasks.values()
         count_all_essential = 0
         count_all_nonessential = 0
         count_applicable_essential = 0
@@ -240,44 +691,45 @@ class SessionHandler:
         passed_applicable_all = 0
 
         for task in all_tasks:
-            passed_all += task.score
+            score = task.score
+            passed_all += score
 
             if task.priority is not TaskPriority.essential:
                 count_all_nonessential += 1
-                passed_all_nonessential += task.score
+                passed_all_nonessential += score
 
                 if task.status is not TaskStatus.not_applicable:
                     count_applicable_nonessential += 1
-                    passed_applicable_nonessential += task.score
+                    passed_applicable_nonessential += score
                     count_applicable_all += 1
-                    passed_applicable_all += task.score
+                    passed_applicable_all += score
 
                 else:
                     count_na += 1
 
             else:
                 count_all_essential += 1
-                passed_all_essential += task.score
+                passed_all_essential += score
 
                 if task.status is not TaskStatus.not_applicable:
                     count_applicable_essential += 1
-                    passed_applicable_essential += task.score
+                    passed_applicable_essential += score
                     count_applicable_all += 1
-                    passed_applicable_all += task.score
+                    passed_applicable_all += score
 
                 else:
                     count_na += 1
 
-        self.session_model.score_all = passed_all / len(all_tasks)
+        self.scores["score_all"] = passed_all / len(all_tasks)
 
-        self.session_model.score_applicable_all = passed_applicable_all / count_applicable_all
-        self.session_model.score_applicable_essential = passed_applicable_essential / count_applicable_essential
-        self.session_model.score_applicable_nonessential = passed_applicable_nonessential / count_applicable_nonessential
+        self.scores["score_applicable_all"] = passed_applicable_all / count_applicable_all
+        self.scores["score_applicable_essential"] = passed_applicable_essential / count_applicable_essential
+        self.scores["score_applicable_nonessential"] = passed_applicable_nonessential / count_applicable_nonessential
 
-        self.session_model.score_all_essential = passed_all_essential / count_all_essential
-        self.session_model.score_all_nonessential = passed_all_nonessential / count_all_nonessential
+        self.scores["score_all_essential"] = passed_all_essential / count_all_essential
+        self.scores["score_all_nonessential"] = passed_all_nonessential / count_all_nonessential
 
-        self.session_model.ratio_not_applicable = count_na / len(all_tasks)
+        self.scores["ratio_not_applicable"] = count_na / len(all_tasks)
 
     def get_task_from_indicator(self, indicator: str):
         """Returns the Task in Session associated with an indicator"""
@@ -292,7 +744,7 @@ class SessionHandler:
 
         :return: None
         """
-        for indicator in fair_indicators.values():
+        for indicator in assessments_lifespan.get_fair_indicators().values():
             # Skip if task for indicator is already created
             if indicator.name in self.indicator_tasks:
                 continue
@@ -335,13 +787,10 @@ class SessionHandler:
         ):
             return TaskStatus(config.pmr_assessment_status[indicator]), True
 
-        if indicator in config.assessment_dependencies:
-            dependency_dict = config.assessment_dependencies[indicator]
-            condition = DependencyType(dependency_dict.get("condition", "or"))
-
-            dependency = IndicatorDependency(dependency_dict["indicators"], condition)
+        dependency = get_dependency_graph().dependencies.get(indicator)
+        if dependency is not None:
             parent_assessments = dependency.dependencies
-            tasks = [self.session_model.get_task(self.get_task_from_indicator(a)) for a in parent_assessments]
+            tasks = [self.get_task(self.get_task_from_indicator(a)) for a in parent_assessments]
             if dependency.is_automatically_failed(tasks):
                 return TaskStatus.failed, True
             elif dependency.is_automatically_disabled(tasks):
@@ -357,59 +806,182 @@ class SessionHandler:
         Also applies the default status to the created Task object.
 
         The task is stored either in the task parents `children` attribute or in
-        the session_model `tasks` attribute.
+        the session `roots` attribute.
 
         :param indicator: An indicator name
-        :return: A Task object
+        :return: A TaskRecord object
         """
         task_id = str(uuid4())
-        config = get_settings()
 
-        task = Task(
+        task = TaskRecord(
             id=task_id,
             name=indicator.name,
             priority=TaskPriority(indicator.priority),
-            session_id=self.id,
         )
+        self.tasks[task_id] = task
 
-        task_dependencies = config.assessment_dependencies.get(indicator.name)
-        if task_dependencies is not None:
-            for parent_indicator in task_dependencies["indicators"]:
+        task_dependency = get_dependency_graph().dependencies.get(indicator.name)
+        if task_dependency is not None:
+            for parent_indicator in task_dependency.dependencies:
                 # If parent exists, no need to create it
-                # FIXME: This will cause issues if a Task has multiple parents
                 if parent_indicator in self.indicator_tasks:
                     parent_key = self.get_task_from_indicator(parent_indicator)
-                    parent_task = self.session_model.get_task(parent_key)
-                    parent_task.children[task_id] = task
+                    parent_task = self.get_task(parent_key)
+                    parent_task.children.append(task)
 
                 else:
-                    parent_task = self._create_task(parent_indicator)
+                    parent = assessments_lifespan.get_fair_indicators()[parent_indicator]
+                    parent_task = self._create_task(parent)
                     self.indicator_tasks[parent_indicator] = parent_task.id
-                    parent_task.children[task_id] = task
+                    parent_task.children.append(task)
 
         else:
-            self.session_model.tasks[task_id] = task
+            self.roots.append(task)
 
         default_status, default_disabled = self._get_default_task_status(indicator.name)
         task.status = default_status
         task.disabled = default_disabled
         return task
 
-    def update_task_children(self, task_key):
+    def update_task_children(self, task_key) -> dict[str, tuple[TaskStatus, bool]]:
         """
-        Update a Tasks children status.
+        Update the status of the Tasks depending, directly or not, on a Task.
         This method is called when a Task status is updated to propagate the change
-        to its children
+        to its descendants.
+
+        Descendants are processed in topological order of the dependency graph (see
+        DependencyGraph), so a Task with several parents is only processed once all its
+        parents are up-to-date. The propagation stops at Tasks whose default status and
+        disabled flag are unchanged: their own descendants are not visited.
 
         :param task_key: The updated task id
-        :return: None
+        :return: The descendants whose status or disabled flag changed, mapped to their previous
+            (status, disabled) values
         """
-        task = self.session_model.get_task(task_key)
-        for child in task.children.values():
-            default_status, default_disabled = self._get_default_task_status(child.name)
+        graph = get_dependency_graph()
+        task = self.get_task(task_key)
+
+        worklist = [(graph.rank[child], child) for child in graph.dependents.get(task.name, [])]
+        heapq.heapify(worklist)
+        queued = {indicator for _, indicator in worklist}
+
+        changed = {}
+        while worklist:
+            _, indicator = heapq.heappop(worklist)
+            child_key = self.get_task_from_indicator(indicator)
+            if child_key is None:
+                continue
+
+            child = self.get_task(child_key)
+            default_status, default_disabled = self._get_default_task_status(indicator)
+            if (child.status, child.disabled) == (default_status, default_disabled):
+                continue
+
+            changed[child_key] = (child.status, child.disabled)
             child.status = default_status
             child.disabled = default_disabled
 
+            for grandchild in graph.dependents.get(indicator, []):
+                if grandchild not in queued:
+                    queued.add(grandchild)
+                    heapq.heappush(worklist, (graph.rank[grandchild], grandchild))
+        return changed
+
+    def update_task_status(self, task_key: str, status: TaskStatus) -> dict[str, tuple[TaskStatus, bool]]:
+        """
+        Sets the status of a Task, then updates the Tasks depending on it and the session scores
+
+        :param task_key: The updated task id
+        :param status: The new Task status
+        :return: The Tasks whose status or disabled flag changed (including the updated one),
+            mapped to their previous (status, disabled) values
+        """
+        task = self.get_task(task_key)
+        changed = {task_key: (task.status, task.disabled)}
+        task.status = status
+        changed.update(self.update_task_children(task_key))
+        self.record_history_event(task_key, changed)
+
+        self.update_group_scores({key: previous[0] for key, previous in changed.items()})
+        self.update_session_data()
+        return changed
+
+    def record_history_event(self, task_key: str, changed: dict[str, tuple[TaskStatus, bool]]) -> None:
+        """
+        Adds a Task status change to the events to record in the session history
+        (see `app.redis_controller.session_history`)
+
+        :param task_key: The id of the Task updated by the user
+        :param changed: The Tasks updated (including the ones depending on `task_key`), mapped to
+            their previous (status, disabled) values
+        :return: None
+        """
+        changes = []
+        for key, (previous_status, previous_disabled) in changed.items():
+            task = self.get_task(key)
+            if (task.status, task.disabled) != (previous_status, previous_disabled):
+                changes.append((key, previous_status, previous_disabled, task.status, task.disabled))
+
+        if changes:
+            self.history_length += 1
+            self.history_events.append((task_key, changes))
+
+    def compute_group_scores(self) -> None:
+        """
+        Calculates the scores of each FAIR principle and subgroup from all the Tasks of the session
+        :return: None
+        """
+        indicator_groups = assessments_lifespan.get_indicator_groups()
+        principle_scores = {}
+        subgroup_scores = {}
+        for indicator, task_key in self.indicator_tasks.items():
+            task = self.get_task(task_key)
+            group, sub_group = indicator_groups[indicator]
+            principle_scores.setdefault(group, GroupTally()).add_task(task.status)
+            subgroup_scores.setdefault(sub_group, GroupTally()).add_task(task.status)
+
+        for group_score in (*principle_scores.values(), *subgroup_scores.values()):
+            group_score.update_scores()
+        self.principle_scores = principle_scores
+        self.subgroup_scores = subgroup_scores
+
+    def update_group_scores(self, previous_statuses: dict[str, TaskStatus]) -> None:
+        """
+        Updates the scores of the FAIR principles and subgroups of the Tasks whose status
+        changed, without going through the other Tasks.
+
+        :param previous_statuses: Mapping of the changed Tasks ids to their previous status
+        :return: None
+        """
+        if not self.principle_scores:
+            # Session stored before group scores existed
+            self.compute_group_scores()
+            return
+
+        indicator_groups = assessments_lifespan.get_indicator_groups()
+        updated = []
+        for task_key, previous_status in previous_statuses.items():
+            task = self.get_task(task_key)
+            if task.status is previous_status:
+                continue
+
+            group, sub_group = indicator_groups[task.name]
+            if group not in self.principle_scores or sub_group not in self.subgroup_scores:
+                # Group scores stored incomplete (e.g. by an older version, or sent by a client)
+                self.compute_group_scores()
+                return
+
+            for group_score in (
+                self.principle_scores[group],
+                self.subgroup_scores[sub_group],
+            ):
+                group_score.add_task(previous_status, -1)
+                group_score.add_task(task.status)
+                updated.append(group_score)
+
+        for group_score in updated:
+            group_score.update_scores()
+
     def json(self):
         """Returns the json representation of the session model"""
-        return self.session_model.json()
+        return json.dumps(self.to_dict())
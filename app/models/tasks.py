@@ -2,7 +2,7 @@ from pydantic import BaseModel, validator
 from enum import Enum
 from typing import Optional, Dict
 
-from app.metrics.assessments_lifespan import fair_indicators
+from app.metrics import assessments_lifespan
 
 
 class TaskStatus(str, Enum):
@@ -28,6 +28,23 @@ class TaskStatus(str, Enum):
     not_answered = "not_answered"  # Should not be counted at all. But children tasks should be answerable
 
 
+# Score of a Task depending on its status. Statuses not listed score 0
+TASK_STATUS_SCORES = {
+    TaskStatus.success: 1,
+    TaskStatus.failed: 0,
+    TaskStatus.warnings: 0.5,
+}
+
+
+# Statuses of a Task that is neither running nor failed: Tasks depending on it can be answered
+SETTLED_STATUSES = {
+    TaskStatus.success,
+    TaskStatus.warnings,
+    TaskStatus.not_applicable,
+    TaskStatus.not_answered,
+}
+
+
 class TaskPriority(str, Enum):
     essential = "essential"
     important = "important"
@@ -80,11 +97,7 @@ class Task(BaseModel):
         """
         # Necessary to check for status as fields failing validation are not included in values
         if "status" in values:
-            return {
-                TaskStatus.success.value: 1,
-                TaskStatus.failed.value: 0,
-                TaskStatus.warnings.value: 0.5,
-            }.get(values['status'], 0)
+            return TASK_STATUS_SCORES.get(values['status'], 0)
         else:
             raise ValueError("Task status is required to calculate a score")
 
@@ -96,7 +109,7 @@ class Task(BaseModel):
         :param name: The name given by the user
         :return: The valid assessment name
         """
-        if name not in fair_indicators:
+        if name not in assessments_lifespan.get_fair_indicators():
             raise ValueError("Given assessment name is not a known indicator")
         return name
 
@@ -123,12 +136,7 @@ class Task(BaseModel):
         :return: False if the task is either passed (with or without warnings),
         not applicable, or not answered. True otherwise
         """
-        return (
-            self.status != "success"
-            and self.status != "warning"
-            and self.status != "not_applicable"
-            and self.status != "not_answered"
-        )
+        return self.status not in SETTLED_STATUSES
 
 
 class Indicator(BaseModel):
@@ -235,3 +243,55 @@ class IndicatorDependency:
         elif self.operation is DependencyType.and_:
             return all([d.is_running_or_failed() for d in dependencies])
 
+
+class DependencyGraph:
+    """
+    The graph of the dependencies between indicators (see `assessment_dependencies` in settings).
+    Indicators are ranked in topological order: an indicator always comes after the
+    indicators it depends on.
+
+    - *dependencies*: Mapping of indicators to the IndicatorDependency they are subject to
+    - *dependents*: Mapping of indicators to the indicators directly depending on them
+    - *rank*: Position of each indicator in the topological order
+    """
+    def __init__(self, assessment_dependencies: dict[str, dict]):
+        self.dependencies = {
+            indicator: IndicatorDependency(
+                dependency["indicators"],
+                DependencyType(dependency.get("condition", "or")),
+            )
+            for indicator, dependency in assessment_dependencies.items()
+        }
+
+        self.dependents = {}
+        for indicator, dependency in self.dependencies.items():
+            for parent in dependency.dependencies:
+                self.dependents.setdefault(parent, []).append(indicator)
+
+        self.rank = self._topological_rank()
+
+    def _topological_rank(self) -> dict[str, int]:
+        """
+        Sorts the indicators of the graph in topological order (Kahn's algorithm)
+
+        :return: Mapping of indicators to their position in the topological order
+        """
+        indicators = set(self.dependencies) | set(self.dependents)
+        remaining_parents = {
+            indicator: len(self.dependencies[indicator].dependencies) if indicator in self.dependencies else 0
+            for indicator in indicators
+        }
+        ready = sorted(indicator for indicator, count in remaining_parents.items() if count == 0)
+        rank = {}
+        while ready:
+            indicator = ready.pop()
+            rank[indicator] = len(rank)
+            for child in self.dependents.get(indicator, []):
+                remaining_parents[child] -= 1
+                if remaining_parents[child] == 0:
+                    ready.append(child)
+
+        if len(rank) != len(indicators):
+            cycle = sorted(indicators - set(rank))
+            raise ValueError(f"Indicator dependencies contain a cycle between: {', '.join(cycle)}")
+        return rank
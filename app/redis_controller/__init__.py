@@ -1 +1 @@
-from .redis_handler import redis_app
+from .redis_handler import get_redis_app, get_redis_nodes, close_redis_app
@@ -0,0 +1,134 @@
+import time
+import logging
+
+from threading import Lock, Thread
+from typing import Optional
+
+from redis import Redis
+from redis.connection import Connection
+from redis.exceptions import ConnectionError, TimeoutError
+
+from app.dependencies.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(ConnectionError):
+    """Raised instead of sending a command to a redis node known to be unavailable"""
+    def __init__(self, address: str, retry_after: float) -> None:
+        super().__init__(f"Redis node {address} is unavailable")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Stops sending commands to a redis node that stopped answering, so that requests fail
+    immediately instead of each waiting for the command timeout (`redis_command_timeout`).
+
+    - *closed*: Commands are sent. After `redis_breaker_failure_threshold` consecutive
+        connection errors or timeouts, the breaker opens
+    - *open*: Commands fail with CircuitOpenError. A background thread pings the node every
+        `redis_probe_interval` seconds on its own connection, and closes the breaker as soon
+        as the node answers
+    """
+    def __init__(self, address: str) -> None:
+        self.address = address
+        self.config = get_settings()
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._lock = Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def check(self) -> None:
+        """Raises CircuitOpenError if the breaker is open"""
+        if self.opened_at is not None:
+            raise CircuitOpenError(self.address, self.config.redis_probe_interval)
+
+    def record_success(self) -> None:
+        if self.failures:
+            with self._lock:
+                self.failures = 0
+
+    def record_failure(self, error: Exception) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.opened_at is not None or self.failures < self.config.redis_breaker_failure_threshold:
+                return
+            self.opened_at = time.monotonic()
+        logger.warning(f"Redis node {self.address} unavailable ({str(error)}), failing fast until it recovers")
+        Thread(target=self._probe, name=f"redis-probe-{self.address}", daemon=True).start()
+
+    def _probe(self) -> None:
+        """Background thread pinging the node until it answers, then closing the breaker"""
+        host, port = self.address.rsplit(":", 1)
+        timeout = self.config.redis_command_timeout
+        while True:
+            time.sleep(self.config.redis_probe_interval)
+            probe = Redis(host=host, port=int(port), socket_timeout=timeout, socket_connect_timeout=timeout)
+            try:
+                probe.ping()
+            except (ConnectionError, TimeoutError):
+                continue
+            finally:
+                probe.close()
+            with self._lock:
+                downtime = time.monotonic() - self.opened_at
+                self.failures = 0
+                self.opened_at = None
+            logger.warning(f"Redis node {self.address} recovered after {downtime:.1f}s")
+            return
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+_breakers_lock = Lock()
+
+
+def get_circuit_breaker(address: str) -> CircuitBreaker:
+    """Returns the circuit breaker of a redis node (`host:port`), created on first use"""
+    breaker = _breakers.get(address)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(address, CircuitBreaker(address))
+    return breaker
+
+
+def is_degraded() -> bool:
+    """Whether a redis node is unavailable: sessions are then only read from the local cache"""
+    return any(breaker.is_open for breaker in list(_breakers.values()))
+
+
+class BreakerConnection(Connection):
+    """Redis connection going through the circuit breaker of its node"""
+    def __init__(self, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.breaker = get_circuit_breaker(f"{self.host}:{self.port}")
+
+    def connect(self):
+        if self._sock:
+            return
+        self.breaker.check()
+        try:
+            super().connect()
+        except (ConnectionError, TimeoutError) as e:
+            self.breaker.record_failure(e)
+            raise
+
+    def send_packed_command(self, command, check_health=True):
+        self.breaker.check()
+        try:
+            return super().send_packed_command(command, check_health)
+        except (ConnectionError, TimeoutError) as e:
+            self.breaker.record_failure(e)
+            raise
+
+    def read_response(self, disable_decoding=False):
+        try:
+            response = super().read_response(disable_decoding=disable_decoding)
+        except (ConnectionError, TimeoutError) as e:
+            self.breaker.record_failure(e)
+            raise
+        self.breaker.record_success()
+        return response
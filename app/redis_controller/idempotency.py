@@ -0,0 +1,55 @@
+import json
+
+from typing import Optional
+
+from redis import Redis
+
+# Requests sent with an `Idempotency-Key` header are recorded as JSON strings: the fingerprint
+# of the request, and the id of the session it created once it is done (null while the request
+# is being processed). Records are stored on the first redis node, like rate limits
+IDEMPOTENCY_PREFIX = "idempotency:"
+
+
+def reserve_idempotency_key(redis_app: Redis, key: str, fingerprint: str, lease: int) -> Optional[dict]:
+    """
+    Records that a request is being processed, unless a request with the same key was
+    already received. The key is only held for `lease` seconds until the request completes
+    (see `complete_idempotency_key`), so that it is not held for long by a request that
+    never completes (e.g. its worker was killed)
+
+    :param redis_app: A redis client
+    :param key: The idempotency key, scoped to the client and the endpoint
+    :param fingerprint: A digest of the request body
+    :param lease: Delay (in seconds) during which the key is held while the request is processed
+    :return: None if the request must be processed, else the record of the previous request
+        (`fingerprint`, and `session_id` or None if it is still being processed)
+    """
+    record = json.dumps({"fingerprint": fingerprint, "session_id": None})
+    if redis_app.set(f"{IDEMPOTENCY_PREFIX}{key}", record, nx=True, ex=lease):
+        return None
+    previous = redis_app.get(f"{IDEMPOTENCY_PREFIX}{key}")
+    if previous is None:
+        # Expired in the meantime
+        return reserve_idempotency_key(redis_app, key, fingerprint, lease)
+    return json.loads(previous)
+
+
+def complete_idempotency_key(redis_app: Redis, key: str, fingerprint: str, session_id: str, ttl: int) -> None:
+    """
+    Records the session created by a request, returned to the requests sent again with the same key.
+    The key is then remembered for `ttl` seconds
+
+    :param redis_app: A redis client
+    :param key: The idempotency key, scoped to the client and the endpoint
+    :param fingerprint: A digest of the request body
+    :param session_id: The id of the session returned by the request
+    :param ttl: Delay (in seconds) during which the key is remembered
+    :return: None
+    """
+    record = json.dumps({"fingerprint": fingerprint, "session_id": session_id})
+    redis_app.set(f"{IDEMPOTENCY_PREFIX}{key}", record, ex=ttl)
+
+
+def release_idempotency_key(redis_app: Redis, key: str) -> None:
+    """Forgets a request that failed, so that it can be sent again with the same key"""
+    redis_app.delete(f"{IDEMPOTENCY_PREFIX}{key}")
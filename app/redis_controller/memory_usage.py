@@ -0,0 +1,76 @@
+from itertools import islice
+from typing import Optional
+
+from redis import Redis
+from redis.exceptions import ResponseError
+
+from .session_history import HISTORY_PREFIX
+from .session_index import SESSION_PREFIX
+
+
+def _memory_usage(result) -> Optional[int]:
+    """Returns the result of a MEMORY USAGE command, or None if it failed (e.g. command disabled)"""
+    return None if isinstance(result, ResponseError) else result
+
+
+def sample_session_memory(redis_app: Redis, samples: int) -> list[dict]:
+    """
+    Measures the memory used in a redis node by a sample of its sessions. Sessions are taken
+    in the order of a SCAN of the node, which does not depend on their age or size.
+    Their sizes are read in a single pipeline.
+
+    :param redis_app: A redis client
+    :param samples: The maximum number of sessions measured
+    :return: For each sampled session: its `id`, the number of bytes used by its document
+        (`document_bytes`) and its history (`history_bytes`, 0 without history), and the
+        number of Tasks in its document (`tasks`, Tasks with several parents being counted
+        once per parent). Sizes are None if the server refuses MEMORY USAGE commands
+    """
+    keys = islice(redis_app.scan_iter(match=f"{SESSION_PREFIX}*", count=max(samples, 100)), samples)
+    session_ids = [key[len(SESSION_PREFIX):] for key in keys]
+    if not session_ids:
+        return []
+
+    pipeline = redis_app.pipeline(transaction=False)
+    for session_id in session_ids:
+        # SAMPLES 0: measure every field of the document instead of estimating from a few of them
+        pipeline.memory_usage(f"{SESSION_PREFIX}{session_id}", samples=0)
+        pipeline.memory_usage(f"{HISTORY_PREFIX}{session_id}", samples=0)
+        pipeline.json().get(f"{SESSION_PREFIX}{session_id}", "$..disabled")
+    results = pipeline.execute(raise_on_error=False)
+
+    sessions = []
+    for i, session_id in enumerate(session_ids):
+        document_bytes, history_bytes, tasks = results[3 * i: 3 * i + 3]
+        if tasks is None or isinstance(tasks, ResponseError):
+            # Deleted since the scan
+            continue
+        document_bytes = _memory_usage(document_bytes)
+        if document_bytes is not None:
+            # MEMORY USAGE returns None for a missing key (session without history)
+            history_bytes = _memory_usage(history_bytes) or 0
+        else:
+            history_bytes = None
+        sessions.append({
+            "id": session_id,
+            "document_bytes": document_bytes,
+            "history_bytes": history_bytes,
+            "tasks": len(tasks),
+        })
+    return sessions
+
+
+def get_node_memory(redis_app: Redis) -> dict:
+    """
+    Returns the memory used by a redis node
+
+    :param redis_app: A redis client
+    :return: The number of keys (`keys`) and bytes used by the node (`used_memory`),
+        and the largest number of bytes it used (`used_memory_peak`)
+    """
+    info = redis_app.info("memory")
+    return {
+        "keys": redis_app.dbsize(),
+        "used_memory": info.get("used_memory"),
+        "used_memory_peak": info.get("used_memory_peak"),
+    }
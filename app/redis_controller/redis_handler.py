@@ -1,26 +1,124 @@
 import os
+import time
+import logging
 
-from redis import Redis
+from threading import Lock
+from typing import Optional
+
+from redis import Redis, ConnectionPool
 from redis.exceptions import ConnectionError
 
+from app.dependencies.settings import get_settings
+from .circuit_breaker import BreakerConnection, CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+_redis_nodes: Optional[dict[str, Redis]] = None
+_redis_app_lock = Lock()
+
+
+def get_node_addresses(nodes: Optional[list[str]] = None) -> list[str]:
+    """
+    Returns the addresses (`host:port`) of the redis nodes storing sessions
+
+    :param nodes: The configured nodes (`redis_nodes` setting if not given). If empty, the
+        single node set by the `REDIS_URL` and `REDIS_PORT` environment variables is used
+    :return: The list of node addresses
+    """
+    if nodes is None:
+        nodes = get_settings().redis_nodes
+    if nodes:
+        return list(nodes)
+    return [f"{os.environ.get('REDIS_URL', 'localhost')}:{os.environ.get('REDIS_PORT', 6379)}"]
+
 
+def create_redis_app(retries: int = 0, backoff: float = 0.5, address: Optional[str] = None) -> Redis:
+    """
+    Creates a redis client and checks that the server answers. Commands time out after
+    `redis_command_timeout` seconds, and go through the circuit breaker of the server.
 
-def create_redis_app():
-    redis_app = Redis(
-        host=os.environ.get("REDIS_URL", "localhost"),
-        port=os.environ.get("REDIS_PORT", 6379),
+    :param retries: Number of additional connection attempts before giving up
+    :param backoff: Delay (in seconds) before the first retry. The delay doubles after each attempt
+    :param address: The `host:port` address of the server (first node of `get_node_addresses` by default)
+    :return: A connected redis client
+    """
+    config = get_settings()
+    host, port = (address or get_node_addresses()[0]).rsplit(":", 1)
+    redis_app = Redis(connection_pool=ConnectionPool(
+        connection_class=BreakerConnection,
+        host=host,
+        port=int(port),
         # FIXME
         # username=os.environ.get("REDIS_USERNAME", "default"),
         # password=os.environ.get("REDIS_PASSWORD", "")
         decode_responses=True,
-    )
-    try:
-        # Check that connection is working
-        redis_app.ping()
-    except ConnectionError as e:
-        raise ConnectionError(f"An error occurred with redis server: {str(e)}")
-    # Loading dummy data for tests
-    return redis_app
+        socket_timeout=config.redis_command_timeout,
+        socket_connect_timeout=config.redis_command_timeout,
+    ))
+    for attempt in range(retries + 1):
+        try:
+            # Check that connection is working
+            redis_app.ping()
+            return redis_app
+        except CircuitOpenError:
+            # The node is known to be unavailable: retrying would only wait for it to recover
+            raise
+        except ConnectionError as e:
+            if attempt == retries:
+                raise ConnectionError(f"An error occurred with redis server: {str(e)}")
+            logger.warning(f"Redis server not reachable ({str(e)}), retrying in {backoff}s")
+            time.sleep(backoff)
+            backoff *= 2
+
+
+def get_redis_nodes(retries: int = 0) -> dict[str, Redis]:
+    """
+    Returns the clients of all the redis nodes storing sessions, connecting on first use.
+    If the connection fails, the next call tries again.
+
+    :param retries: Number of additional connection attempts, made after `redis_connect_backoff`
+        seconds (doubled after each attempt). Only for connections made out of requests (e.g. on
+        startup): requests fail at once instead of holding a thread while redis is unavailable
+    :return: A mapping of node addresses to connected redis clients, in configuration order
+    """
+    global _redis_nodes
+    if _redis_nodes is not None:
+        return _redis_nodes
+
+    with _redis_app_lock:
+        if _redis_nodes is None:
+            config = get_settings()
+            nodes = {}
+            try:
+                for address in get_node_addresses():
+                    nodes[address] = create_redis_app(
+                        retries=retries,
+                        backoff=config.redis_connect_backoff,
+                        address=address,
+                    )
+            except ConnectionError:
+                for redis_app in nodes.values():
+                    redis_app.close()
+                raise
+            _redis_nodes = nodes
+    return _redis_nodes
+
+
+def get_redis_app() -> Redis:
+    """
+    Returns the client of the first redis node, which stores the data not tied to
+    a session (e.g. rate limits). See `get_session_redis` for session data.
+
+    :return: A connected redis client
+    """
+    return next(iter(get_redis_nodes().values()))
 
 
-redis_app = create_redis_app()
+def close_redis_app() -> None:
+    """Closes the redis clients, if any. The next `get_redis_app` call reconnects"""
+    global _redis_nodes
+    with _redis_app_lock:
+        if _redis_nodes is not None:
+            for redis_app in _redis_nodes.values():
+                redis_app.close()
+            _redis_nodes = None
@@ -0,0 +1,48 @@
+from typing import Optional
+
+from redis import Redis
+from redis.client import NEVER_DECODE
+
+from app.dependencies.settings import get_settings
+
+# Rendered reports are stored in a hash per session and format, along with the version of the
+# session they were rendered from. They are stored on the node of the session, but are not moved
+# with it (see `sharding.session_keys`): a report missing after a rebalancing is rendered again
+REPORT_PREFIX = "session_report:"
+
+
+def get_cached_report(redis_app: Redis, session_id: str, report_format: str, version: str) -> Optional[bytes]:
+    """
+    Returns a rendered report, if it was rendered from the given version of the session
+
+    :param redis_app: The client of the node storing the session
+    :param session_id: The session identifier
+    :param report_format: The report format (e.g. `pdf`)
+    :param version: The version of the session (see `session_version`)
+    :return: The content of the report file, or None if it must be rendered
+    """
+    cached_version, content = redis_app.execute_command(
+        "HMGET", f"{REPORT_PREFIX}{session_id}:{report_format}", "version", "content", **{NEVER_DECODE: []}
+    )
+    if cached_version is None or cached_version.decode() != version:
+        return None
+    return content
+
+
+def cache_report(redis_app: Redis, session_id: str, report_format: str, version: str, content: bytes) -> None:
+    """
+    Stores a rendered report for `report_cache_ttl` seconds, replacing the one rendered
+    from a previous version of the session
+
+    :param redis_app: The client of the node storing the session
+    :param session_id: The session identifier
+    :param report_format: The report format (e.g. `pdf`)
+    :param version: The version of the session the report was rendered from
+    :param content: The content of the report file
+    :return: None
+    """
+    key = f"{REPORT_PREFIX}{session_id}:{report_format}"
+    pipeline = redis_app.pipeline(transaction=True)
+    pipeline.hset(key, mapping={"version": version, "content": content})
+    pipeline.expire(key, get_settings().report_cache_ttl)
+    pipeline.execute()
@@ -0,0 +1,63 @@
+import json
+
+from collections import OrderedDict
+from threading import Lock
+from typing import Optional
+
+from app.dependencies.settings import get_settings
+
+
+class RecentSessions:
+    """
+    The last `size` sessions read or written by this process, kept to be returned when their
+    redis node is unavailable (see `CircuitBreaker`). Sessions are stored serialized, to
+    bound the memory they hold and so that callers can modify the sessions they get.
+    """
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self._sessions: OrderedDict[str, str] = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def put(self, session: dict) -> None:
+        """
+        Records the latest known version of a session
+
+        :param session: The JSON representation of the session
+        :return: None
+        """
+        if self.size <= 0:
+            return
+        document = json.dumps(session, separators=(",", ":"))
+        with self._lock:
+            self._sessions[session["id"]] = document
+            self._sessions.move_to_end(session["id"])
+            while len(self._sessions) > self.size:
+                self._sessions.popitem(last=False)
+
+    def get(self, session_id: str) -> Optional[dict]:
+        """
+        Returns the latest known version of a session
+
+        :param session_id: The session identifier
+        :return: The JSON representation of the session, or None if it was not read recently
+        """
+        with self._lock:
+            document = self._sessions.get(session_id)
+        return json.loads(document) if document is not None else None
+
+
+_recent_sessions: Optional[RecentSessions] = None
+_recent_sessions_lock = Lock()
+
+
+def get_recent_sessions() -> RecentSessions:
+    """Returns the cache of recently read sessions, created on first use"""
+    global _recent_sessions
+    if _recent_sessions is None:
+        with _recent_sessions_lock:
+            if _recent_sessions is None:
+                _recent_sessions = RecentSessions(get_settings().degraded_cache_size)
+    return _recent_sessions
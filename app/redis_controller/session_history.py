@@ -0,0 +1,227 @@
+import json
+import re
+
+from typing import Optional
+
+from redis import Redis
+from redis.client import Pipeline
+
+from app.dependencies.settings import get_settings
+from app.models.session import SessionHandler, SessionStatus, subject_hash
+from app.models.tasks import TaskStatus
+from .session_index import SESSION_PREFIX
+
+# Each session history is made of two streams: the Task status changes, and snapshots of the
+# Task statuses taken every `history_snapshot_interval` changes. A session at a given time is
+# rebuilt from the last snapshot before that time, replaying the changes recorded since.
+HISTORY_PREFIX = "session_history:"
+SNAPSHOTS_PREFIX = "session_snapshots:"
+
+# Adds a snapshot (ARGV[2]) to the snapshots (KEYS[1]), along with the id of the last change
+# recorded (KEYS[2]) before it, from which changes are replayed. Then keeps the last ARGV[1]
+# snapshots, and drops the changes older than the oldest snapshot kept, which could not be
+# replayed anymore
+SNAPSHOT_HISTORY_SCRIPT = """
+local last = redis.call('XREVRANGE', KEYS[2], '+', '-', 'COUNT', 1)
+local last_event = ''
+if last[1] then
+    last_event = last[1][1]
+end
+redis.call('XADD', KEYS[1], '*', 'session', ARGV[2], 'last_event', last_event)
+redis.call('XTRIM', KEYS[1], 'MAXLEN', ARGV[1])
+local oldest = redis.call('XRANGE', KEYS[1], '-', '+', 'COUNT', 1)
+if oldest[1] then
+    redis.call('XTRIM', KEYS[2], 'MINID', oldest[1][1])
+end
+return 0
+"""
+
+_event_id_regex = re.compile(r"^[0-9]+-[0-9]+$")
+
+
+def encode_history_event(task_key: str, changes: list[tuple]) -> dict[str, str]:
+    """
+    Returns the stream entry recording a Task status change (see `SessionHandler.record_history_event`)
+
+    :param task_key: The id of the Task updated by the user
+    :param changes: List of (Task id, previous status, previous disabled, status, disabled) tuples
+    :return: The fields of the stream entry
+    """
+    return {
+        "task": task_key,
+        "changes": json.dumps([
+            [key, previous_status.value, int(previous_disabled), status.value, int(disabled)]
+            for key, previous_status, previous_disabled, status, disabled in changes
+        ], separators=(",", ":")),
+    }
+
+
+def decode_history_event(event_id: str, fields: dict[str, str]) -> dict:
+    """
+    Reads a stream entry written by `encode_history_event`
+
+    :return: The event, in the format of the SessionHistoryEvent model
+    """
+    return {
+        "id": event_id,
+        "timestamp": int(event_id.split("-")[0]) / 1000,
+        "task_id": fields["task"],
+        "changes": [
+            {
+                "task_id": key,
+                "previous_status": previous_status,
+                "previous_disabled": bool(previous_disabled),
+                "status": status,
+                "disabled": bool(disabled),
+            }
+            for key, previous_status, previous_disabled, status, disabled in json.loads(fields["changes"])
+        ],
+    }
+
+
+def encode_history_snapshot(session: dict) -> dict[str, str]:
+    """
+    Returns the stream entry recording the state of a session. Only the Task statuses and
+    the session attributes that cannot be recalculated from them are stored: the Task
+    tree and the session subject never change once the session is created.
+
+    :param session: The JSON representation of the session
+    :return: The fields of the stream entry (the id of the last change is added when it is stored)
+    """
+    tasks = []
+    pending = list(session["tasks"].values())
+    while pending:
+        task = pending.pop()
+        tasks.append([task["id"], task["status"], int(task["disabled"])])
+        pending.extend(task["children"].values())
+
+    snapshot = {
+        field: session.get(field)
+        for field in ("status", "history_length", "score_all_essential", "score_all_nonessential",
+                      "score_all", "score_applicable_essential", "score_applicable_nonessential",
+                      "score_applicable_all", "ratio_not_applicable")
+    }
+    snapshot["tasks"] = tasks
+    return {"session": json.dumps(snapshot, separators=(",", ":"))}
+
+
+def queue_session_write(pipeline: Pipeline, session: dict, events: list[tuple] = (), snapshot: bool = False) -> None:
+    """
+    Adds to a pipeline the commands storing a session, along with the digest of its subject
+    (see `subject_hash`), and recording its Task status changes in its history. A snapshot
+    is taken every `history_snapshot_interval` changes, at which point the history is
+    compacted. The pipeline should be transactional, for the session and its history to be
+    stored together.
+
+    :param pipeline: A redis pipeline
+    :param session: The JSON representation of the session to store
+    :param events: The changes to record (see `SessionHandler.history_events`)
+    :param snapshot: Whether to take a snapshot regardless of the number of changes
+        (e.g. when the session is created)
+    :return: None
+    """
+    config = get_settings()
+    session_id = session["id"]
+    document = {**session, "subject_hash": subject_hash(session["session_subject"])}
+    pipeline.json().set(f"{SESSION_PREFIX}{session_id}", "$", obj=document)
+
+    for task_key, changes in events:
+        pipeline.xadd(f"{HISTORY_PREFIX}{session_id}", encode_history_event(task_key, changes))
+
+    # Snapshots follow the 1st, (interval + 1)th, ... changes, so that the history of sessions
+    # created before it was recorded starts from their first change
+    history_length = session.get("history_length") or 0
+    first = history_length - len(events) + 1
+    interval = config.history_snapshot_interval
+    if snapshot or any((n - 1) % interval == 0 for n in range(first, history_length + 1)):
+        pipeline.register_script(SNAPSHOT_HISTORY_SCRIPT)(
+            keys=[f"{SNAPSHOTS_PREFIX}{session_id}", f"{HISTORY_PREFIX}{session_id}"],
+            args=[max(1, config.history_max_events // interval), encode_history_snapshot(session)["session"]],
+            client=pipeline,
+        )
+
+
+def get_session_history(
+    redis_app: Redis,
+    session_id: str,
+    limit: int,
+    cursor: Optional[str] = None,
+) -> Optional[tuple[list[dict], Optional[str]]]:
+    """
+    Reads the history of a session, one page at a time
+
+    :param redis_app: A redis client
+    :param session_id: The session identifier
+    :param limit: Maximum number of events returned
+    :param cursor: The cursor returned with the previous page, if any
+    :return: A tuple with the events of the page, oldest first, and the cursor of the next page
+        (None if this is the last one). None if no session has this id
+    """
+    if cursor is not None and _event_id_regex.match(cursor) is None:
+        raise ValueError("Invalid cursor")
+
+    pipeline = redis_app.pipeline(transaction=False)
+    pipeline.exists(f"{SESSION_PREFIX}{session_id}")
+    pipeline.xrange(f"{HISTORY_PREFIX}{session_id}", min=f"({cursor}" if cursor else "-", max="+", count=limit + 1)
+    exists, entries = pipeline.execute()
+    if not exists:
+        return None
+
+    events = [decode_history_event(event_id, fields) for event_id, fields in entries[:limit]]
+    next_cursor = events[-1]["id"] if len(entries) > limit else None
+    return events, next_cursor
+
+
+def get_session_at(redis_app: Redis, session_id: str, timestamp: float) -> Optional[dict]:
+    """
+    Rebuilds a session as it was at a given time, from the last snapshot taken before that
+    time and the Task status changes recorded since. At most `history_snapshot_interval`
+    changes are replayed, whatever the length of the history.
+
+    :param redis_app: A redis client
+    :param session_id: The session identifier
+    :param timestamp: The point in time (UNIX timestamp)
+    :return: The JSON representation of the session, or None if the session does not exist,
+        did not exist yet, or if its history at that time was compacted
+    """
+    at = str(int(timestamp * 1000))
+    pipeline = redis_app.pipeline(transaction=True)
+    pipeline.json().get(f"{SESSION_PREFIX}{session_id}")
+    pipeline.xrevrange(f"{SNAPSHOTS_PREFIX}{session_id}", max=at, min="-", count=1)
+    session, snapshots = pipeline.execute()
+    if session is None or not snapshots:
+        return None
+
+    # Changes are replayed from the last one recorded before the snapshot, whose id can be
+    # greater than the snapshot id (each stream numbers its own entries). Snapshots
+    # taken before this id was stored are replayed from their own id
+    snapshot_id, fields = snapshots[0]
+    last_event = fields.get("last_event", snapshot_id)
+    events = redis_app.xrange(f"{HISTORY_PREFIX}{session_id}", min=f"({last_event}" if last_event else "-", max=at)
+
+    handler = SessionHandler.from_existing_session(session)
+    snapshot = json.loads(fields["session"])
+    for key, status, disabled in snapshot.pop("tasks"):
+        task = handler.get_task(key)
+        if task is not None:
+            task.status = TaskStatus(status)
+            task.disabled = bool(disabled)
+    handler.status = SessionStatus(snapshot.pop("status"))
+    handler.history_length = snapshot.pop("history_length") or 0
+    handler.scores.update(snapshot)
+    handler.compute_group_scores()
+
+    for _, event in events:
+        for key, _, _, status, disabled in json.loads(event["changes"]):
+            task = handler.get_task(key)
+            if task is not None:
+                task.status = TaskStatus(status)
+                task.disabled = bool(disabled)
+        handler.history_length += 1
+    if events:
+        handler.compute_group_scores()
+        handler.update_session_data()
+
+    last_id = events[-1][0] if events else snapshot_id
+    handler.updated_at = int(last_id.split("-")[0]) / 1000
+    return handler.to_dict()
@@ -0,0 +1,268 @@
+import base64
+import json
+
+from typing import Callable, Optional, TypeVar
+
+from redis import Redis
+from redis.exceptions import ResponseError
+from redis.commands.search import Search
+from redis.commands.search.aggregation import AggregateRequest, Asc, Desc
+from redis.commands.search.field import TagField, NumericField
+from redis.commands.search.indexDefinition import IndexDefinition, IndexType
+from redis.commands.search.query import Query
+
+T = TypeVar("T")
+
+SESSION_INDEX = "idx:session"
+SESSION_PREFIX = "session:"
+
+# Fields of the session JSON documents indexed by RediSearch, with their alias in the index
+SESSION_INDEX_SCHEMA = (
+    TagField("$.status", as_name="status", sortable=True),
+    TagField("$.session_subject.subject_type", as_name="subject_type"),
+    TagField("$.session_subject.has_archive", as_name="has_archive"),
+    TagField("$.session_subject.has_model", as_name="has_model"),
+    TagField("$.session_subject.has_archive_metadata", as_name="has_archive_metadata"),
+    TagField("$.session_subject.is_biomodel", as_name="is_biomodel"),
+    TagField("$.session_subject.is_pmr", as_name="is_pmr"),
+    NumericField("$.score_all_essential", as_name="score_all_essential", sortable=True),
+    NumericField("$.score_all_nonessential", as_name="score_all_nonessential", sortable=True),
+    NumericField("$.score_all", as_name="score_all", sortable=True),
+    NumericField("$.score_applicable_essential", as_name="score_applicable_essential", sortable=True),
+    NumericField("$.score_applicable_nonessential", as_name="score_applicable_nonessential", sortable=True),
+    NumericField("$.score_applicable_all", as_name="score_applicable_all", sortable=True),
+    NumericField("$.ratio_not_applicable", as_name="ratio_not_applicable", sortable=True),
+    NumericField("$.created_at", as_name="created_at", sortable=True),
+    NumericField("$.updated_at", as_name="updated_at", sortable=True),
+)
+
+# Index fields returned for each session found, with their JSONPath in the session documents
+SESSION_SUMMARY_PATHS = {
+    field.as_name: field.name for field in SESSION_INDEX_SCHEMA
+    if field.as_name not in {"has_archive", "has_model", "has_archive_metadata", "is_biomodel", "is_pmr"}
+}
+
+
+def create_session_index(redis_app: Redis) -> None:
+    """
+    Creates the RediSearch index over the session documents, if it does not exist yet.
+    Redis indexes existing sessions in the background, and new ones as they are written.
+
+    :param redis_app: A redis client connected to a server with the RediSearch module
+    :return: None
+    """
+    try:
+        redis_app.ft(SESSION_INDEX).info()
+    except ResponseError:
+        redis_app.ft(SESSION_INDEX).create_index(
+            SESSION_INDEX_SCHEMA,
+            definition=IndexDefinition(prefix=[SESSION_PREFIX], index_type=IndexType.JSON),
+        )
+
+
+def encode_cursor(position: dict) -> str:
+    """Returns the opaque cursor given to users to fetch the next page of results"""
+    return base64.urlsafe_b64encode(json.dumps(position, separators=(",", ":")).encode()).decode()
+
+
+def decode_cursor(cursor: Optional[str], sort_by: str, ascending: bool) -> Optional[dict]:
+    """
+    Reads a cursor created by `encode_cursor`
+
+    :param cursor: The cursor sent by the user (None for the first page)
+    :param sort_by: The index field results are sorted by
+    :param ascending: Whether results are sorted in ascending order
+    :return: The position of the last session of the previous page: its `sort_by` value (`value`,
+        None if it has none) and its key (`key`). None for the first page
+    """
+    if cursor is None:
+        return None
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        value = position["value"]
+        valid = (
+            position["sort_by"] == sort_by
+            and position["ascending"] is ascending
+            and isinstance(position["key"], str)
+            and position["key"].startswith(SESSION_PREFIX)
+            and (value is None or isinstance(value, (int, float)) and not isinstance(value, bool))
+        )
+    except (ValueError, KeyError, TypeError):
+        valid = False
+    if not valid:
+        raise ValueError("Invalid cursor")
+    return position
+
+
+def build_session_query(
+    tags: dict[str, Optional[str]],
+    ranges: dict[str, tuple[Optional[float], Optional[float]]],
+) -> str:
+    """
+    Builds the RediSearch query matching sessions with the given attributes
+
+    :param tags: Mapping of tag fields to the value sessions must have (ignored if None)
+    :param ranges: Mapping of numeric fields to their (minimum, maximum) values (bounds ignored if None)
+    :return: A RediSearch query string
+    """
+    clauses = []
+    for field, value in tags.items():
+        if value is not None:
+            clauses.append(f"@{field}:{{{value}}}")
+
+    for field, (minimum, maximum) in ranges.items():
+        if minimum is not None or maximum is not None:
+            low = "-inf" if minimum is None else minimum
+            high = "+inf" if maximum is None else maximum
+            clauses.append(f"@{field}:[{low} {high}]")
+
+    return " ".join(clauses) or "*"
+
+
+def _run_on_node(redis_app: Redis, run: Callable[[Search], T]) -> T:
+    """Runs a command on the session index of a redis node, creating the index if it is missing"""
+    try:
+        return run(redis_app.ft(SESSION_INDEX))
+    except ResponseError as e:
+        if "no such index" not in str(e).lower() and "unknown index" not in str(e).lower():
+            raise
+        create_session_index(redis_app)
+        return run(redis_app.ft(SESSION_INDEX))
+
+
+def _quote(value: str) -> str:
+    """Quotes a string in an aggregation expression"""
+    return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def _keyset_requests(query: str, sort_by: str, ascending: bool, count: int, position: Optional[dict]) -> list:
+    """
+    Returns the aggregations listing the first sessions after `position`, in order: the sessions
+    with a `sort_by` value, sorted by that value then by key, and the sessions without one (e.g. not
+    scored yet), sorted by key. Sessions before `position` are excluded by the query, instead of
+    being sorted and skipped, so that a page costs the same whatever its depth.
+
+    :param query: A query built with `build_session_query`
+    :param sort_by: The (sortable) index field used to order results
+    :param ascending: Whether results are sorted in ascending order
+    :param count: Maximum number of sessions listed by each aggregation
+    :param position: The position of the last session of the previous page (see `decode_cursor`)
+    :return: The list of AggregateRequest to run in order, until `count` sessions are listed
+    """
+    def restrict(clause: str) -> str:
+        return clause if query == "*" else f"{query} {clause}"
+
+    requests = []
+    if position is None or position["value"] is not None:
+        if position is None:
+            request = AggregateRequest(restrict(f"@{sort_by}:[-inf +inf]")).load("@__key")
+        else:
+            value = repr(float(position["value"]))
+            bound = f"[{value} +inf]" if ascending else f"[-inf {value}]"
+            request = AggregateRequest(restrict(f"@{sort_by}:{bound}")).load("@__key")
+            # Sessions with the same value as the last one come after it if their key does
+            comparison = ">" if ascending else "<"
+            request.filter(f"@{sort_by} {comparison} {value} || @__key > {_quote(position['key'])}")
+        sort_field = Asc(f"@{sort_by}") if ascending else Desc(f"@{sort_by}")
+        requests.append(request.sort_by(sort_field, Asc("@__key"), max=count).limit(0, count).dialect(2))
+
+    request = AggregateRequest(restrict(f"-@{sort_by}:[-inf +inf]")).load("@__key")
+    if position is not None and position["value"] is None:
+        request.filter(f"@__key > {_quote(position['key'])}")
+    requests.append(request.sort_by(Asc("@__key"), max=count).limit(0, count).dialect(2))
+    return requests
+
+
+def _next_node_sessions(
+    redis_app: Redis,
+    query: str,
+    sort_by: str,
+    ascending: bool,
+    count: int,
+    position: Optional[dict],
+) -> list[dict]:
+    """
+    Returns the summaries of the first `count` sessions of a redis node after `position`. Summaries
+    are read from the session documents rather than from the index, whose numbers are rounded.
+
+    :return: The summaries, with the key of the session (`key`)
+    """
+    keys = []
+    for request in _keyset_requests(query, sort_by, ascending, count, position):
+        if len(keys) >= count:
+            break
+        result = _run_on_node(redis_app, lambda index: index.aggregate(request))
+        keys.extend(dict(zip(row[::2], row[1::2]))["__key"] for row in result.rows)
+    if not keys:
+        return []
+
+    pipeline = redis_app.pipeline(transaction=False)
+    for path in SESSION_SUMMARY_PATHS.values():
+        pipeline.json().mget(keys, path)
+    results = dict(zip(SESSION_SUMMARY_PATHS, pipeline.execute()))
+
+    summaries = []
+    for i, key in enumerate(keys):
+        if all(matches[i] is None for matches in results.values()):
+            # Deleted in the meantime
+            continue
+        summary = {field: matches[i][0] if matches[i] else None for field, matches in results.items()}
+        summary["key"] = key
+        summaries.append(summary)
+    return summaries
+
+
+def search_sessions(
+    redis_apps: list[Redis],
+    query: str,
+    sort_by: str,
+    ascending: bool,
+    limit: int,
+    cursor: Optional[str] = None,
+) -> tuple[int, list[dict], Optional[str]]:
+    """
+    Searches the session index, one page at a time. Pages start after the last session of the
+    previous page (keyset pagination): sessions are sorted by `sort_by` then by id, and the cursor
+    holds the position of the last session returned, so that sessions modified between two pages
+    do not shift the following ones. Each redis node lists its first sessions after that position,
+    which are merged to build the page.
+
+    :param redis_apps: The clients of the redis nodes storing sessions
+    :param query: A query built with `build_session_query`
+    :param sort_by: The (sortable) index field used to order results
+    :param ascending: Whether results are sorted in ascending order
+    :param limit: Maximum number of sessions returned
+    :param cursor: The cursor returned with the previous page, if any
+    :return: A tuple with the total number of matching sessions, the summaries of the
+        sessions of this page, and the cursor of the next page (None if this is the last one)
+    :raise ValueError: If the cursor is invalid, or was returned by a search with another order
+    """
+    position = decode_cursor(cursor, sort_by, ascending)
+    count_query = Query(query).no_content().paging(0, 0).dialect(2)
+
+    total = 0
+    summaries = []
+    for redis_app in redis_apps:
+        total += _run_on_node(redis_app, lambda index: index.search(count_query)).total
+        # One more session than needed tells whether there is a next page
+        summaries.extend(_next_node_sessions(redis_app, query, sort_by, ascending, limit + 1, position))
+
+    def sort_key(summary: dict):
+        value = summary[sort_by]
+        if value is None:
+            return True, 0, summary["key"]
+        return False, value if ascending else -value, summary["key"]
+
+    summaries.sort(key=sort_key)
+    page = summaries[:limit]
+
+    next_cursor = None
+    if len(summaries) > limit:
+        last = page[-1]
+        next_cursor = encode_cursor({"sort_by": sort_by, "ascending": ascending, "value": last[sort_by], "key": last["key"]})
+
+    sessions = []
+    for summary in page:
+        summary["id"] = summary.pop("key")[len(SESSION_PREFIX):]
+        sessions.append(summary)
+    return total, sessions, next_cursor
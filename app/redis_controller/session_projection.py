@@ -0,0 +1,40 @@
+from redis import Redis
+
+from .sharding import get_session_node
+from .session_index import SESSION_PREFIX
+
+
+def fetch_session_projections(
+    redis_nodes: dict[str, Redis],
+    session_ids: list[str],
+    paths: dict[str, str],
+) -> dict[str, dict[str, list]]:
+    """
+    Reads parts of many sessions at once, without loading the whole documents. Sessions
+    are grouped by redis node, and each node gets a single pipeline with one JSON.MGET per
+    JSONPath.
+
+    :param redis_nodes: The redis clients of the nodes, by address (see `get_redis_nodes`)
+    :param session_ids: The session identifiers
+    :param paths: Mapping of names to the JSONPath expressions to read (e.g. `{"status": "$.status"}`)
+    :return: Mapping of the ids of the sessions found to the matches of each path, by name
+        (lists of the matched values, empty if a session has no such field). Sessions not found
+        (e.g. not yet moved to their node after a rebalancing) are not included
+    """
+    node_sessions = {}
+    for session_id in dict.fromkeys(session_ids):
+        node_sessions.setdefault(get_session_node(session_id, tuple(redis_nodes)), []).append(session_id)
+
+    projections = {}
+    for address, ids in node_sessions.items():
+        keys = [f"{SESSION_PREFIX}{session_id}" for session_id in ids]
+        pipeline = redis_nodes[address].pipeline(transaction=False)
+        for path in paths.values():
+            pipeline.json().mget(keys, path)
+        results = dict(zip(paths, pipeline.execute()))
+
+        for i, session_id in enumerate(ids):
+            if all(matches[i] is None for matches in results.values()):
+                continue
+            projections[session_id] = {name: matches[i] or [] for name, matches in results.items()}
+    return projections
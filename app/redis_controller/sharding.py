@@ -0,0 +1,123 @@
+import bisect
+import hashlib
+import logging
+
+from functools import lru_cache
+from threading import Lock
+
+from redis import Redis
+from redis.exceptions import ResponseError
+
+from app.dependencies.settings import get_settings
+from .redis_handler import get_redis_nodes, get_node_addresses, create_redis_app
+from .session_history import HISTORY_PREFIX, SNAPSHOTS_PREFIX
+from .session_index import SESSION_PREFIX
+
+logger = logging.getLogger(__name__)
+
+# Delay (in milliseconds) given to redis to move the keys of a session to another node
+MIGRATE_TIMEOUT = 5000
+
+_former_nodes: dict[str, Redis] = {}
+_former_nodes_lock = Lock()
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Consistent hashing of session ids over redis nodes. Each node is placed at `replicas`
+    points of a ring of hashes, and a session belongs to the node of the first point
+    following the hash of its id. When a node is added, only the sessions falling on its
+    points move (about 1 / number of nodes of them), all from the other nodes to the new one.
+    """
+    def __init__(self, nodes: tuple[str, ...], replicas: int = 160) -> None:
+        points = sorted((_hash(f"{node}#{i}"), node) for node in nodes for i in range(replicas))
+        self._hashes = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+        self._single_node = len(nodes) == 1
+
+    def get_node(self, key: str) -> str:
+        """Returns the address of the node a key belongs to"""
+        if self._single_node:
+            return self._nodes[0]
+        i = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._nodes[i]
+
+
+@lru_cache()
+def get_hash_ring(nodes: tuple[str, ...]) -> HashRing:
+    """Returns the hash ring of the given node addresses, built on first use"""
+    return HashRing(nodes)
+
+
+def session_keys(session_id: str) -> list[str]:
+    """Returns the keys holding the data of a session, which are always stored on the same node"""
+    return [f"{SESSION_PREFIX}{session_id}", f"{HISTORY_PREFIX}{session_id}", f"{SNAPSHOTS_PREFIX}{session_id}"]
+
+
+def get_session_node(session_id: str, nodes: tuple[str, ...]) -> str:
+    """
+    Returns the address of the node storing a session
+
+    :param session_id: The session identifier
+    :param nodes: The addresses of the redis nodes
+    :return: The address of one of `nodes`
+    """
+    return get_hash_ring(nodes).get_node(session_id)
+
+
+def _get_former_node(address: str) -> Redis:
+    """Returns a client for a node that may not be part of the `redis_nodes` setting anymore"""
+    nodes = get_redis_nodes()
+    if address in nodes:
+        return nodes[address]
+    with _former_nodes_lock:
+        if address not in _former_nodes:
+            _former_nodes[address] = create_redis_app(address=address)
+        return _former_nodes[address]
+
+
+def migrate_session(source: Redis, target: str, session_id: str) -> bool:
+    """
+    Moves the keys of a session to another redis node
+
+    :param source: The client of the node storing the session
+    :param target: The address of the node the session is moved to, as seen from the source node
+    :param session_id: The session identifier
+    :return: True if the session was moved, False if the source node did not store it
+    """
+    host, port = target.rsplit(":", 1)
+    try:
+        result = source.migrate(host, int(port), session_keys(session_id), 0, MIGRATE_TIMEOUT)
+    except ResponseError as e:
+        if "BUSYKEY" in str(e):
+            # Already moved by another request
+            return False
+        raise
+    return result != "NOKEY"
+
+
+def get_session_redis(session_id: str) -> Redis:
+    """
+    Returns the client of the redis node storing a session. While nodes are being rebalanced
+    (`redis_previous_nodes` setting is set), a session still stored on the node it belonged
+    to before is first moved to its new node.
+
+    :param session_id: The session identifier
+    :return: A connected redis client
+    """
+    nodes = get_redis_nodes()
+    address = get_session_node(session_id, tuple(nodes))
+    redis_app = nodes[address]
+
+    previous_nodes = get_settings().redis_previous_nodes
+    if previous_nodes:
+        previous_address = get_session_node(session_id, tuple(get_node_addresses(previous_nodes)))
+        if previous_address != address and not redis_app.exists(f"{SESSION_PREFIX}{session_id}"):
+            if migrate_session(_get_former_node(previous_address), address, session_id):
+                logger.info(f"Session {session_id} moved from {previous_address} to {address}")
+    return redis_app
+
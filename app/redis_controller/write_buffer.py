@@ -0,0 +1,277 @@
+import time
+import logging
+
+from threading import Condition, Lock, Thread
+from typing import Callable, Optional, TypeVar
+
+from redis.exceptions import RedisError
+
+from app.dependencies.settings import get_settings
+from app.models.session import SessionHandler
+from redis import Redis
+
+from .redis_handler import get_redis_nodes
+from .session_history import queue_session_write
+from .sharding import get_session_redis, get_session_node
+from .session_index import SESSION_PREFIX
+from .session_cache import get_recent_sessions
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class _PendingSession:
+    """
+    A session modified in memory and not yet written to redis
+
+    - *handler*: The up-to-date session
+    - *lock*: Held while the session is read or modified
+    - *version*: Incremented on each modification
+    - *flush_at*: When the session must be written (None if it has no unwritten modification)
+    - *evicted*: Set once the session is written and dropped from the buffer. Modifications
+        must then go through a new entry
+    """
+    __slots__ = ("handler", "lock", "version", "flush_at", "evicted")
+
+    def __init__(self, handler: SessionHandler) -> None:
+        self.handler = handler
+        self.lock = Lock()
+        self.version = 0
+        self.flush_at: Optional[float] = None
+        self.evicted = False
+
+
+class SessionWriteBuffer:
+    """
+    Write-behind buffer for sessions (see `write_coalescing_window` setting).
+
+    The first modification of a session loads it from redis and keeps it in memory.
+    Modifications arriving in the following `window` seconds are applied to the same
+    in-memory session, which is then written to redis once, along with the changes to
+    record in its history. Sessions due at the same time are written in a single
+    transaction by a background thread.
+
+    Reads of a buffered session must go through `get` to see the unwritten modifications.
+    The buffer is local to the process: the server must run a single worker, otherwise other
+    workers would read stale sessions and overwrite the buffered modifications (the gunicorn
+    configuration refuses to start several workers with a buffer).
+    """
+    def __init__(self, window: float) -> None:
+        self.window = window
+        self._pending: dict[str, _PendingSession] = {}
+        self._condition = Condition()
+        self._running = True
+        self._thread = Thread(target=self._run, name="session-write-buffer", daemon=True)
+        self._thread.start()
+
+    def __len__(self) -> int:
+        """Number of sessions held in memory"""
+        return len(self._pending)
+
+    def _get_entry(self, session_id: str) -> Optional[_PendingSession]:
+        """
+        Returns the buffered session with the given id, loading it from redis if needed
+
+        :param session_id: The session identifier
+        :return: The buffer entry of the session, or None if the session does not exist
+        """
+        with self._condition:
+            entry = self._pending.get(session_id)
+        if entry is not None:
+            return entry
+
+        document = get_session_redis(session_id).json().get(f"{SESSION_PREFIX}{session_id}")
+        if document is None:
+            return None
+
+        entry = _PendingSession(SessionHandler.from_existing_session(document))
+        with self._condition:
+            # Another request may have loaded the session in the meantime
+            return self._pending.setdefault(session_id, entry)
+
+    def get(self, session_id: str) -> Optional[dict]:
+        """
+        Returns the buffered version of a session, if any
+
+        :param session_id: The session identifier
+        :return: The JSON representation of the session, or None if the session is not buffered
+            (its redis version is then up-to-date)
+        """
+        with self._condition:
+            entry = self._pending.get(session_id)
+        if entry is None:
+            return None
+        with entry.lock:
+            return entry.handler.to_dict()
+
+    def update(self, session_id: str, apply: Callable[[SessionHandler], T]) -> Optional[tuple[T, dict]]:
+        """
+        Modifies a session. The modification is written to redis at the end of the window
+        started by the first unwritten modification of the session.
+
+        :param session_id: The session identifier
+        :param apply: Function modifying the session handler. If it raises, the session is
+            considered unmodified
+        :return: A tuple with the value returned by `apply` and the JSON representation of the
+            modified session, or None if the session does not exist
+        """
+        while True:
+            entry = self._get_entry(session_id)
+            if entry is None:
+                return None
+
+            with entry.lock:
+                if entry.evicted:
+                    continue
+                try:
+                    result = apply(entry.handler)
+                except Exception:
+                    if entry.flush_at is None:
+                        # Do not keep sessions loaded for a refused modification
+                        self._evict(session_id, entry)
+                    raise
+                entry.handler.updated_at = time.time()
+                if entry.handler.created_at is None:
+                    entry.handler.created_at = entry.handler.updated_at
+                entry.version += 1
+                document = entry.handler.to_dict()
+
+                if entry.flush_at is None:
+                    with self._condition:
+                        entry.flush_at = time.monotonic() + self.window
+                        self._condition.notify()
+            return result, document
+
+    def _run(self) -> None:
+        """Background thread writing sessions once their window is over"""
+        while True:
+            with self._condition:
+                while self._running:
+                    now = time.monotonic()
+                    deadlines = [e.flush_at for e in self._pending.values() if e.flush_at is not None]
+                    if deadlines and min(deadlines) <= now:
+                        break
+                    self._condition.wait(min(deadlines) - now if deadlines else None)
+                if not self._running:
+                    return
+                due = {
+                    session_id: entry for session_id, entry in self._pending.items()
+                    if entry.flush_at is not None and entry.flush_at <= time.monotonic()
+                }
+            self._flush(due)
+
+    def _flush(self, entries: dict[str, _PendingSession]) -> None:
+        """
+        Writes sessions to redis, with one transaction per redis node storing them
+
+        :param entries: Mapping of session ids to their buffer entry
+        :return: None
+        """
+        if not entries:
+            return
+
+        try:
+            nodes = get_redis_nodes()
+        except RedisError as e:
+            logger.warning(f"Buffered sessions could not be written, retrying: {str(e)}")
+            for entry in entries.values():
+                with entry.lock:
+                    entry.flush_at = time.monotonic() + self.window
+            return
+
+        groups = {}
+        for session_id, entry in entries.items():
+            groups.setdefault(get_session_node(session_id, tuple(nodes)), {})[session_id] = entry
+        for address, group in groups.items():
+            self._flush_node(nodes[address], group)
+
+    def _flush_node(self, redis_app: Redis, entries: dict[str, _PendingSession]) -> None:
+        """
+        Writes sessions stored on the same redis node in one transaction. Sessions not modified
+        during the write are dropped from the buffer, the others stay buffered until their next
+        window ends. A failed write is retried at the end of the next window.
+
+        :param redis_app: The client of the node storing the sessions
+        :param entries: Mapping of session ids to their buffer entry
+        :return: None
+        """
+        written = {}
+        events = {}
+        documents = []
+        pipeline = redis_app.pipeline(transaction=True)
+        for session_id, entry in entries.items():
+            with entry.lock:
+                events[session_id] = entry.handler.history_events
+                entry.handler.history_events = []
+                documents.append(entry.handler.to_dict())
+                queue_session_write(pipeline, documents[-1], events[session_id])
+                written[session_id] = entry.version
+                entry.flush_at = None
+
+        try:
+            pipeline.execute()
+        except RedisError as e:
+            logger.warning(f"Buffered sessions could not be written, retrying: {str(e)}")
+            for session_id, entry in entries.items():
+                with entry.lock:
+                    entry.handler.history_events[:0] = events[session_id]
+                    if entry.flush_at is None:
+                        entry.flush_at = time.monotonic() + self.window
+            return
+
+        recent_sessions = get_recent_sessions()
+        for document in documents:
+            recent_sessions.put(document)
+        for session_id, entry in entries.items():
+            with entry.lock:
+                if entry.version == written[session_id]:
+                    self._evict(session_id, entry)
+
+    def _evict(self, session_id: str, entry: _PendingSession) -> None:
+        """Drops a session from the buffer. The caller must hold the entry lock"""
+        with self._condition:
+            entry.evicted = True
+            if self._pending.get(session_id) is entry:
+                del self._pending[session_id]
+
+    def close(self) -> None:
+        """Stops the background thread and writes all the buffered sessions"""
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self._thread.join()
+        with self._condition:
+            entries = dict(self._pending)
+        self._flush(entries)
+
+
+_write_buffer: Optional[SessionWriteBuffer] = None
+_write_buffer_lock = Lock()
+
+
+def get_write_buffer() -> Optional[SessionWriteBuffer]:
+    """
+    Returns the session write buffer, created on first use
+
+    :return: The write buffer, or None if write coalescing is disabled
+    """
+    global _write_buffer
+    config = get_settings()
+    if config.write_coalescing_window <= 0:
+        return None
+
+    if _write_buffer is None:
+        with _write_buffer_lock:
+            if _write_buffer is None:
+                _write_buffer = SessionWriteBuffer(config.write_coalescing_window)
+    return _write_buffer
+
+
+def close_write_buffer() -> None:
+    """Writes the buffered sessions to redis and stops the write buffer, if any"""
+    global _write_buffer
+    with _write_buffer_lock:
+        if _write_buffer is not None:
+            _write_buffer.close()
+            _write_buffer = None
@@ -0,0 +1,10 @@
+from .renderers import render_report, REPORT_MEDIA_TYPES
+from .render_pool import get_render_pool, close_render_pool, report_version
+
+__all__ = [
+    render_report,
+    REPORT_MEDIA_TYPES,
+    get_render_pool,
+    close_render_pool,
+    report_version,
+]
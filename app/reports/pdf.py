@@ -0,0 +1,108 @@
+import textwrap
+
+from typing import Optional
+
+PAGE_WIDTH = 595  # A4, in points
+PAGE_HEIGHT = 842
+MARGIN = 50
+
+# Standard PDF fonts, available in every reader without being embedded
+FONTS = {"regular": "F1", "bold": "F2"}
+_FONT_NAMES = {"F1": "Helvetica", "F2": "Helvetica-Bold"}
+
+
+def _escape(text: str) -> bytes:
+    """Encodes a string as the content of a PDF literal string"""
+    text = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    return text.encode("cp1252", errors="replace")
+
+
+class PdfDocument:
+    """
+    Minimal writer of text-only PDF documents, laid out line by line on A4 pages,
+    with the standard Helvetica fonts. Long lines are wrapped on an estimate of the
+    average character width, which is enough for reports made of short paragraphs.
+    """
+    def __init__(self) -> None:
+        self._pages: list[list[bytes]] = []
+        self._y = 0.0
+
+    def _new_page(self) -> None:
+        self._pages.append([])
+        self._y = PAGE_HEIGHT - MARGIN
+
+    def add_text(self, text: str, size: float = 10, bold: bool = False, indent: float = 0,
+                 space_before: float = 0) -> None:
+        """
+        Adds a paragraph, wrapped to the page width
+
+        :param text: The paragraph text
+        :param size: Font size, in points
+        :param bold: Whether the bold font is used
+        :param indent: Left indentation, in points
+        :param space_before: Vertical space added before the paragraph, in points
+        :return: None
+        """
+        font = FONTS["bold" if bold else "regular"]
+        width = int((PAGE_WIDTH - 2 * MARGIN - indent) / (size * 0.52))
+        lines = textwrap.wrap(text, width=width) or [""]
+        leading = size * 1.3
+        if self._pages:
+            self._y -= space_before
+        for line in lines:
+            if not self._pages or self._y - leading < MARGIN:
+                self._new_page()
+            self._y -= leading
+            self._pages[-1].append(
+                b"BT /%s %.1f Tf %.1f %.1f Td (%s) Tj ET" % (
+                    font.encode(), size, MARGIN + indent, self._y, _escape(line)
+                )
+            )
+
+    def render(self, title: Optional[str] = None) -> bytes:
+        """
+        Returns the PDF file
+
+        :param title: The title stored in the document information
+        :return: The content of the PDF file
+        """
+        if not self._pages:
+            self._new_page()
+
+        # Objects: 1 catalog, 2 page tree, 3 information, then the fonts, then a page and its content per page
+        font_ids = {font: 4 + i for i, font in enumerate(_FONT_NAMES)}
+        first_page = 4 + len(font_ids)
+        page_ids = [first_page + 2 * i for i in range(len(self._pages))]
+
+        objects = {
+            1: b"<< /Type /Catalog /Pages 2 0 R >>",
+            2: b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+                b" ".join(b"%d 0 R" % page_id for page_id in page_ids), len(page_ids)
+            ),
+            3: b"<< /Title (%s) /Producer (FAIR Combine) >>" % _escape(title or ""),
+        }
+        for font, object_id in font_ids.items():
+            objects[object_id] = b"<< /Type /Font /Subtype /Type1 /BaseFont /%s /Encoding /WinAnsiEncoding >>" % (
+                _FONT_NAMES[font].encode()
+            )
+        resources = b"<< /Font << %s >> >>" % b" ".join(
+            b"/%s %d 0 R" % (font.encode(), object_id) for font, object_id in font_ids.items()
+        )
+        for page_id, lines in zip(page_ids, self._pages):
+            content = b"\n".join(lines)
+            objects[page_id] = b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Resources %s /Contents %d 0 R >>" % (
+                PAGE_WIDTH, PAGE_HEIGHT, resources, page_id + 1
+            )
+            objects[page_id + 1] = b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content)
+
+        output = bytearray(b"%PDF-1.4\n")
+        offsets = []
+        for object_id in range(1, len(objects) + 1):
+            offsets.append(len(output))
+            output += b"%d 0 obj\n%s\nendobj\n" % (object_id, objects[object_id])
+        xref = len(output)
+        output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+        for offset in offsets:
+            output += b"%010d 00000 n \n" % offset
+        output += b"trailer\n<< /Size %d /Root 1 0 R /Info 3 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+        return bytes(output)
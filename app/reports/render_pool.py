@@ -0,0 +1,116 @@
+import json
+import hashlib
+
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+from threading import Lock
+from typing import Optional
+
+from app.dependencies.settings import get_settings
+from .renderers import render_report
+
+# Incremented when the content of the reports changes, for reports cached by previous versions
+# of the application to be rendered again
+REPORT_LAYOUT_VERSION = 1
+
+_indicators_cache: tuple[int, dict[str, dict], str] = (0, {}, "")
+
+
+def _indicator_documents(indicators: dict) -> tuple[dict[str, dict], str]:
+    """
+    Returns the JSON representation of the indicators, and its digest. Indicators only
+    change on restart: both are computed once per mapping
+
+    :param indicators: Mapping of indicator names to Indicator objects (see `get_fair_indicators`)
+    :return: A tuple with the mapping of indicator names to their JSON representation, and its digest
+    """
+    global _indicators_cache
+    if _indicators_cache[0] != id(indicators):
+        documents = {name: indicator.dict() for name, indicator in indicators.items()}
+        digest = hashlib.sha1(json.dumps(documents, sort_keys=True).encode()).hexdigest()
+        _indicators_cache = (id(indicators), documents, digest)
+    return _indicators_cache[1], _indicators_cache[2]
+
+
+def report_version(session: dict, indicators: dict) -> str:
+    """
+    Returns the version of the report of a session: a digest of everything the report is
+    rendered from, which changes whenever the session (Task statuses, scores, ...) or the
+    indicator descriptions change
+
+    :param session: The JSON representation of the session
+    :param indicators: Mapping of indicator names to Indicator objects (see `get_fair_indicators`)
+    :return: A hexadecimal digest
+    """
+    digest = hashlib.sha1(json.dumps(session, sort_keys=True, separators=(",", ":")).encode())
+    digest.update(f"{_indicator_documents(indicators)[1]}:{REPORT_LAYOUT_VERSION}".encode())
+    return digest.hexdigest()
+
+
+class ReportRenderPool:
+    """
+    Renders reports outside of the request threads, in `report_render_processes` separate
+    processes (in a thread if set to 0), so that large reports do not hold the interpreter
+    of the API worker. Concurrent requests for the same report share a single rendering.
+    """
+    def __init__(self, processes: int) -> None:
+        if processes > 0:
+            # Workers are spawned rather than forked, as the API worker runs threads
+            self._executor: Executor = ProcessPoolExecutor(max_workers=processes, mp_context=get_context("spawn"))
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="report-render")
+        self._rendering: dict[tuple, Future] = {}
+        self._lock = Lock()
+
+    def render(self, report_format: str, version: str, session: dict, indicators: dict) -> Future:
+        """
+        Starts rendering the report of a session, unless it is already being rendered
+
+        :param report_format: The report format (e.g. `pdf`)
+        :param version: The version of the report (see `report_version`)
+        :param session: The JSON representation of the session
+        :param indicators: Mapping of indicator names to Indicator objects (see `get_fair_indicators`)
+        :return: A future resolved with the content of the report file
+        """
+        key = (session["id"], report_format, version)
+        with self._lock:
+            future = self._rendering.get(key)
+            if future is not None:
+                return future
+            documents, _ = _indicator_documents(indicators)
+            future = self._executor.submit(render_report, report_format, session, documents)
+            self._rendering[key] = future
+        # Outside of the lock, as the callback runs immediately if the rendering is already done
+        future.add_done_callback(lambda _: self._done(key))
+        return future
+
+    def _done(self, key: tuple) -> None:
+        with self._lock:
+            self._rendering.pop(key, None)
+
+    def close(self) -> None:
+        """Stops the rendering workers, cancelling the pending renderings"""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+_render_pool: Optional[ReportRenderPool] = None
+_render_pool_lock = Lock()
+
+
+def get_render_pool() -> ReportRenderPool:
+    """Returns the report render pool, created on first use"""
+    global _render_pool
+    if _render_pool is None:
+        with _render_pool_lock:
+            if _render_pool is None:
+                _render_pool = ReportRenderPool(get_settings().report_render_processes)
+    return _render_pool
+
+
+def close_render_pool() -> None:
+    """Stops the report render pool, if any"""
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is not None:
+            _render_pool.close()
+            _render_pool = None
@@ -0,0 +1,247 @@
+import io
+import csv
+import json
+
+from datetime import datetime, timezone
+from typing import Optional
+
+from .pdf import PdfDocument
+
+SCORE_FIELDS = (
+    "score_all_essential",
+    "score_all_nonessential",
+    "score_all",
+    "score_applicable_essential",
+    "score_applicable_nonessential",
+    "score_applicable_all",
+    "ratio_not_applicable",
+)
+
+INDICATOR_COLUMNS = (
+    "indicator", "group", "sub_group", "priority", "status", "disabled", "score", "comment",
+    "question", "short", "description",
+)
+
+REPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "pdf": "application/pdf",
+    "jsonld": "application/ld+json",
+}
+
+JSONLD_CONTEXT = {
+    "schema": "https://schema.org/",
+    "dqv": "http://www.w3.org/ns/dqv#",
+    "dcterms": "http://purl.org/dc/terms/",
+    "fc": "urn:fair-combine:",
+    "@vocab": "urn:fair-combine:",
+    "xsd": "http://www.w3.org/2001/XMLSchema#",
+    "status": "fc:status",
+    "subjectType": "fc:subjectType",
+    "created": {"@id": "dcterms:created", "@type": "xsd:dateTime"},
+    "modified": {"@id": "dcterms:modified", "@type": "xsd:dateTime"},
+    "scores": "fc:score",
+    "measurements": "dqv:hasQualityMeasurement",
+    "indicator": {"@id": "dqv:isMeasurementOf", "@type": "@id"},
+    "value": "dqv:value",
+    "name": "schema:name",
+    "question": "fc:question",
+    "description": "schema:description",
+    "priority": "fc:priority",
+    "group": "fc:group",
+    "subGroup": "fc:subGroup",
+    "comment": "schema:comment",
+    "disabled": "fc:automaticallySet",
+}
+
+
+def build_report_data(session: dict, indicators: dict[str, dict]) -> dict:
+    """
+    Gathers the content of a session report: the session scores, and the result of
+    each indicator along with its description
+
+    :param session: The JSON representation of the session
+    :param indicators: Mapping of indicator names to the JSON representation of the Indicators
+    :return: The report content, made of plain types only
+    """
+    tasks = {}
+    pending = list(session.get("tasks", {}).values())
+    while pending:
+        task = pending.pop()
+        tasks.setdefault(task["name"], task)
+        pending.extend(task.get("children", {}).values())
+
+    ordering = {name: position for position, name in enumerate(indicators)}
+    results = []
+    for name in sorted(tasks, key=lambda name: (ordering.get(name, len(ordering)), name)):
+        task = tasks[name]
+        indicator = indicators.get(name, {})
+        results.append({
+            "indicator": name,
+            "group": indicator.get("group"),
+            "sub_group": indicator.get("sub_group"),
+            "priority": task.get("priority"),
+            "status": task.get("status"),
+            "disabled": bool(task.get("disabled")),
+            "score": task.get("score"),
+            "comment": task.get("comment") or "",
+            "question": indicator.get("question", ""),
+            "short": indicator.get("short", ""),
+            "description": indicator.get("description", ""),
+        })
+
+    return {
+        "id": session["id"],
+        "status": session.get("status"),
+        "subject_type": (session.get("session_subject") or {}).get("subject_type"),
+        "created_at": session.get("created_at"),
+        "updated_at": session.get("updated_at"),
+        "scores": {field: session.get(field) for field in SCORE_FIELDS},
+        "principle_scores": session.get("principle_scores") or {},
+        "subgroup_scores": session.get("subgroup_scores") or {},
+        "indicators": results,
+    }
+
+
+def _isoformat(timestamp: Optional[float]) -> Optional[str]:
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat()
+
+
+def _format_score(score: Optional[float]) -> str:
+    return "-" if score is None else f"{score:.2%}"
+
+
+def render_csv(report: dict) -> bytes:
+    """
+    Renders a report as CSV: a table of the session scores (including the scores of
+    each FAIR principle and subgroup), then, after an empty line, a table of the indicators
+
+    :param report: The report content (see `build_report_data`)
+    :return: The CSV file, encoded in UTF-8
+    """
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(["score", "value"])
+    for field, value in report["scores"].items():
+        writer.writerow([field, "" if value is None else value])
+    for kind in ("principle_scores", "subgroup_scores"):
+        for group, scores in report[kind].items():
+            writer.writerow([f"{group}_score", "" if scores.get("score") is None else scores["score"]])
+    writer.writerow([])
+
+    writer.writerow(INDICATOR_COLUMNS)
+    for result in report["indicators"]:
+        writer.writerow(["" if result[column] is None else result[column] for column in INDICATOR_COLUMNS])
+    return output.getvalue().encode()
+
+
+def render_jsonld(report: dict) -> bytes:
+    """
+    Renders a report as JSON-LD, each indicator result being a quality measurement of the
+    W3C Data Quality Vocabulary
+
+    :param report: The report content (see `build_report_data`)
+    :return: The JSON-LD document, encoded in UTF-8
+    """
+    document = {
+        "@context": JSONLD_CONTEXT,
+        "@id": f"urn:uuid:{report['id']}",
+        "@type": "schema:Report",
+        "status": report["status"],
+        "subjectType": report["subject_type"],
+        "created": _isoformat(report["created_at"]),
+        "modified": _isoformat(report["updated_at"]),
+        "scores": {
+            **report["scores"],
+            "principles": report["principle_scores"],
+            "subgroups": report["subgroup_scores"],
+        },
+        "measurements": [
+            {
+                "@type": "dqv:QualityMeasurement",
+                "indicator": {
+                    "@id": f"fc:{result['indicator']}",
+                    "name": result["indicator"],
+                    "question": result["question"],
+                    "description": result["description"],
+                    "priority": result["priority"],
+                    "group": result["group"],
+                    "subGroup": result["sub_group"],
+                },
+                "status": result["status"],
+                "value": result["score"],
+                "disabled": result["disabled"],
+                "comment": result["comment"] or None,
+            }
+            for result in report["indicators"]
+        ],
+    }
+    return json.dumps(document, ensure_ascii=False).encode()
+
+
+def render_pdf(report: dict) -> bytes:
+    """
+    Renders a report as a PDF document
+
+    :param report: The report content (see `build_report_data`)
+    :return: The PDF file
+    """
+    title = f"FAIR Combine assessment report - {report['id']}"
+    document = PdfDocument()
+    document.add_text("FAIR Combine assessment report", size=18, bold=True)
+    document.add_text(f"Session {report['id']}", size=10, space_before=4)
+    document.add_text(f"Subject: {report['subject_type']}    Status: {report['status']}", size=10)
+    document.add_text(
+        f"Created: {_isoformat(report['created_at']) or '-'}    Updated: {_isoformat(report['updated_at']) or '-'}",
+        size=10,
+    )
+
+    document.add_text("Scores", size=14, bold=True, space_before=12)
+    for field, value in report["scores"].items():
+        document.add_text(f"{field.replace('_', ' ').capitalize()}: {_format_score(value)}", indent=10)
+    document.add_text(
+        "FAIR principles: " + ", ".join(
+            f"{group} {_format_score(scores.get('score'))}" for group, scores in report["principle_scores"].items()
+        ),
+        indent=10, space_before=4,
+    )
+    document.add_text(
+        "Subgroups: " + ", ".join(
+            f"{group} {_format_score(scores.get('score'))}" for group, scores in report["subgroup_scores"].items()
+        ),
+        indent=10,
+    )
+
+    document.add_text("Indicators", size=14, bold=True, space_before=12)
+    for result in report["indicators"]:
+        status = result["status"] + (" (set automatically)" if result["disabled"] else "")
+        document.add_text(f"{result['indicator']}: {status}", bold=True, space_before=8)
+        document.add_text(f"Priority: {result['priority']}", size=9, indent=10)
+        if result["question"]:
+            document.add_text(result["question"], size=9, indent=10)
+        if result["description"]:
+            document.add_text(result["description"], size=8, indent=10)
+        if result["comment"]:
+            document.add_text(f"Comment: {result['comment']}", size=9, indent=10)
+    return document.render(title)
+
+
+RENDERERS = {
+    "csv": render_csv,
+    "pdf": render_pdf,
+    "jsonld": render_jsonld,
+}
+
+
+def render_report(report_format: str, session: dict, indicators: dict[str, dict]) -> bytes:
+    """
+    Renders the report of a session. Only plain types are taken and returned, so that
+    reports can be rendered in another process
+
+    :param report_format: One of `REPORT_MEDIA_TYPES`
+    :param session: The JSON representation of the session
+    :param indicators: Mapping of indicator names to the JSON representation of the Indicators
+    :return: The content of the report file
+    """
+    return RENDERERS[report_format](build_report_data(session, indicators))
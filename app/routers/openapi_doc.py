@@ -0,0 +1,215 @@
+"""
+OpenAPI schema and documentation pages generated at build time (see `prebuilt_openapi_doc` setting).
+
+FastAPI generates the OpenAPI schema on the first request for it in each worker, by going
+through every route and pydantic model. Instead, the schema and the ReDoc page are generated
+once, stored in `app/openapi_doc` along with their gzip-compressed versions, and served as is:
+
+    python -m app.routers.openapi_doc          # Generate the files
+    python -m app.routers.openapi_doc --check  # Fail if the files differ from the routes of the application
+"""
+import sys
+import gzip
+import json
+import hashlib
+import logging
+import argparse
+
+from pathlib import Path
+from typing import Optional
+
+from fastapi import APIRouter, FastAPI, Request
+from fastapi.openapi.docs import get_redoc_html, get_swagger_ui_html
+from fastapi.responses import Response
+from fastapi.routing import APIRoute
+
+logger = logging.getLogger(__name__)
+
+OPENAPI_DOC_DIR = Path(__file__).parent.parent / "openapi_doc"
+SCHEMA_FILE = "openapi.json"
+REDOC_FILE = "doc.html"
+
+# Cache headers of the schema requested with its digest (`/openapi.json?v=...`, as done by the
+# documentation pages), which never changes, and of the other responses, revalidated on each use
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+
+def encode_schema(schema: dict) -> bytes:
+    """Serializes the OpenAPI schema as FastAPI does"""
+    return json.dumps(schema, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def schema_digest(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()[:16]
+
+
+def render_redoc_page(app: FastAPI, digest: str) -> bytes:
+    """Returns the ReDoc page of the application, loading the schema with the given digest"""
+    return get_redoc_html(openapi_url=f"/{SCHEMA_FILE}?v={digest}", title=f"{app.title} - ReDoc").body
+
+
+def schema_operations(schema: dict) -> set[tuple[str, str]]:
+    """Returns the (path, method) of the operations of an OpenAPI schema"""
+    return {(path, method.upper()) for path, operations in schema.get("paths", {}).items() for method in operations}
+
+
+def route_operations(app: FastAPI) -> set[tuple[str, str]]:
+    """Returns the (path, method) of the routes of an application documented in its OpenAPI schema"""
+    return {
+        (route.path_format, method)
+        for route in app.routes
+        if isinstance(route, APIRoute) and route.include_in_schema
+        for method in route.methods
+    }
+
+
+class PrebuiltFile:
+    """
+    A file served as is, with its gzip-compressed version (`<name>.gz`) to clients accepting
+    it, and its digest as ETag
+    """
+    def __init__(self, content: bytes, media_type: str, compressed: Optional[bytes] = None) -> None:
+        self.content = content
+        self.compressed = compressed if compressed is not None else gzip.compress(content, 9, mtime=0)
+        self.media_type = media_type
+        self.digest = schema_digest(content)
+        self.etag = f'"{self.digest}"'
+
+    @classmethod
+    def load(cls, path: Path, media_type: str) -> "PrebuiltFile":
+        compressed_path = path.with_name(f"{path.name}.gz")
+        compressed = compressed_path.read_bytes() if compressed_path.exists() else None
+        return cls(path.read_bytes(), media_type, compressed)
+
+    def response(self, request: Request, cache_control: str) -> Response:
+        """
+        Returns the file, compressed if the client accepts it, or an empty 304 response if the
+        client already has it (`If-None-Match` header)
+
+        :param request: The request
+        :param cache_control: The Cache-Control header of the response
+        :return: The response
+        """
+        headers = {"ETag": self.etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+        if self.etag in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=headers)
+        if "gzip" in request.headers.get("accept-encoding", ""):
+            headers["Content-Encoding"] = "gzip"
+            return Response(self.compressed, media_type=self.media_type, headers=headers)
+        return Response(self.content, media_type=self.media_type, headers=headers)
+
+
+class PrebuiltOpenAPIDoc:
+    """
+    The OpenAPI schema and ReDoc page of an application, read from `directory`. If the schema
+    does not document the same routes as the application (e.g. a route was added without
+    generating the files again), they are generated from the application on first use instead.
+    """
+    def __init__(self, app: FastAPI, directory: Path = OPENAPI_DOC_DIR) -> None:
+        self.app = app
+        self.directory = directory
+        self._schema: Optional[PrebuiltFile] = None
+        self._redoc: Optional[PrebuiltFile] = None
+
+    def _load(self) -> None:
+        try:
+            schema = PrebuiltFile.load(self.directory / SCHEMA_FILE, "application/json")
+            redoc = PrebuiltFile.load(self.directory / REDOC_FILE, "text/html")
+            consistent = schema_operations(json.loads(schema.content)) == route_operations(self.app)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Prebuilt OpenAPI schema could not be read ({str(e)}), generating it")
+            consistent = False
+        else:
+            if not consistent:
+                logger.warning("Prebuilt OpenAPI schema does not match the application routes, generating it. "
+                               "Run `python -m app.routers.openapi_doc` to update it")
+
+        if not consistent:
+            schema = PrebuiltFile(encode_schema(self.app.openapi()), "application/json")
+            redoc = PrebuiltFile(render_redoc_page(self.app, schema.digest), "text/html")
+        self._schema, self._redoc = schema, redoc
+
+    @property
+    def schema(self) -> PrebuiltFile:
+        if self._schema is None:
+            self._load()
+        return self._schema
+
+    @property
+    def redoc(self) -> PrebuiltFile:
+        if self._redoc is None:
+            self._load()
+        return self._redoc
+
+
+def create_openapi_doc_router(app: FastAPI) -> APIRouter:
+    """
+    Returns the routes serving the prebuilt OpenAPI schema (`/openapi.json`) and documentation
+    pages (`/redoc`, `/docs`) of an application, replacing the ones generated by FastAPI
+    (the application must be created with `openapi_url=None`). Files are read on first use,
+    once all the routes of the application are known.
+
+    :param app: The application
+    :return: The router to include in the application
+    """
+    router = APIRouter(include_in_schema=False)
+    doc = PrebuiltOpenAPIDoc(app)
+
+    @router.get(f"/{SCHEMA_FILE}")
+    def openapi_schema(request: Request, v: Optional[str] = None) -> Response:
+        cache_control = IMMUTABLE_CACHE_CONTROL if v == doc.schema.digest else REVALIDATE_CACHE_CONTROL
+        return doc.schema.response(request, cache_control)
+
+    @router.get("/redoc")
+    def redoc_page(request: Request) -> Response:
+        return doc.redoc.response(request, REVALIDATE_CACHE_CONTROL)
+
+    @router.get("/docs")
+    def swagger_ui_page() -> Response:
+        return get_swagger_ui_html(openapi_url=f"/{SCHEMA_FILE}?v={doc.schema.digest}", title=f"{app.title} - Swagger UI")
+
+    return router
+
+
+def build_openapi_doc(app: FastAPI, directory: Path = OPENAPI_DOC_DIR) -> dict[Path, bytes]:
+    """
+    Generates the OpenAPI schema and ReDoc page of an application, with their compressed versions
+
+    :param app: The application
+    :param directory: The directory the files are written to
+    :return: Mapping of the file paths to their content
+    """
+    schema = encode_schema(app.openapi())
+    redoc = render_redoc_page(app, schema_digest(schema))
+    return {
+        directory / SCHEMA_FILE: schema,
+        directory / f"{SCHEMA_FILE}.gz": gzip.compress(schema, 9, mtime=0),
+        directory / REDOC_FILE: redoc,
+        directory / f"{REDOC_FILE}.gz": gzip.compress(redoc, 9, mtime=0),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--check", action="store_true", help="Only check that the files are up-to-date")
+    args = parser.parse_args()
+
+    from app.main import app
+
+    outdated = []
+    for path, content in build_openapi_doc(app).items():
+        if path.exists() and path.read_bytes() == content:
+            continue
+        outdated.append(path)
+        if not args.check:
+            path.write_bytes(content)
+
+    if args.check and outdated:
+        sys.exit(f"OpenAPI documentation out of date ({', '.join(path.name for path in outdated)}), "
+                 f"run `python -m app.routers.openapi_doc` to generate it")
+    print(f"{len(outdated)} file(s) written" if not args.check else "OpenAPI documentation up to date")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,94 +1,866 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
-from redis.exceptions import ResponseError
+import hmac
+import json
+import math
+import time
+import asyncio
+import hashlib
 
-from app.models.session import Session, SessionSubjectIn, SessionHandler, SubjectType
+from itertools import islice
+from fastapi import APIRouter, Depends, HTTPException, Query, Header, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from typing import Callable, List, Optional
+from redis.exceptions import RedisError
+
+from app.models.session import (
+    Session,
+    SessionSubjectIn,
+    SessionHandler,
+    SubjectType,
+    SessionStatus,
+    TaskSelection,
+    SessionSortField,
+    SessionSearchResult,
+    SessionScores,
+    SessionHistory,
+    SessionComparison,
+    ReportFormat,
+    SCORE_FIELDS,
+    subject_hash,
+)
 from app.models.tasks import Task, TaskStatusIn, Indicator
-from app.metrics.assessments_lifespan import fair_indicators
-from app.redis_controller import redis_app
+from app.models.diagnostics import MemoryReport, AllocationReport
+from app.metrics.assessments_lifespan import get_fair_indicators
+from app.metrics.resources import (
+    ForbiddenResourceError,
+    ResourceTooLargeError,
+    fetch_resource_fingerprint,
+    changed_parts,
+    affected_indicators,
+)
+from app.dependencies.settings import get_settings
+from app.middleware import get_client_key, get_client_ip_key, take_tokens
+from app.redis_controller import get_redis_app, get_redis_nodes
+from app.redis_controller.session_index import build_session_query, search_sessions
+from app.redis_controller.sharding import get_session_redis, get_session_node
+from app.redis_controller.session_history import queue_session_write, get_session_history, get_session_at
+from app.redis_controller.write_buffer import get_write_buffer
+from app.redis_controller.session_cache import get_recent_sessions
+from app.redis_controller.report_cache import get_cached_report, cache_report
+from app.redis_controller.idempotency import (
+    reserve_idempotency_key,
+    complete_idempotency_key,
+    release_idempotency_key,
+)
+from app.redis_controller.session_projection import fetch_session_projections
+from app.redis_controller.memory_usage import sample_session_memory, get_node_memory
+from app.reports import REPORT_MEDIA_TYPES, get_render_pool, report_version
+from app.diagnostics import (
+    BYTES_BUCKETS,
+    TASKS_BUCKETS,
+    TracingInProgressError,
+    distribution,
+    get_process_memory,
+    trace_allocations,
+)
 
 base_router = APIRouter()
 
+# Parts of the sessions read to compare them (see `compare_sessions`). Every object of the Task
+# tree with a name is a Task: both Task paths match the Tasks in the same order
+COMPARISON_PATHS = {
+    "status": "$.status",
+    **{field: f"$.{field}" for field in SCORE_FIELDS},
+    "principle_scores": "$.principle_scores",
+    "task_names": "$.tasks..name",
+    "task_statuses": "$.tasks..status",
+}
+
+
+def get_session_document(session_id: str) -> Optional[dict]:
+    """
+    Loads the JSON representation of a session, including its modifications
+    not yet written to redis (see `write_coalescing_window` setting).
+    If redis is unavailable, the last version of the session read by this process is returned.
+
+    :param session_id: The session identifier
+    :return: The session as a dict, or None if no session has this id
+    """
+    write_buffer = get_write_buffer()
+    if write_buffer is not None:
+        s_json = write_buffer.get(session_id)
+        if s_json is not None:
+            return s_json
+
+    try:
+        s_json = get_session_redis(session_id).json().get(f"session:{session_id}")
+    except RedisError:
+        s_json = get_recent_sessions().get(session_id)
+        if s_json is None:
+            raise
+        return s_json
+    if s_json is not None:
+        get_recent_sessions().put(s_json)
+    return s_json
+
+
+def get_session(session_id: str) -> Session:
+    """
+    Loads a session from redis
+
+    :param session_id: The session identifier
+    :return: The session object corresponding to the given id
+    """
+    s_json = get_session_document(session_id)
+    if s_json is not None:
+        subject = s_json.pop("session_subject")
+        s = Session(**s_json, session_subject=subject)
+        return s
+    else:
+        raise HTTPException(status_code=404, detail="No session with this id was found")
+
+
+def save_session(session: dict, events: list[tuple] = (), snapshot: bool = False) -> None:
+    """
+    Stores a session in redis, updating its timestamps, and records its Task status
+    changes in its history
+
+    :param session: The JSON representation of the session to store (see `SessionHandler.to_dict`)
+    :param events: The Task status changes to record (see `SessionHandler.history_events`)
+    :param snapshot: Whether to start the session history with a snapshot of the session
+    :return: None
+    """
+    session["updated_at"] = time.time()
+    if session.get("created_at") is None:
+        session["created_at"] = session["updated_at"]
+    pipeline = get_session_redis(session["id"]).pipeline(transaction=True)
+    queue_session_write(pipeline, session, events, snapshot)
+    pipeline.execute()
+    get_recent_sessions().put(session)
+
+
+def get_subject_hash(session_id: str) -> Optional[str]:
+    """
+    Returns the digest of the subject of a stored session (see `subject_hash`), without
+    loading the whole session
+
+    :param session_id: The session identifier
+    :return: The digest, or None if no session has this id
+    """
+    write_buffer = get_write_buffer()
+    s_json = write_buffer.get(session_id) if write_buffer is not None else None
+    if s_json is not None:
+        return subject_hash(s_json["session_subject"])
+
+    s_json = get_session_redis(session_id).json().get(f"session:{session_id}", "$.subject_hash", "$.session_subject")
+    if s_json is None:
+        return None
+    # Sessions stored before the digest was recorded only have their subject
+    if s_json["$.subject_hash"]:
+        return s_json["$.subject_hash"][0]
+    return subject_hash(s_json["$.session_subject"][0])
+
+
+def run_idempotent(
+    request: Request,
+    idempotency_key: Optional[str],
+    payload: dict,
+    create: Callable[[], dict],
+) -> JSONResponse:
+    """
+    Runs a request creating a session at most once per `Idempotency-Key` header sent by the
+    client, for `idempotency_key_ttl` seconds. Requests sent again with the same key get the
+    session created by the first one (in its current state), without creating a new one.
+
+    :param request: The request
+    :param idempotency_key: The value of the `Idempotency-Key` header, if any
+    :param payload: The JSON body of the request
+    :param create: Function creating the session and returning its JSON representation
+    :return: A response containing the session
+    """
+    if idempotency_key is None:
+        return JSONResponse(create())
+
+    config = get_settings()
+    redis_app = get_redis_app()
+    key = f"{get_client_key(request)}:{request.url.path}:{idempotency_key}"
+    fingerprint = hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+    previous = reserve_idempotency_key(redis_app, key, fingerprint, config.idempotency_key_lease)
+    if previous is not None:
+        if previous["fingerprint"] != fingerprint:
+            raise HTTPException(422, "This Idempotency-Key was already used with another request")
+        if previous["session_id"] is None:
+            raise HTTPException(409, "A request with this Idempotency-Key is being processed",
+                                headers={"Retry-After": "1"})
+        session = get_session_document(previous["session_id"])
+        if session is None:
+            raise HTTPException(status_code=404, detail="No session with this id was found")
+        session.pop("subject_hash", None)
+        return JSONResponse(session, headers={"Idempotent-Replayed": "true"})
+
+    try:
+        session = create()
+    except Exception:
+        release_idempotency_key(redis_app, key)
+        raise
+    complete_idempotency_key(redis_app, key, fingerprint, session["id"], config.idempotency_key_ttl)
+    return JSONResponse(session)
+
+
+def select_session_fields(
+    session: dict,
+    fields: Optional[str] = None,
+    tasks: TaskSelection = TaskSelection.all,
+    changed_tasks: Optional[dict[str, dict]] = None,
+) -> JSONResponse:
+    """
+    Restricts a session to the fields and Tasks requested by the user.
+    The full session is returned when no selection is made.
+
+    :param session: The JSON representation of the session to return
+    :param fields: Comma-separated list of fields (see `Session.expand_fields`)
+    :param tasks: Which Tasks to include (see TaskSelection model)
+    :param changed_tasks: The Tasks modified by the request, without their children
+        (when `tasks` is **changed**)
+    :return: A response containing the selected fields
+    """
+    if fields is None and tasks is TaskSelection.all:
+        return JSONResponse(jsonable_encoder(session))
+
+    try:
+        selected = Session.expand_fields(fields.split(",")) if fields is not None else set(Session.__fields__)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if tasks is TaskSelection.changed:
+        # Asking for the changed Tasks implies returning them, whatever the fields selected
+        selected.add("tasks")
+
+    content = {field: value for field, value in session.items() if field in selected and field != "tasks"}
+    if "tasks" in selected and tasks is TaskSelection.all:
+        content["tasks"] = session["tasks"]
+    elif "tasks" in selected and tasks is TaskSelection.changed:
+        content["tasks"] = changed_tasks or {}
+    return JSONResponse(jsonable_encoder(content))
+
 
 @base_router.post('/session', tags=["Sessions"])
-def create_session(subject: SessionSubjectIn) -> Session:
+def create_session(
+    subject: SessionSubjectIn,
+    request: Request,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+) -> Session:
     """
     Create a new session based on user input
 
     **Parameters:**
 
     - *subject*: Pydantic model containing user input.
+    - *Idempotency-Key* header: A unique value (e.g. a UUID) identifying the request. When the
+        request is sent again with the same key, the session created by the first request is
+        returned instead of creating a new one
 
     **Returns:**
     The created session
     \f
     :param subject: Pydantic model containing user input.
+    :param request: The request
+    :param idempotency_key: The value identifying the request, if any
     :return: The created session
     """
     if subject.subject_type is not SubjectType.manual:
         raise HTTPException(501, "The api only supports manual assessments at the moment")
-    session_handler = SessionHandler.from_user_input(subject)
 
-    redis_app.json().set(f"session:{session_handler.session_model.id}", "$", obj=session_handler.session_model.dict())
+    def create() -> dict:
+        session = SessionHandler.from_user_input(subject).to_dict()
+        save_session(session, snapshot=True)
+        return session
+
+    return run_idempotent(request, idempotency_key, jsonable_encoder(subject), create)
 
-    return session_handler.session_model
+
+def limit_bulk_sessions(request: Request, count: int) -> None:
+    """
+    Charges the sessions created by a bulk request to the bulk token buckets of the client
+    (by IP address, and by API key if issued), on top of the request itself, which the
+    admission control already charged.
+
+    :param request: The request
+    :param count: Number of sessions created by the request
+    """
+    config = get_settings()
+    if not config.rate_limit_enabled or count == 0:
+        return
+
+    client_keys = dict.fromkeys((get_client_ip_key(request), get_client_key(request)))
+    buckets = [
+        (f"ratelimit:bulk:{client_key}", config.rate_limit_bulk_rate, config.rate_limit_bulk_burst, count)
+        for client_key in client_keys
+    ]
+    try:
+        retry_after = take_tokens(buckets)
+    except RedisError:
+        # Do not refuse requests because the rate limiter is unavailable
+        return
+    if retry_after is not None:
+        raise HTTPException(429, "Too many sessions created, please slow down",
+                            headers={"Retry-After": str(math.ceil(retry_after))})
+
+
+@base_router.post("/sessions/bulk", tags=["Sessions"])
+def create_sessions(request: Request, subjects: List[SessionSubjectIn]) -> StreamingResponse:
+    """
+    Create many sessions at once (e.g. to assess all the models of a repository)
+
+    **Parameters:**
+
+    - *subjects*: List of user inputs, one per session to create
+
+    **Returns:**
+    The identifiers of the created sessions, as newline-delimited JSON objects
+    (`{"index": 0, "id": "..."}`, `index` being the position of the subject in the request).
+    Identifiers are sent as soon as their sessions are stored. If storing sessions fails,
+    the last line is an error (`{"index": 100, "error": "..."}`) and the sessions from
+    this index are not created.
+
+    Each created session counts against the rate limit of the client: a 429 status is
+    returned, with a `Retry-After` header, when too many sessions were created lately.
+    \f
+    :param request: The request
+    :param subjects: List of user inputs
+    :return: A streaming response with the created session ids
+    """
+    config = get_settings()
+    if len(subjects) > config.bulk_sessions_max_count:
+        raise HTTPException(422, f"At most {config.bulk_sessions_max_count} sessions can be created at once")
+    if any(subject.subject_type is not SubjectType.manual for subject in subjects):
+        raise HTTPException(501, "The api only supports manual assessments at the moment")
+    limit_bulk_sessions(request, len(subjects))
+    nodes = get_redis_nodes()
+
+    def store_sessions():
+        handlers = SessionHandler.from_user_inputs(subjects)
+        index = 0
+        while True:
+            chunk = list(islice(handlers, config.bulk_sessions_chunk_size))
+            if not chunk:
+                return
+
+            # One pipeline per redis node storing sessions of the chunk
+            pipelines = {}
+            now = time.time()
+            for handler in chunk:
+                address = get_session_node(handler.id, tuple(nodes))
+                if address not in pipelines:
+                    pipelines[address] = nodes[address].pipeline(transaction=False)
+                handler.created_at = handler.updated_at = now
+                queue_session_write(pipelines[address], handler.to_dict(), snapshot=True)
+            try:
+                for pipeline in pipelines.values():
+                    pipeline.execute()
+            except RedisError as e:
+                yield json.dumps({"index": index, "error": f"Sessions could not be stored: {str(e)}"}) + "\n"
+                return
+
+            yield "".join(
+                json.dumps({"index": index + i, "id": handler.id}) + "\n" for i, handler in enumerate(chunk)
+            )
+            index += len(chunk)
+
+    return StreamingResponse(store_sessions(), media_type="application/x-ndjson")
 
 
 @base_router.post("/session/resume", tags=["Sessions"])
-def load_session(session: Session) -> Session:
+def load_session(
+    session: Session,
+    request: Request,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+) -> Session:
     """
     Load a session based on JSON previously downloaded by user
 
     **Parameters:**
 
     - *session*: A JSON object representing a Session.
+    - *Idempotency-Key* header: A unique value (e.g. a UUID) identifying the request. When the
+        request is sent again with the same key, the session loaded by the first request is
+        returned
 
     **Returns:**
-    The loaded session
+    The loaded session, with the scores of its FAIR principles and subgroups computed from its
+    tasks. If a session with the same id and subject is already stored, it is returned as
+    stored. If its subject differs, the request is refused (409)
     \f
     :param session: Pydantic model to convert the JSON downloaded by user into
         a working session object
-
+    :param request: The request
+    :param idempotency_key: The value identifying the request, if any
     :return: The loaded session
     """
-    existing_session_json = redis_app.json().get(f"session:{session.id}")
-    if existing_session_json is not None:
-        subject = existing_session_json.pop("session_subject")
-        existing_session = Session(**existing_session_json, session_subject=subject)
-        if existing_session.session_subject == session.session_subject:
-            return existing_session
-        else:
+    content = jsonable_encoder(session)
+
+    def resume() -> dict:
+        # Stored sessions are compared by the digest of their subject, without loading them
+        existing_hash = get_subject_hash(session.id)
+        if existing_hash is None:
+            # TODO: Add checks regarding tasks and session status
+            # Group scores are computed again rather than trusted, as they are only updated incrementally
+            try:
+                handler = SessionHandler.from_existing_session(content)
+                handler.compute_group_scores()
+            except (KeyError, ValueError) as e:
+                raise HTTPException(422, f"Invalid session tasks: {str(e)}")
+            content["principle_scores"] = {group: score.to_dict() for group, score in handler.principle_scores.items()}
+            content["subgroup_scores"] = {group: score.to_dict() for group, score in handler.subgroup_scores.items()}
+            save_session(content, snapshot=True)
+            return content
+        if existing_hash != subject_hash(content["session_subject"]):
             raise HTTPException(409, "Existing session found for user-sent id")
 
-    else:
-        # TODO: Add checks regarding tasks and session status
-        redis_app.json().set(f"session:{session.id}", "$", obj=session.dict())
-        return session
+        existing_session = get_session_document(session.id)
+        existing_session.pop("subject_hash", None)
+        return existing_session
+
+    return run_idempotent(request, idempotency_key, content, resume)
+
+
+@base_router.post("/session/{session_id}/reassess", tags=["Sessions"])
+def reassess_session(
+    session_id: str,
+    request: Request,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+) -> Session:
+    """
+    Create a new session assessing again the resource of an existing url or file session
+    (e.g. after a new release of a model)
+
+    **Parameters:**
+
+    - *session_id*: The identifier of the session to assess again
+    - *Idempotency-Key* header: A unique value (e.g. a UUID) identifying the request. When the
+        request is sent again with the same key, the session created by the first request is
+        returned instead of creating a new one
+
+    **Returns:**
+    The new session. The resource is only downloaded if it may have changed since it was last
+    fetched (`ETag` and `Last-Modified` validators of urls, size and modification time of files).
+    The results of the indicators not affected by the changes are copied from the existing session:
+    all of them if the resource is unchanged. If the resource is an archive, only the indicators
+    assessing the changed parts (archive, models, and their metadata) are assessed again
+    (see *reassessed_indicators*). Urls of non-public hosts and files outside of the directory of
+    assessed files are refused (403)
+    \f
+    :param session_id: The identifier of the session to assess again
+    :param request: The request
+    :param idempotency_key: The value identifying the request, if any
+    :return: The new session
+    """
+    def reassess() -> dict:
+        session = get_session_document(session_id)
+        if session is None:
+            raise HTTPException(status_code=404, detail="No session with this id was found")
+        handler = SessionHandler.from_existing_session(session)
+        if handler.user_input.subject_type is SubjectType.manual:
+            raise HTTPException(422, "Only url and file assessments can be assessed again")
+
+        config = get_settings()
+        try:
+            resource, changed = fetch_resource_fingerprint(
+                str(handler.user_input.path),
+                handler.resource,
+                config.reassessment_fetch_timeout,
+                config.reassessment_max_resource_size,
+                config.reassessment_files_root,
+            )
+        except ForbiddenResourceError as e:
+            raise HTTPException(403, f"The resource cannot be fetched: {str(e)}")
+        except (OSError, ResourceTooLargeError) as e:
+            raise HTTPException(502, f"The resource could not be fetched: {str(e)}")
+
+        parts = changed_parts(handler.resource, resource) if changed else set()
+        indicators = affected_indicators(handler.indicator_tasks, parts) if parts is not None else None
+        new_session = handler.reassess(resource, indicators).to_dict()
+        save_session(new_session, snapshot=True)
+        return new_session
+
+    return run_idempotent(request, idempotency_key, {"session_id": session_id}, reassess)
+
+
+def summarize_projection(projection: dict[str, list]) -> dict:
+    """
+    Returns the parts of a session compared by `compare_sessions`, from their JSONPath
+    matches (see `COMPARISON_PATHS`)
+
+    :param projection: Mapping of the names of `COMPARISON_PATHS` to their matches in the session
+    :return: The session `status`, `scores`, `principle_scores` and Task status of each indicator (`indicators`)
+    """
+    principle_scores = projection["principle_scores"][0] if projection["principle_scores"] else {}
+    return {
+        "status": projection["status"][0],
+        "scores": {field: projection[field][0] if projection[field] else None for field in SCORE_FIELDS},
+        "principle_scores": {group: score.get("score") for group, score in principle_scores.items()},
+        "indicators": dict(zip(projection["task_names"], projection["task_statuses"])),
+    }
+
+
+def summarize_session(session: dict) -> dict:
+    """
+    Returns the parts of a session compared by `compare_sessions`, from its JSON representation
+
+    :param session: The JSON representation of the session
+    :return: The session `status`, `scores`, `principle_scores` and Task status of each indicator (`indicators`)
+    """
+    indicators = {}
+    pending = [session.get("tasks") or {}]
+    while pending:
+        for task in pending.pop().values():
+            indicators[task["name"]] = task["status"]
+            pending.append(task.get("children") or {})
+    return {
+        "status": session["status"],
+        "scores": {field: session.get(field) for field in SCORE_FIELDS},
+        "principle_scores": {group: score.get("score") for group, score in (session.get("principle_scores") or {}).items()},
+        "indicators": indicators,
+    }
+
+
+def score_deltas(values: list[Optional[float]]) -> list[Optional[float]]:
+    """Returns the differences between scores and the first one (None if either is unknown)"""
+    return [value - values[0] if value is not None and values[0] is not None else None for value in values]
+
+
+@base_router.post("/sessions/compare", tags=["Sessions"])
+def compare_sessions(session_ids: List[str], changed_only: bool = False) -> SessionComparison:
+    """
+    Compares the scores and Task statuses of several sessions (e.g. the assessments of several
+    releases of a model)
+
+    **Parameters:**
+
+    - *session_ids*: List of the identifiers of the sessions to compare. The first session is
+        the baseline the others are compared to
+    - *changed_only*: Whether to only return the indicators whose status is not the same in
+        all sessions
+
+    **Returns:**
+    The status of the Task of each indicator in each session, the scores of the sessions and
+    their differences with the baseline scores. Only these parts of the sessions are read
+    \f
+    :param session_ids: List of session identifiers
+    :param changed_only: Whether to only return the indicators whose status differs between sessions
+    :return: The comparison of the sessions
+    """
+    config = get_settings()
+    if not session_ids:
+        raise HTTPException(422, "At least one session id is needed")
+    if len(session_ids) > config.compare_sessions_max_count:
+        raise HTTPException(422, f"At most {config.compare_sessions_max_count} sessions can be compared at once")
+
+    summaries = {}
+    write_buffer = get_write_buffer()
+    if write_buffer is not None:
+        for session_id in session_ids:
+            s_json = write_buffer.get(session_id)
+            if s_json is not None:
+                summaries[session_id] = summarize_session(s_json)
+
+    try:
+        projections = fetch_session_projections(
+            get_redis_nodes(),
+            [session_id for session_id in session_ids if session_id not in summaries],
+            COMPARISON_PATHS,
+        )
+        for session_id, projection in projections.items():
+            summaries[session_id] = summarize_projection(projection)
+    except RedisError:
+        # Sessions are then read one by one, from the local cache if redis is unavailable
+        pass
+
+    for session_id in session_ids:
+        if session_id not in summaries:
+            # Sessions not found on their node may not have been moved yet (see `get_session_redis`)
+            s_json = get_session_document(session_id)
+            if s_json is not None:
+                summaries[session_id] = summarize_session(s_json)
+
+    missing = [session_id for session_id in session_ids if session_id not in summaries]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"No session was found with these ids: {', '.join(missing)}")
+
+    compared = [summaries[session_id] for session_id in session_ids]
+    scores = {field: [summary["scores"][field] for summary in compared] for field in SCORE_FIELDS}
+    groups = sorted({group for summary in compared for group in summary["principle_scores"]})
+    principle_scores = {group: [summary["principle_scores"].get(group) for summary in compared] for group in groups}
+    names = sorted({name for summary in compared for name in summary["indicators"]})
+    indicators = {name: [summary["indicators"].get(name) for summary in compared] for name in names}
+    changed_indicators = [name for name, statuses in indicators.items() if len(set(statuses)) > 1]
+    if changed_only:
+        indicators = {name: indicators[name] for name in changed_indicators}
+
+    return JSONResponse({
+        "session_ids": session_ids,
+        "status": [summary["status"] for summary in compared],
+        "scores": scores,
+        "score_deltas": {field: score_deltas(values) for field, values in scores.items()},
+        "principle_scores": principle_scores,
+        "principle_score_deltas": {group: score_deltas(values) for group, values in principle_scores.items()},
+        "indicators": indicators,
+        "changed_indicators": changed_indicators,
+    })
+
+
+@base_router.get("/sessions", tags=["Sessions"])
+def list_sessions(
+    status: Optional[SessionStatus] = None,
+    subject_type: Optional[SubjectType] = None,
+    has_archive: Optional[bool] = None,
+    has_model: Optional[bool] = None,
+    has_archive_metadata: Optional[bool] = None,
+    is_biomodel: Optional[bool] = None,
+    is_pmr: Optional[bool] = None,
+    min_score_all: Optional[float] = None,
+    max_score_all: Optional[float] = None,
+    created_after: Optional[float] = None,
+    created_before: Optional[float] = None,
+    updated_after: Optional[float] = None,
+    updated_before: Optional[float] = None,
+    sort_by: SessionSortField = SessionSortField.created_at,
+    ascending: bool = False,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+) -> SessionSearchResult:
+    """
+    Searches the existing sessions. Sessions are filtered and sorted using a
+    search index, so that the whole database does not need to be read.
+
+    **Parameters:**
+
+    - *status*: Only return sessions with this status
+    - *subject_type*, *has_archive*, *has_model*, *has_archive_metadata*, *is_biomodel*, *is_pmr*:
+        Only return sessions whose subject has these attributes (see SessionSubjectIn model)
+    - *min_score_all*, *max_score_all*: Bounds of the sessions `score_all`
+    - *created_after*, *created_before*, *updated_after*, *updated_before*: Bounds of the sessions timestamps
+    - *sort_by*: The attribute used to sort sessions (most recent first by default)
+    - *ascending*: Sort sessions in ascending order
+    - *limit*: Maximum number of sessions returned
+    - *cursor*: The `next_cursor` returned with the previous page (with the same *sort_by* and
+        *ascending* parameters). The next page starts after the last session of the previous one,
+        so that sessions modified in the meantime do not shift the following pages
+
+    **Returns:**
+    A page of session summaries
+    \f
+    :return: The total number of matching sessions, the sessions of the page and the cursor of the next page
+    """
+    def as_tag(value):
+        if isinstance(value, bool):
+            return str(value).lower()
+        return value.value if value is not None else None
+
+    query = build_session_query(
+        tags={
+            "status": as_tag(status),
+            "subject_type": as_tag(subject_type),
+            "has_archive": as_tag(has_archive),
+            "has_model": as_tag(has_model),
+            "has_archive_metadata": as_tag(has_archive_metadata),
+            "is_biomodel": as_tag(is_biomodel),
+            "is_pmr": as_tag(is_pmr),
+        },
+        ranges={
+            "score_all": (min_score_all, max_score_all),
+            "created_at": (created_after, created_before),
+            "updated_at": (updated_after, updated_before),
+        },
+    )
+    try:
+        total, sessions, next_cursor = search_sessions(
+            list(get_redis_nodes().values()), query, sort_by.value, ascending, limit, cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    return SessionSearchResult(total=total, sessions=sessions, next_cursor=next_cursor)
 
 
 @base_router.get("/session/{session_id}", tags=["Sessions"])
-def session_details(session_id: str) -> Session:
+def session_details(session_id: str, fields: Optional[str] = None) -> Session:
     """
     Returns the details about an existing session
 
     **Parameters:**
 
     - *session_id*: A session identifier
+    - *fields*: Comma-separated list of the session fields to return (e.g. `scores,status`).
+        `scores` stands for all score fields. All fields are returned if not set.
 
     **Returns:**
     The session object corresponding to the given id
     \f
     :param session_id: The session identifier
+    :param fields: Comma-separated list of the session fields to return
     :return: The session object corresponding to the given id
     """
-    s_json = redis_app.json().get(f"session:{session_id}")
+    session = get_session(session_id)
+    if fields is None:
+        return session
+    return select_session_fields(session.dict(), fields)
+
+
+@base_router.get("/session/{session_id}/scores", tags=["Sessions"])
+def session_scores(session_id: str) -> SessionScores:
+    """
+    Returns the scores of an existing session, including the scores of each FAIR
+    principle and subgroup. Lighter than getting the whole session, as Tasks are not returned.
+
+    **Parameters:**
+
+    - *session_id*: A session identifier
+
+    **Returns:**
+    The scores of the session corresponding to the given id
+    \f
+    :param session_id: The session identifier
+    :return: The scores of the session corresponding to the given id
+    """
+    write_buffer = get_write_buffer()
+    s_json = write_buffer.get(session_id) if write_buffer is not None else None
     if s_json is not None:
-        subject = s_json.pop("session_subject")
-        s = Session(**s_json, session_subject=subject)
-        return s
-    else:
+        return SessionScores(**s_json)
+
+    paths = [f"$.{field}" for field in SessionScores.__fields__]
+    try:
+        s_json = get_session_redis(session_id).json().get(f"session:{session_id}", *paths)
+    except RedisError:
+        s_json = get_recent_sessions().get(session_id)
+        if s_json is None:
+            raise
+        return SessionScores(**s_json)
+    if s_json is None:
+        raise HTTPException(status_code=404, detail="No session with this id was found")
+
+    # Each JSONPath returns the list of its matches (empty for sessions missing the field)
+    scores = {path[2:]: matches[0] for path, matches in s_json.items() if matches}
+    return SessionScores(**scores)
+
+
+@base_router.get("/session/{session_id}/history", tags=["Sessions"])
+def session_history(
+    session_id: str,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+) -> SessionHistory:
+    """
+    Returns the Task status changes of an existing session, oldest first.
+    Only the most recent changes are kept (see `history_max_events` setting).
+
+    **Parameters:**
+
+    - *session_id*: A session identifier
+    - *limit*: Maximum number of changes returned
+    - *cursor*: The `next_cursor` returned with the previous page: the id of its last change,
+        after which the next page starts
+
+    **Returns:**
+    A page of the session history
+    \f
+    :param session_id: The session identifier
+    :param limit: Maximum number of changes returned
+    :param cursor: The cursor returned with the previous page
+    :return: The changes of the page and the cursor of the next page
+    """
+    try:
+        history = get_session_history(get_session_redis(session_id), session_id, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if history is None:
+        raise HTTPException(status_code=404, detail="No session with this id was found")
+
+    events, next_cursor = history
+    return SessionHistory(events=events, next_cursor=next_cursor)
+
+
+@base_router.get("/session/{session_id}/history/{timestamp}", tags=["Sessions"])
+def session_at(session_id: str, timestamp: float) -> Session:
+    """
+    Returns an existing session as it was at a given time, rebuilt from its history
+
+    **Parameters:**
+
+    - *session_id*: A session identifier
+    - *timestamp*: The point in time (UNIX timestamp, e.g. `1700000000.5`)
+
+    **Returns:**
+    The session object at that time
+    \f
+    :param session_id: The session identifier
+    :param timestamp: The point in time
+    :return: The session object at that time
+    """
+    session = get_session_at(get_session_redis(session_id), session_id, timestamp)
+    if session is None:
+        raise HTTPException(status_code=404, detail="No history of this session was found at this time")
+    return JSONResponse(session)
+
+
+@base_router.get(
+    "/session/{session_id}/report",
+    tags=["Sessions"],
+    response_class=Response,
+    responses={200: {"content": {media_type: {} for media_type in REPORT_MEDIA_TYPES.values()}}},
+)
+async def session_report(
+    session_id: str,
+    format: ReportFormat = ReportFormat.pdf,
+    if_none_match: Optional[str] = Header(None),
+) -> Response:
+    """
+    Returns a shareable report of an existing session: its scores, and the result of each
+    indicator along with its question and description
+
+    **Parameters:**
+
+    - *session_id*: A session identifier
+    - *format*: The file format of the report: `csv`, `pdf` or `jsonld`
+
+    **Returns:**
+    The report file. Reports are rendered once per version of the session: the `ETag` header
+    identifies this version, and `If-None-Match` requests for an unchanged session get an
+    empty 304 response
+    \f
+    :param session_id: The session identifier
+    :param format: The file format of the report
+    :param if_none_match: The ETag of a report previously downloaded by the client
+    :return: The report file
+    """
+    indicators = get_fair_indicators()
+
+    def load_session() -> Optional[tuple[dict, str]]:
+        # Digesting the whole session takes a while for large sessions: not on the event loop
+        s_json = get_session_document(session_id)
+        return (s_json, report_version(s_json, indicators)) if s_json is not None else None
+
+    loaded = await run_in_threadpool(load_session)
+    if loaded is None:
         raise HTTPException(status_code=404, detail="No session with this id was found")
 
+    session, version = loaded
+    headers = {
+        "ETag": f'"{version}"',
+        "Cache-Control": "private, no-cache",
+    }
+    if if_none_match is not None and f'"{version}"' in if_none_match:
+        return Response(status_code=304, headers=headers)
+
+    redis_app = await run_in_threadpool(get_session_redis, session_id)
+    content = await run_in_threadpool(get_cached_report, redis_app, session_id, format.value, version)
+    if content is None:
+        content = await asyncio.wrap_future(get_render_pool().render(format.value, version, session, indicators))
+        await run_in_threadpool(cache_report, redis_app, session_id, format.value, version, content)
+
+    headers["Content-Disposition"] = f'attachment; filename="session-{session_id}.{format.value}"'
+    return Response(content, media_type=REPORT_MEDIA_TYPES[format.value], headers=headers)
+
 
 @base_router.get("/session/{session_id}/tasks/{task_id}", tags=["Tasks"])
 def task_detail(session_id: str, task_id: str) -> Task:
@@ -107,7 +879,7 @@ def task_detail(session_id: str, task_id: str) -> Task:
     :param task_id: The identifier of the wanted Task
     :return: The Task associated with the given identifier
     """
-    session = session_details(session_id)
+    session = get_session(session_id)
     task = session.get_task(task_id)
     if task is not None:
         return task
@@ -127,7 +899,7 @@ def indicator_descriptions_all() -> List[Indicator]:
     \f
     :return: A list of Indicator
     """
-    return list(fair_indicators.values())
+    return list(get_fair_indicators().values())
 
 
 @base_router.get("/indicators/{name}", tags=["Indicators"])
@@ -145,14 +917,21 @@ def indicator_description(name: str) -> Indicator:
     :param name: The name of an Indicator
     :return: The Indicator associated with the given name
     """
-    if name in fair_indicators:
-        return fair_indicators[name]
+    indicators = get_fair_indicators()
+    if name in indicators:
+        return indicators[name]
     else:
         raise HTTPException(404, detail="No indicator with that name was found")
 
 
 @base_router.patch("/session/{session_id}/tasks/{task_id}", tags=["Tasks"])
-def update_task(session_id: str, task_id: str, task_status: TaskStatusIn) -> Session:
+def update_task(
+    session_id: str,
+    task_id: str,
+    task_status: TaskStatusIn,
+    fields: Optional[str] = None,
+    tasks: TaskSelection = TaskSelection.all,
+) -> Session:
     """
     Edit the status of a Task to the given TaskStatus and recalculate the
     default status for the children of that Task
@@ -162,6 +941,10 @@ def update_task(session_id: str, task_id: str, task_status: TaskStatusIn) -> Ses
     - *session_id*: The id of the session the Task is associated with
     - *task_id*: The identifier of the wanted Task
     - *task_status*: The new TaskStatus
+    - *fields*: Comma-separated list of the session fields to return (e.g. `scores,status`).
+        `scores` stands for all score fields. All fields are returned if not set.
+    - *tasks*: Which Tasks to return: `all` of them, only the ones `changed` by this update (returned
+        even if *fields* does not include `tasks`), or `none`
 
     **Returns:**
     The session with the updated Tasks
@@ -169,23 +952,132 @@ def update_task(session_id: str, task_id: str, task_status: TaskStatusIn) -> Ses
     :param session_id: The id of the session the Task is associated with
     :param task_id: The identifier of the wanted Task
     :param task_status: The new TaskStatus
-    :return: The whole session.
+    :param fields: Comma-separated list of the session fields to return
+    :param tasks: Which Tasks to return
+    :return: The whole session, or the selected part of it.
     """
-    session = session_details(session_id)
-    handler = SessionHandler.from_existing_session(session)
+    def apply(handler: SessionHandler) -> Optional[dict[str, dict]]:
+        task = handler.get_task(task_id)
+        if task is None:
+            raise HTTPException(status_code=404,
+                                detail="No task with this id was found")
+        if task.disabled:
+            raise HTTPException(status_code=403, detail="This task status was automatically set, changing its status is forbidden")
+        changed = handler.update_task_status(task_id, task_status.status)
 
-    task = handler.session_model.get_task(task_id)
-    if task.disabled:
-        raise HTTPException(status_code=403, detail="This task status was automatically set, changing its status is forbidden")
-    task.status = task_status.status
-    handler.update_task_children(task_id)
-    handler.update_session_data()
+        if tasks is not TaskSelection.changed:
+            return None
+        return {key: handler.get_task(key).to_dict(session_id, with_children=False) for key in changed}
 
-    try:
-        redis_app.json().set(f"session:{session_id}", ".", handler.session_model.dict())
-    except ResponseError:
-        raise HTTPException(status_code=404,
-                            detail="No task with this id was found")
+    write_buffer = get_write_buffer()
+    if write_buffer is not None:
+        # The session is written to redis once the updates sent in the coalescing window are applied
+        updated = write_buffer.update(session_id, apply)
+        if updated is None:
+            raise HTTPException(status_code=404, detail="No session with this id was found")
+        changed_tasks, session = updated
+
+    else:
+        s_json = get_session_redis(session_id).json().get(f"session:{session_id}")
+        if s_json is None:
+            raise HTTPException(status_code=404, detail="No session with this id was found")
+        handler = SessionHandler.from_existing_session(s_json)
+        changed_tasks = apply(handler)
+        session = handler.to_dict()
+        save_session(session, handler.history_events)
+
+    return select_session_fields(session, fields, tasks, changed_tasks)
 
-    return handler.session_model
 
+def require_admin_key(x_admin_key: Optional[str] = Header(None)) -> None:
+    """
+    Checks that a request to an admin endpoint carries the admin key (`admin_api_key` setting).
+    Admin endpoints are not found when no admin key is set
+
+    :param x_admin_key: The key sent by the client
+    :return: None
+    """
+    admin_api_key = get_settings().admin_api_key
+    if not admin_api_key:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_admin_key is None or not hmac.compare_digest(x_admin_key.encode(), admin_api_key.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin key")
+
+
+@base_router.get("/admin/memory", tags=["Admin"], dependencies=[Depends(require_admin_key)])
+def memory_report(samples: int = Query(100, ge=1, le=10000)) -> MemoryReport:
+    """
+    Returns the memory used by the sessions in redis, and by the API worker answering the request
+
+    **Parameters:**
+
+    - *samples*: Number of sessions measured on each redis node
+
+    **Returns:**
+    For each redis node: the memory it uses, and the distribution of the sizes of the sampled
+    sessions (document and history, as given by `MEMORY USAGE`) and of their number of Tasks.
+    For the API worker: its resident memory, and the memory held by the FAIR indicators, the
+    in-process caches and the live session handlers and models. Each worker answers for itself
+    only. Walking through the objects of the worker holds it for up to a few seconds
+    \f
+    :param samples: Number of sessions measured on each redis node
+    :return: The memory report
+    """
+    redis_nodes = []
+    for address, redis_app in get_redis_nodes().items():
+        try:
+            node = get_node_memory(redis_app)
+            sessions = sample_session_memory(redis_app, samples)
+            error = None
+        except RedisError as e:
+            node, sessions, error = {}, [], str(e)
+        redis_nodes.append({
+            "address": address,
+            "keys": node.get("keys"),
+            "used_memory": node.get("used_memory"),
+            "used_memory_peak": node.get("used_memory_peak"),
+            "document_bytes": distribution([session["document_bytes"] for session in sessions], BYTES_BUCKETS),
+            "history_bytes": distribution([session["history_bytes"] for session in sessions], BYTES_BUCKETS),
+            "tasks": distribution([session["tasks"] for session in sessions], TASKS_BUCKETS),
+            "error": error,
+        })
+
+    return MemoryReport(redis_nodes=redis_nodes, process=get_process_memory())
+
+
+@base_router.get("/admin/allocations", tags=["Admin"], dependencies=[Depends(require_admin_key)])
+async def allocation_report(
+    duration: float = Query(10, gt=0, le=300),
+    limit: int = Query(20, ge=1, le=500),
+    frames: int = Query(1, ge=1, le=50),
+    include: Optional[str] = None,
+) -> AllocationReport:
+    """
+    Traces the memory allocations of the API worker answering the request during a window of
+    live traffic, and returns the lines of code that allocated the most memory not yet released
+    at the end of the window (e.g. Tasks kept by session handlers). Requests are slower while
+    allocations are traced
+
+    **Parameters:**
+
+    - *duration*: Duration of the window, in seconds
+    - *limit*: Maximum number of allocation sites returned
+    - *frames*: Number of calls recorded per allocation. With more than one, allocations are
+        grouped by call stack instead of by line
+    - *include*: Only report the allocations made in the files matching this pattern
+        (e.g. `*/app/models/*`)
+
+    **Returns:**
+    The allocation sites with the largest differences of allocated memory between the start and
+    the end of the window. A single trace can run at a time in a worker (409 status otherwise)
+    \f
+    :param duration: Duration of the window, in seconds
+    :param limit: Maximum number of allocation sites returned
+    :param frames: Number of frames recorded per allocation
+    :param include: Pattern of the file names of the allocations to report
+    :return: The allocation report
+    """
+    try:
+        return AllocationReport(**await trace_allocations(duration, limit, frames, include))
+    except TracingInProgressError as e:
+        raise HTTPException(status_code=409, detail=str(e))
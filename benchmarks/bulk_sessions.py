@@ -0,0 +1,94 @@
+"""
+Measures the throughput of bulk session creation (`POST /sessions/bulk`) against
+one `POST /session` request per session.
+
+Run from the repository root, with a redis server reachable as configured for the
+application (`REDIS_URL`, `REDIS_PORT`):
+
+    python benchmarks/bulk_sessions.py --sessions 1000 --profiles 4
+
+Subjects are spread over `--profiles` distinct subject profiles. Session construction
+alone (without redis) is measured first; the HTTP measurements are skipped if redis
+cannot be reached. Rate limiting is disabled for the benchmark.
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, ".")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+os.environ.setdefault("REDIS_CONNECT_RETRIES", "0")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from redis.exceptions import ConnectionError  # noqa: E402
+
+from app.models import SessionHandler, SessionSubjectIn  # noqa: E402
+from app.redis_controller import get_redis_app  # noqa: E402
+
+FLAGS = [
+    "has_archive", "has_model", "has_archive_metadata", "is_model_standard", "is_archive_standard",
+    "is_model_metadata_standard", "is_archive_metadata_standard", "is_biomodel", "is_pmr",
+]
+
+
+def make_subjects(count: int, profiles: int) -> list[dict]:
+    """Returns `count` manual subjects spread over `profiles` distinct profiles"""
+    subjects = []
+    for i in range(count):
+        profile = i % profiles
+        subject = {flag: bool(profile >> bit & 1) for bit, flag in enumerate(FLAGS)}
+        subject["subject_type"] = "manual"
+        subjects.append(subject)
+    return subjects
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=1000, help="Number of sessions created")
+    parser.add_argument("--profiles", type=int, default=4, help="Number of distinct subject profiles")
+    args = parser.parse_args()
+
+    subjects = make_subjects(args.sessions, args.profiles)
+    models = [SessionSubjectIn(**subject) for subject in subjects]
+
+    start = time.perf_counter()
+    for model in models:
+        SessionHandler.from_user_input(model).to_dict()
+    single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for handler in SessionHandler.from_user_inputs(models):
+        handler.to_dict()
+    shared = time.perf_counter() - start
+
+    print(f"{'':<40}{'sessions/s':>12}")
+    print(f"{'construction, one by one':<40}{args.sessions / single:>12.0f}")
+    print(f"{'construction, shared by profile':<40}{args.sessions / shared:>12.0f}")
+
+    try:
+        get_redis_app()
+    except ConnectionError as e:
+        print(f"Skipping HTTP measurements: {str(e)}")
+        return
+
+    from app.main import app
+
+    with TestClient(app) as client:
+        start = time.perf_counter()
+        for subject in subjects:
+            client.post("/session", json=subject).raise_for_status()
+        single = time.perf_counter() - start
+
+        start = time.perf_counter()
+        response = client.post("/sessions/bulk", json=subjects)
+        response.raise_for_status()
+        created = sum(1 for line in response.iter_lines() if '"id"' in line)
+        bulk = time.perf_counter() - start
+
+    print(f"{'POST /session, one request per session':<40}{args.sessions / single:>12.0f}")
+    print(f"{'POST /sessions/bulk':<40}{created / bulk:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Fault injection: measures the latency of the API while its redis server is paused with
+SIGSTOP, to check that requests fail fast (circuit breaker) or are served from memory
+(degraded mode) instead of piling up behind redis timeouts.
+
+Run from the repository root, with `redis-stack-server` in the PATH:
+
+    python benchmarks/redis_fault_injection.py --clients 8 --phase 10
+
+A redis server is started on `--port` (`--server-command` starts another server, `{port}`
+being replaced by the port). Sessions are created and read once, then `--clients` threads
+send a mix of requests (reading a session, listing the indicators, updating a Task) for
+`--phase` seconds with redis running, then paused, then resumed. Rate limiting is disabled.
+
+Exits with an error when a request sent while redis was paused took longer than
+`--max-paused-latency` seconds (4 times `REDIS_COMMAND_TIMEOUT` by default).
+"""
+import os
+import sys
+import time
+import shlex
+import random
+import signal
+import argparse
+import subprocess
+
+from collections import defaultdict
+from threading import Thread
+
+sys.path.insert(0, ".")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+os.environ.setdefault("REDIS_COMMAND_TIMEOUT", "0.5")
+os.environ.setdefault("REDIS_PROBE_INTERVAL", "1")
+
+SUBJECT = {
+    "subject_type": "manual",
+    "has_archive": True,
+    "has_model": True,
+    "has_archive_metadata": True,
+    "is_model_standard": True,
+    "is_archive_standard": True,
+    "is_model_metadata_standard": True,
+    "is_archive_metadata_standard": True,
+    "is_biomodel": False,
+    "is_pmr": False,
+}
+
+
+def start_server(command: str, port: int) -> subprocess.Popen:
+    """Starts the redis server and waits until it answers"""
+    from redis import Redis
+    from redis.exceptions import ConnectionError
+
+    server = subprocess.Popen(shlex.split(command.format(port=port)), stdout=subprocess.DEVNULL)
+    client = Redis(port=port)
+    for _ in range(100):
+        try:
+            client.ping()
+            return server
+        except ConnectionError:
+            time.sleep(0.1)
+    server.terminate()
+    sys.exit(f"The redis server did not start: {command}")
+
+
+def percentile(values: list[float], ratio: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * ratio))] if values else float("nan")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=7101, help="Port of the redis server")
+    parser.add_argument("--server-command", default="redis-stack-server --port {port} --save '' --appendonly no",
+                        help="Command starting the redis server")
+    parser.add_argument("--clients", type=int, default=8, help="Number of concurrent client threads")
+    parser.add_argument("--sessions", type=int, default=20, help="Number of sessions created")
+    parser.add_argument("--phase", type=float, default=10, help="Duration of each phase, in seconds")
+    parser.add_argument("--max-paused-latency", type=float, default=None,
+                        help="Maximum latency of the requests sent while redis is paused, in seconds")
+    args = parser.parse_args()
+    max_paused_latency = args.max_paused_latency or 4 * float(os.environ["REDIS_COMMAND_TIMEOUT"])
+
+    os.environ["REDIS_URL"] = "localhost"
+    os.environ["REDIS_PORT"] = str(args.port)
+    server = start_server(args.server_command, args.port)
+
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    # (phase, operation) -> list of (status code, latency)
+    results = defaultdict(list)
+    phase = "running"
+    running = True
+
+    try:
+        with TestClient(app) as client:
+            sessions = []
+            for _ in range(args.sessions):
+                session = client.post("/session", json=SUBJECT).json()
+                sessions.append((session["id"], next(iter(session["tasks"]))))
+                client.get(f"/session/{session['id']}")
+
+            def send_requests():
+                while running:
+                    session_id, task_id = random.choice(sessions)
+                    operation = random.choice(["read session", "list indicators", "update task"])
+                    # Requests are counted in the phase they were sent in, however long they take
+                    sent_in = phase
+                    start = time.perf_counter()
+                    if operation == "read session":
+                        response = client.get(f"/session/{session_id}")
+                    elif operation == "list indicators":
+                        response = client.get("/indicators")
+                    else:
+                        response = client.patch(
+                            f"/session/{session_id}/tasks/{task_id}?tasks=none",
+                            json={"status": random.choice(["success", "failed"])},
+                        )
+                    results[sent_in, operation].append((response.status_code, time.perf_counter() - start))
+
+            threads = [Thread(target=send_requests) for _ in range(args.clients)]
+            for thread in threads:
+                thread.start()
+
+            time.sleep(args.phase)
+            phase = "paused"
+            server.send_signal(signal.SIGSTOP)
+            time.sleep(args.phase)
+            phase = "resumed"
+            server.send_signal(signal.SIGCONT)
+            time.sleep(args.phase)
+            running = False
+            for thread in threads:
+                thread.join()
+    finally:
+        server.send_signal(signal.SIGCONT)
+        server.terminate()
+        server.wait()
+
+    print(f"{'phase':<10}{'request':<18}{'count':>7}{'p50 (ms)':>10}{'p99 (ms)':>10}{'max (ms)':>10}  status codes")
+    for current in ("running", "paused", "resumed"):
+        for operation in ("read session", "list indicators", "update task"):
+            samples = results[current, operation]
+            latencies = [latency * 1000 for _, latency in samples]
+            statuses = defaultdict(int)
+            for status, _ in samples:
+                statuses[status] += 1
+            print(f"{current:<10}{operation:<18}{len(samples):>7}{percentile(latencies, 0.5):>10.1f}"
+                  f"{percentile(latencies, 0.99):>10.1f}{max(latencies, default=float('nan')):>10.1f}  "
+                  f"{dict(sorted(statuses.items()))}")
+
+    paused = [latency for operation in ("read session", "list indicators", "update task")
+              for _, latency in results["paused", operation]]
+    if not paused or max(paused) > max_paused_latency:
+        sys.exit(f"Requests sent while redis was paused took up to {max(paused, default=float('inf')):.2f}s "
+                 f"(at most {max_paused_latency:.2f}s expected)")
+
+
+if __name__ == "__main__":
+    main()
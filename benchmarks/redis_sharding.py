@@ -0,0 +1,111 @@
+"""
+Measures the throughput of session creations and updates when sessions are spread
+over 1, 2 and 4 redis nodes (see `redis_nodes` setting).
+
+Run from the repository root, with `redis-stack-server` (or `redis-server` with the
+RedisJSON and RediSearch modules loaded) in the PATH:
+
+    python benchmarks/redis_sharding.py --workers 8 --sessions 200 --updates 10
+
+Four local servers are started on the ports following `--port`, and stopped at the end.
+For each number of nodes, `--workers` processes each create `--sessions` sessions through
+the application and update `--updates` Tasks of each. Rate limiting is disabled.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+from multiprocessing import Pool
+
+sys.path.insert(0, ".")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+os.environ.setdefault("REDIS_CONNECT_RETRIES", "10")
+os.environ.setdefault("REDIS_CONNECT_BACKOFF", "0.1")
+
+SUBJECT = {
+    "subject_type": "manual",
+    "has_archive": True,
+    "has_model": True,
+    "has_archive_metadata": True,
+    "is_model_standard": True,
+    "is_archive_standard": True,
+    "is_model_metadata_standard": True,
+    "is_archive_metadata_standard": True,
+    "is_biomodel": False,
+    "is_pmr": False,
+}
+
+
+def start_servers(port: int, count: int, directory: str) -> list[subprocess.Popen]:
+    """Starts `count` redis servers without persistence, on the ports following `port`"""
+    executable = shutil.which("redis-stack-server") or shutil.which("redis-server")
+    if executable is None:
+        sys.exit("redis-stack-server is not installed")
+    return [
+        subprocess.Popen(
+            [executable, "--port", str(port + i), "--save", "", "--appendonly", "no", "--dir", directory],
+            stdout=subprocess.DEVNULL,
+        )
+        for i in range(count)
+    ]
+
+
+def run_worker(args: tuple[int, int]) -> int:
+    """Creates sessions and updates their Tasks, returns the number of requests made"""
+    sessions, updates = args
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    requests = 0
+    with TestClient(app) as client:
+        for _ in range(sessions):
+            session = client.post("/session", json=SUBJECT).json()
+            tasks = list(client.get(f"/session/{session['id']}").json()["tasks"].values())
+            requests += 2
+            for task in tasks[:updates]:
+                client.patch(
+                    f"/session/{session['id']}/tasks/{task['id']}?tasks=none",
+                    json={"status": "success"},
+                )
+                requests += 1
+    return requests
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=7001, help="Port of the first redis server")
+    parser.add_argument("--workers", type=int, default=8, help="Number of concurrent client processes")
+    parser.add_argument("--sessions", type=int, default=200, help="Number of sessions created per worker")
+    parser.add_argument("--updates", type=int, default=10, help="Number of Task updates per session")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        servers = start_servers(args.port, 4, directory)
+        try:
+            print(f"{'nodes':<8}{'requests/s':>12}")
+            for count in (1, 2, 4):
+                for i in range(4):
+                    subprocess.run(
+                        ["redis-cli", "-p", str(args.port + i), "FLUSHALL"],
+                        stdout=subprocess.DEVNULL, check=False,
+                    )
+                # Workers read the nodes from the environment when they import the application
+                os.environ["REDIS_NODES"] = json.dumps([f"localhost:{args.port + i}" for i in range(count)])
+                start = time.perf_counter()
+                with Pool(args.workers) as pool:
+                    requests = sum(pool.map(run_worker, [(args.sessions, args.updates)] * args.workers))
+                duration = time.perf_counter() - start
+                print(f"{count:<8}{requests / duration:>12.0f}")
+        finally:
+            for server in servers:
+                server.terminate()
+                server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Compares the throughput of a single uvicorn process with the gunicorn
+multi-worker profile (`app/gunicorn_conf.py`).
+
+Run from the repository root:
+
+    python benchmarks/server_throughput.py --workers 1 4 8 --duration 10
+
+Each configuration is started in a subprocess and hit by `--clients` concurrent
+keep-alive connections for `--duration` seconds. The default target (`/indicators`)
+does not need redis; any other path (e.g. `/session/<id>`) can be given with `--path`.
+"""
+import os
+import sys
+import time
+import argparse
+import subprocess
+import http.client
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+def wait_until_ready(port: int, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            connection.request("GET", "/indicators")
+            connection.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server on port {port} did not start in {timeout}s")
+
+
+def run_client(port: int, path: str, stop_at: float) -> tuple[int, int]:
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    done, errors = 0, 0
+    while time.monotonic() < stop_at:
+        connection.request("GET", path)
+        response = connection.getresponse()
+        response.read()
+        if response.status == 200:
+            done += 1
+        else:
+            errors += 1
+    connection.close()
+    return done, errors
+
+
+def measure(command: list[str], port: int, path: str, clients: int, duration: float) -> tuple[float, int]:
+    env = dict(os.environ, BIND=f"127.0.0.1:{port}")
+    server = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_ready(port)
+        stop_at = time.monotonic() + duration
+        with ThreadPoolExecutor(clients) as pool:
+            results = list(pool.map(lambda _: run_client(port, path, stop_at), range(clients)))
+    finally:
+        server.terminate()
+        server.wait()
+    done = sum(r[0] for r in results)
+    errors = sum(r[1] for r in results)
+    return done / duration, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4])
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--path", default="/indicators")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    configurations = [(
+        "uvicorn (1 process)",
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", "{port}", "--log-level", "warning"],
+    )]
+    for workers in args.workers:
+        configurations.append((
+            f"gunicorn ({workers} workers)",
+            [sys.executable, "-m", "gunicorn", "-c", "python:app.gunicorn_conf", "--workers", str(workers),
+             "--access-logfile", "/dev/null", "app.main:app"],
+        ))
+
+    print(f"{args.clients} clients, {args.duration}s per run, GET {args.path} (cores: {os.cpu_count()})")
+    for offset, (name, command) in enumerate(configurations):
+        # A new port for each run, as the previous one may still be lingering
+        port = args.port + offset
+        command = [port_arg.replace("{port}", str(port)) for port_arg in command]
+        throughput, errors = measure(command, port, args.path, args.clients, args.duration)
+        print(f"{name:<24} {throughput:>10.1f} req/s   errors: {errors}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Compares the pydantic Session model with the compact representation used by
+SessionHandler (see `app/models/records.py`): time to build a session from its
+stored JSON, time to dump it back to JSON, and memory held per session.
+
+Run from the repository root:
+
+    python benchmarks/session_model.py --sessions 500
+
+No redis server is needed: sessions are created in memory.
+"""
+import gc
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+
+sys.path.insert(0, ".")
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+from app.models import Session, SessionHandler, SessionSubjectIn  # noqa: E402
+
+SUBJECT = {
+    "subject_type": "manual",
+    "has_archive": True,
+    "has_model": True,
+    "has_archive_metadata": True,
+    "is_model_standard": True,
+    "is_archive_standard": True,
+    "is_model_metadata_standard": True,
+    "is_archive_metadata_standard": True,
+    "is_biomodel": False,
+    "is_pmr": False,
+}
+
+
+def per_call(function, repeat: int) -> float:
+    """Returns the mean duration (in milliseconds) of `function`"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def memory_per_object(factory, count: int) -> float:
+    """Returns the memory (in KiB) held by each of `count` objects built by `factory`"""
+    gc.collect()
+    tracemalloc.start()
+    objects = [factory() for _ in range(count)]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objects
+    return size / count / 1024
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=500, help="Number of sessions built per measurement")
+    args = parser.parse_args()
+
+    document = json.loads(SessionHandler.from_user_input(SessionSubjectIn(**SUBJECT)).json())
+    session = Session.parse_obj(document)
+    handler = SessionHandler(document)
+
+    print(f"{'':<32}{'pydantic Session':>18}{'SessionHandler':>18}")
+    print(f"{'build from JSON (ms)':<32}"
+          f"{per_call(lambda: Session.parse_obj(document), args.sessions):>18.3f}"
+          f"{per_call(lambda: SessionHandler(document), args.sessions):>18.3f}")
+    print(f"{'dump to JSON (ms)':<32}"
+          f"{per_call(lambda: jsonable_encoder(session), args.sessions):>18.3f}"
+          f"{per_call(handler.to_dict, args.sessions):>18.3f}")
+    print(f"{'memory per session (KiB)':<32}"
+          f"{memory_per_object(lambda: Session.parse_obj(document), args.sessions):>18.1f}"
+          f"{memory_per_object(lambda: SessionHandler(document), args.sessions):>18.1f}")
+
+
+if __name__ == "__main__":
+    main()